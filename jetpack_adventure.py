@@ -1,18 +1,45 @@
 #!/usr/bin/env python3
 import pygame
-import sys
 import random
 import os
+import sys
 import math
+import time
+import bisect
+import itertools
+import asyncio
+import argparse
+import traceback
+from array import array
+from collections import namedtuple, deque
+
+# Audio settings, needed before pygame.init() opens the mixer. Every sound is
+# generated in the format the mixer ends up with (see init_audio), so none is
+# converted or resampled when played. A smaller buffer gets a triggered sound
+# out sooner (512 frames at 44.1 kHz is 11.6 ms) but leaves the device less
+# slack before it runs dry; python jetpack_audio.py measures both.
+AUDIO_FREQUENCY = 44100
+AUDIO_BUFFER = 512  # Sample frames the mixer mixes at a time
+AUDIO_CHANNELS = 1
+AUDIO_SAMPLE_SIZE = -16  # Signed 16-bit, asked for; SDL may open the device with another format
 
 # Initialize pygame
+pygame.mixer.pre_init(AUDIO_FREQUENCY, AUDIO_SAMPLE_SIZE, AUDIO_CHANNELS, AUDIO_BUFFER)
+audio_settings = (AUDIO_FREQUENCY, AUDIO_BUFFER, AUDIO_CHANNELS)  # What the mixer was last opened with
 pygame.init()
 pygame.mixer.init()  
 
 # Game constants
 SCREEN_WIDTH = 1200
 SCREEN_HEIGHT = 700
-FPS = 60
+FPS = 60  # Simulation rate - every movement constant below is per simulation step
+SIM_STEP = 1.0 / FPS  # Length of one simulation step in seconds
+SIM_STEP_MS = 1000.0 / FPS  # Same, in milliseconds (used by the spawn timers)
+MAX_CATCHUP_STEPS = 5  # Most simulation steps run for one rendered frame after a hitch
+RENDER_FPS = FPS  # Render frame cap; 0 = uncapped, an option (--render-fps 0) as it keeps a core busy
+LATE_LATCH_MARGIN = 0.001  # Seconds of slack left between a late-latched frame's work and its flip
+PACING_MIN_MARGIN = 0.001  # Frame waits wake at least this early and spin the rest (yielding)...
+PACING_MAX_MARGIN = 0.008  # ...and at most this early (half a 60 Hz frame), however late the event loop has been
 GRAVITY = 0.3  # Reduced gravity for smoother falling
 JUMP_STRENGTH = -7  # Less intense jump for more control
 MAX_VELOCITY = 12  # Cap on maximum velocity
@@ -23,6 +50,19 @@ OBSTACLE_FREQUENCY = 1500
 COIN_FREQUENCY = 2000  
 BACKGROUND_SPEED = 2
 MISSILE_SPEED = 8
+MISSILE_Y_RANGE = (100, SCREEN_HEIGHT - 150)  # Spawn heights for missiles
+LASER_Y_RANGE = (0, SCREEN_HEIGHT - 200)  # Spawn heights for lasers
+OBSTACLE_IMAGE_VARIANTS = 4  # Number of pre-drawn looks shared by all obstacles of a type
+COIN_SIZE = 30
+COIN_SPACING = 40  # Distance between neighbouring coins in a formation
+FORMATION_SURFACE_MIN_COINS = 16  # Formations at least this big are drawn from one pre-drawn surface
+FORMATION_SURFACE_CACHE_SIZE = 16  # Most formation layouts kept pre-drawn at once
+FORMATION_COLORKEY = (255, 0, 255)  # Transparent colour of formation surfaces
+OBSTACLE_SIZES = {"missile": (80, 30), "laser": (30, 150)}
+LOOKAHEAD_MS = 5000  # How far ahead of the simulation clock the level is planned
+PLAN_RETRIES = 8  # Placements tried for a planned spawn before it's dropped
+PLAYER_CLIMB_RATE = 6  # Vertical px per step a player is expected to manage (half of MAX_VELOCITY)
+SPAWN_CLEARANCE = 10  # Minimum px between a coin formation and an obstacle's path
 
 # Colors
 WHITE = (255, 255, 255)
@@ -40,13 +80,93 @@ screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Jetpack Adventure")
 clock = pygame.time.Clock()
 
+# The only events the game reacts to. SDL drops everything else (mouse motion,
+# text input, window chatter) before it reaches the queue, so polling stays cheap.
+ALLOWED_EVENTS = [pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP,
+                  pygame.VIDEORESIZE]
+
+def filter_events():
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(ALLOWED_EVENTS)
+
+def thrust_held():
+    return bool(pygame.key.get_pressed()[pygame.K_SPACE] or any(pygame.mouse.get_pressed()))
+
+# Everything is drawn through a renderer. This one blits onto the display
+# Surface in software; jetpack_renderer.TextureRenderer has the same methods
+# and draws with SDL textures instead (--renderer texture).
+class SurfaceRenderer:
+    name = "surface"
+    
+    def __init__(self, surface):
+        self.surface = surface
+        self.shades = {}  # (color, alpha) -> full-screen translucent overlay
+    
+    # Sprites that are drawn over and over (a texture renderer uploads these once)
+    def blit(self, image, position):
+        self.surface.blit(image, position)
+    
+    def blits(self, image, positions):
+        self.surface.blits(zip(itertools.repeat(image), positions), False)
+    
+    # Surfaces made for this frame only
+    def blit_once(self, image, position):
+        self.surface.blit(image, position)
+    
+    # Text, laid out with font.size() in the game's own coordinates
+    def text(self, font, string, color, position):
+        self.surface.blit(font.render(string, True, color), position)
+    
+    def fill_rect(self, color, rect, width=0):
+        pygame.draw.rect(self.surface, color, rect, width)
+    
+    # Darken (or tint) the whole screen
+    def shade(self, color, alpha):
+        if (color, alpha) not in self.shades:
+            overlay = pygame.Surface(self.surface.get_size(), pygame.SRCALPHA)
+            overlay.fill(color + (alpha,))
+            self.shades[(color, alpha)] = overlay
+        self.surface.blit(self.shades[(color, alpha)], (0, 0))
+    
+    def particle(self, color, alpha, position, size):
+        particle_surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(particle_surface, color, (size // 2, size // 2), size // 2)
+        
+        # Apply alpha by setting the surface alpha
+        particle_surface.set_alpha(alpha)
+        self.surface.blit(particle_surface, position)
+    
+    def preload(self, images):
+        pass  # Nothing to upload
+    
+    def resize(self, size):
+        pass  # The window isn't resizable (see jetpack_resolution.ScaledRenderer)
+    
+    def present(self):
+        pygame.display.flip()
+    
+    def frame_surface(self):
+        """The frame just presented, as a Surface"""
+        return self.surface
+
+renderer = SurfaceRenderer(screen)
+
+# How each font was made, so a renderer drawing at another scale can make it
+# again at that scale (see jetpack_resolution.ScaledRenderer.text)
+font_specs = {}  # Font -> (name, size, bold, system font)
+
+def load_font(name, size, bold=False, system=False):
+    font = pygame.font.SysFont(name, size, bold=bold) if system else pygame.font.Font(name, size)
+    font_specs[font] = (name, size, bold, system)
+    return font
+
 # Load fonts
 # Use a more pixelated font style - try to use a more retro font if available
 try:
     # Try to load a more pixelated retro font if available
-    font_large = pygame.font.Font(None, 48)  # Use default font as fallback
-    font_medium = pygame.font.Font(None, 36)
-    font_small = pygame.font.Font(None, 24)
+    font_large = load_font(None, 48)  # Use default font as fallback
+    font_medium = load_font(None, 36)
+    font_small = load_font(None, 24)
     
     # Try to find retro fonts on the system
     available_fonts = pygame.font.get_fonts()
@@ -54,22 +174,22 @@ try:
     
     for font in retro_fonts:
         if font in available_fonts:
-            font_large = pygame.font.SysFont(font, 36, bold=True)
-            font_medium = pygame.font.SysFont(font, 28, bold=True)
-            font_small = pygame.font.SysFont(font, 20, bold=True)
+            font_large = load_font(font, 36, bold=True, system=True)
+            font_medium = load_font(font, 28, bold=True, system=True)
+            font_small = load_font(font, 20, bold=True, system=True)
             break
     
     # If no retro fonts found, make the default font bold for better visibility
     if font_large == pygame.font.Font(None, 48):
-        font_large = pygame.font.SysFont(None, 36, bold=True)
-        font_medium = pygame.font.SysFont(None, 28, bold=True)
-        font_small = pygame.font.SysFont(None, 20, bold=True)
+        font_large = load_font(None, 36, bold=True, system=True)
+        font_medium = load_font(None, 28, bold=True, system=True)
+        font_small = load_font(None, 20, bold=True, system=True)
         
 except:
     # Fallback to default fonts if custom ones aren't available
-    font_large = pygame.font.SysFont(None, 36, bold=True)
-    font_medium = pygame.font.SysFont(None, 28, bold=True)
-    font_small = pygame.font.SysFont(None, 20, bold=True)
+    font_large = load_font(None, 36, bold=True, system=True)
+    font_medium = load_font(None, 28, bold=True, system=True)
+    font_small = load_font(None, 20, bold=True, system=True)
 
 # Create assets directory if it doesn't exist
 assets_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
@@ -77,59 +197,91 @@ sounds_dir = os.path.join(assets_dir, 'sounds')
 os.makedirs(assets_dir, exist_ok=True)
 os.makedirs(sounds_dir, exist_ok=True)
 
+# Linear interpolation between the previous and current simulation state
+def lerp(a, b, t):
+    return a + (b - a) * t
+
 # Sound effects
 sounds = {}
 
-# Function to create and save sound effects programmatically
+# Sounds are synthesized as mono 16-bit samples, then converted once, up front
+def native_samples(samples):
+    """Mono int16 samples converted to the format and channel count the mixer opened with"""
+    frequency, size, channels = pygame.mixer.get_init()
+    if size == -16:
+        native = samples
+    elif size == 16:
+        native = (samples.astype(np.int32) + 32768).astype(np.uint16)
+    elif size == -8:
+        native = (samples >> 8).astype(np.int8)
+    elif size == 8:
+        native = ((samples >> 8) + 128).astype(np.uint8)
+    elif size == -32:
+        native = samples.astype(np.int32) << 16
+    elif size == 32:
+        native = (samples / 32768).astype(np.float32)
+    else:
+        raise ValueError(f"unsupported mixer sample size {size}")
+    if channels > 1:
+        native = np.ascontiguousarray(np.repeat(native[:, np.newaxis], channels, axis=1))
+    return native
+
+def native_sound(samples):
+    return pygame.sndarray.make_sound(native_samples(samples))
+
+# Function to create and save sound effects programmatically, at the mixer's rate
 def create_sound_effects():
+    rate = pygame.mixer.get_init()[0]
+    
     # Create jetpack sound (white noise with filtering)
-    jetpack_sound = pygame.mixer.Sound(buffer=pygame.sndarray.make_sound(
-        np.random.randint(-32768, 32767, size=44100).astype(np.int16)))
+    jetpack_sound = native_sound(np.random.randint(-32768, 32767, size=rate).astype(np.int16))
     jetpack_sound.set_volume(0.4)
     
     # Create explosion sound (burst of noise with decay)
-    explosion_samples = np.random.randint(-32768, 32767, size=22050).astype(np.int16)
+    explosion_samples = np.random.randint(-32768, 32767, size=rate // 2).astype(np.int16)
     for i in range(len(explosion_samples)):
         explosion_samples[i] = int(explosion_samples[i] * (1 - i/len(explosion_samples)))
-    explosion_sound = pygame.mixer.Sound(buffer=pygame.sndarray.make_sound(explosion_samples))
+    explosion_sound = native_sound(explosion_samples)
     explosion_sound.set_volume(0.7)
     
     # Create coin collection sound (ascending beeps)
-    coin_samples = np.zeros(11025, dtype=np.int16)
+    beep = rate // 20
+    coin_samples = np.zeros(5 * beep, dtype=np.int16)
     for i in range(5):
         freq = 800 + i * 200
-        for j in range(2205):
-            t = j / 44100
-            coin_samples[i*2205 + j] = int(32767 * 0.6 * math.sin(2 * math.pi * freq * t))
-    coin_sound = pygame.mixer.Sound(buffer=pygame.sndarray.make_sound(coin_samples))
+        for j in range(beep):
+            t = j / rate
+            coin_samples[i*beep + j] = int(32767 * 0.6 * math.sin(2 * math.pi * freq * t))
+    coin_sound = native_sound(coin_samples)
     coin_sound.set_volume(0.5)
     
     # Create laser sound (sci-fi zap)
-    laser_samples = np.zeros(11025, dtype=np.int16)
+    laser_samples = np.zeros(rate // 4, dtype=np.int16)
     for i in range(len(laser_samples)):
-        t = i / 44100
+        t = i / rate
         freq = 2000 - 1500 * (i / len(laser_samples))
         laser_samples[i] = int(32767 * 0.6 * math.sin(2 * math.pi * freq * t))
-    laser_sound = pygame.mixer.Sound(buffer=pygame.sndarray.make_sound(laser_samples))
+    laser_sound = native_sound(laser_samples)
     laser_sound.set_volume(0.5)
     
     # Create menu select sound (short beep)
-    menu_samples = np.zeros(5512, dtype=np.int16)
+    menu_samples = np.zeros(rate // 8, dtype=np.int16)
     for i in range(len(menu_samples)):
-        t = i / 44100
+        t = i / rate
         freq = 1200
         menu_samples[i] = int(32767 * 0.5 * math.sin(2 * math.pi * freq * t))
-    menu_sound = pygame.mixer.Sound(buffer=pygame.sndarray.make_sound(menu_samples))
+    menu_sound = native_sound(menu_samples)
     menu_sound.set_volume(0.6)
     
     # Create game over sound (descending notes)
-    gameover_samples = np.zeros(22050, dtype=np.int16)
+    note = rate // 8
+    gameover_samples = np.zeros(4 * note, dtype=np.int16)
     for i in range(4):
         freq = 800 - i * 200
-        for j in range(5512):
-            t = j / 44100
-            gameover_samples[i*5512 + j] = int(32767 * 0.7 * math.sin(2 * math.pi * freq * t))
-    gameover_sound = pygame.mixer.Sound(buffer=pygame.sndarray.make_sound(gameover_samples))
+        for j in range(note):
+            t = j / rate
+            gameover_samples[i*note + j] = int(32767 * 0.7 * math.sin(2 * math.pi * freq * t))
+    gameover_sound = native_sound(gameover_samples)
     gameover_sound.set_volume(0.7)
     
     # Store sounds in dictionary
@@ -144,7 +296,7 @@ def create_sound_effects():
 def create_background_music():
     # Create a simple chiptune-style background music
     duration = 10  # seconds
-    sample_rate = 44100
+    sample_rate, _, channels = pygame.mixer.get_init()
     total_samples = duration * sample_rate
     
     # Create a numpy array for the samples
@@ -197,20 +349,32 @@ def create_background_music():
                 # Add the bass note
                 music_samples[i + j * bass_samples + k] += int(16000 * 0.3 * math.sin(2 * math.pi * bass_freq * t))
     
-    # Save the music to a temporary WAV file
+    # Save the music to a temporary WAV file, then move it into place so
+    # several game processes starting at once never read a half-written file.
+    # It's streamed, so it's kept 16-bit, but at the mixer's rate and channel count
     music_path = os.path.join(sounds_dir, "background_music.wav")
-    with wave.open(music_path, "w") as wav_file:
-        wav_file.setnchannels(1)  # Mono
+    temp_path = f"{music_path}.{os.getpid()}.tmp"
+    if channels > 1:
+        music_samples = np.repeat(music_samples[:, np.newaxis], channels, axis=1)
+    with wave.open(temp_path, "w") as wav_file:
+        wav_file.setnchannels(channels)
         wav_file.setsampwidth(2)  # 16-bit
         wav_file.setframerate(sample_rate)
         wav_file.writeframes(music_samples.tobytes())
+    os.replace(temp_path, music_path)
     
     return music_path
 
-# Try to import numpy for sound generation
-try:
-    import numpy as np
-    import wave
+def init_audio(frequency=AUDIO_FREQUENCY, buffer=AUDIO_BUFFER, channels=AUDIO_CHANNELS):
+    """Open the mixer (again, if it's open with other settings) and make every sound and the music for it"""
+    global audio_settings, music_path
+    if (frequency, buffer, channels) != audio_settings or not pygame.mixer.get_init():
+        pygame.mixer.quit()
+        pygame.mixer.pre_init(frequency, AUDIO_SAMPLE_SIZE, channels, buffer)
+        pygame.mixer.init()
+        audio_settings = (frequency, buffer, channels)
+    if np is None:
+        return  # Silent mode
     
     # Create sound effects
     create_sound_effects()
@@ -222,9 +386,17 @@ try:
     pygame.mixer.music.load(music_path)
     pygame.mixer.music.set_volume(0.5)
     pygame.mixer.music.play(-1)  # Loop indefinitely
+
+# Try to import numpy for sound generation
+try:
+    import numpy as np
+    import wave
+    
+    init_audio()
     
 except ImportError:
     print("Numpy not found. Using silent mode.")
+    np = None
     # Create empty sounds dictionary
     sounds = {
         "jetpack": None,
@@ -243,14 +415,131 @@ def play_sound(sound_name):
     if sounds_enabled and sound_name in sounds and sounds[sound_name] is not None:
         sounds[sound_name].play()
 
-# Global game instance for particle effects
-game_instance = None
+# Gameplay events. The simulation doesn't play sounds or make smoke itself:
+# it emits events into the game's EventBus as things happen, and once per
+# simulation step the bus hands everything emitted to its consumers in one
+# batch. A game without consumers (headless runs, the split mode's
+# simulation process) simulates exactly the same, just silently and unseen.
+#
+# The bus is a ring of preallocated arrays, one slot per event: its kind, a
+# position and a number whose meaning depends on the kind. Emitting an event
+# writes into the next slot, so the simulation allocates nothing for it.
+EVENT_COIN = 0  # Coins collected from a formation; value = how many
+EVENT_THRUST = 1  # A step with the jetpack on, at the nozzle
+EVENT_GROUND_IMPACT = 2  # The player landed hard, at its feet; value = landing speed
+EVENT_OBSTACLE_SPAWNED = 3  # value = index in OBSTACLE_KINDS
+EVENT_DEATH = 4  # The player was hit, at where it was hit; value = index in OBSTACLE_KINDS
+EVENT_START = 5  # A run started
+EVENT_GAME_OVER = 6  # A run ended; value = final score
+EVENT_NAMES = ("coin", "thrust", "ground_impact", "obstacle_spawned", "death", "start", "game_over")
+OBSTACLE_KINDS = tuple(OBSTACLE_SIZES)
+EVENT_CAPACITY = 256  # Events a step can emit (a power of two); more than that are dropped and counted
+DUST_LANDING_SPEED = 3  # Landings at least this fast raise dust
+
+class EventBus:
+    def __init__(self, capacity=EVENT_CAPACITY):
+        self.mask = capacity - 1
+        self.kinds = array("B", bytes(capacity))
+        self.xs = array("d", bytes(8 * capacity))
+        self.ys = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.written = 0  # Events emitted so far; the next one goes in slot written & mask
+        self.read = 0  # Events handed to the consumers so far
+        self.counts = array("Q", bytes(8 * len(EVENT_NAMES)))  # Emitted per kind, ever
+        self.dropped = 0
+        self.consumers = []  # callable(game, bus, first, end), given events first to end - 1
+    
+    def emit(self, kind, x=0.0, y=0.0, value=0.0):
+        if self.written - self.read > self.mask:
+            self.dropped += 1  # Nobody is dispatching
+            return
+        slot = self.written & self.mask
+        self.kinds[slot] = kind
+        self.xs[slot] = x
+        self.ys[slot] = y
+        self.values[slot] = value
+        self.written += 1
+        self.counts[kind] += 1
+    
+    def dispatch(self, game):
+        """Hand the events emitted since the last dispatch to every consumer (even if there are none)"""
+        first, end = self.read, self.written
+        for consumer in self.consumers:
+            consumer(game, self, first, end)
+        self.read = end
+    
+    def discard(self):
+        """Forget the events not dispatched yet"""
+        self.read = self.written
+    
+    def summary(self):
+        totals = dict(zip(EVENT_NAMES, self.counts))
+        totals["dropped"] = self.dropped
+        return totals
+
+# Consumers the game starts with
+
+def event_sounds(game, bus, first, end):
+    for number in range(first, end):
+        kind = bus.kinds[number & bus.mask]
+        if kind == EVENT_GAME_OVER:
+            # Stop the jetpack sound if playing, before the step's own sounds,
+            # and pause the background music
+            pygame.mixer.stop()
+            pygame.mixer.music.pause()
+        elif kind == EVENT_START:
+            pygame.mixer.music.unpause()
+    play_jetpack_sound(play_event_sounds(bus, first, end))
+
+def play_event_sounds(bus, first, end):
+    """Play the sounds of events first to end - 1; returns whether one of them was thrust"""
+    thrusting = False
+    for number in range(first, end):
+        kind = bus.kinds[number & bus.mask]
+        if kind == EVENT_THRUST:
+            thrusting = True
+        elif kind == EVENT_COIN:
+            play_sound("coin")
+        elif kind == EVENT_OBSTACLE_SPAWNED:
+            play_sound("laser")  # Missiles and lasers share a warning sound
+        elif kind == EVENT_DEATH:
+            play_sound("explosion")
+        elif kind == EVENT_GAME_OVER:
+            play_sound("gameover")
+    return thrusting
+
+def play_jetpack_sound(thrusting):
+    # The jetpack sound plays on while thrusting, and stops when thrusting does
+    jetpack_sound = sounds.get("jetpack")
+    if jetpack_sound is not None:
+        if thrusting and not pygame.mixer.get_busy():
+            play_sound("jetpack")
+        elif not thrusting and jetpack_sound.get_num_channels():
+            jetpack_sound.stop()
+
+def event_effects(game, bus, first, end):
+    for number in range(first, end):
+        slot = number & bus.mask
+        kind = bus.kinds[slot]
+        if kind == EVENT_THRUST:
+            # Some smoke
+            if random.random() > 0.7:
+                game.add_particle(bus.xs[slot], bus.ys[slot])
+        elif kind == EVENT_GROUND_IMPACT:
+            # Some dust
+            for _ in range(5):
+                game.add_particle(bus.xs[slot] + random.randint(10, game.player.width - 10), bus.ys[slot],
+                                  is_dust=True)
+        elif kind == EVENT_DEATH:
+            game.explosions.append(Explosion(bus.xs[slot], bus.ys[slot]))
 
 # Particle class for visual effects
 class Particle:
     def __init__(self, x, y, is_dust=False):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.size = random.randint(3, 8)
         self.life = random.uniform(0.5, 1.5)
         self.is_dust = is_dust
@@ -273,6 +562,10 @@ class Particle:
             self.velocity_y = random.uniform(-0.5, 0.5)
     
     def update(self):
+        # Remember where we were for render interpolation
+        self.prev_x = self.x
+        self.prev_y = self.y
+        
         # Update position
         self.x += self.velocity_x
         self.y += self.velocity_y
@@ -288,7 +581,7 @@ class Particle:
         # Return True if particle is still alive
         return self.life > 0
     
-    def draw(self):
+    def draw(self, interpolation=1.0):
         # Calculate alpha based on remaining life
         alpha = int(255 * self.life)
         
@@ -312,32 +605,36 @@ class Particle:
             # Any error - fall back to white
             color = (255, 255, 255)
         
-        # Draw particle
-        particle_surface = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-        pygame.draw.circle(particle_surface, color, (self.size // 2, self.size // 2), self.size // 2)
-        
-        # Apply alpha by setting the surface alpha
-        particle_surface.set_alpha(alpha)
-        
-        # Draw to screen
-        screen.blit(particle_surface, (int(self.x), int(self.y)))
+        # Draw to screen at the interpolated position
+        x = lerp(self.prev_x, self.x, interpolation)
+        y = lerp(self.prev_y, self.y, interpolation)
+        renderer.particle(color, alpha, (int(x), int(y)), int(self.size))
 # Game classes
 class Player:
+    # Animation frames are the same for every player, so they're drawn once and shared
+    frame_cache = None
+    
     def __init__(self):
         self.width = 60
         self.height = 80
         self.x = 200
         self.y = SCREEN_HEIGHT // 2
+        self.prev_y = self.y
         self.velocity = 0
         self.jetpack_on = False
         self.alive = True
         self.frame = 0
         self.animation_speed = 0.2
+        self.events = None  # EventBus the player's thrust and landings are emitted into, if any
         self.jetpack_frames = []
         self.normal_frames = []
         
-        # Create player animations
-        self.create_player_frames()
+        # Create player animations (or reuse the shared ones)
+        if Player.frame_cache is None:
+            self.create_player_frames()
+            Player.frame_cache = (self.normal_frames, self.jetpack_frames)
+        else:
+            self.normal_frames, self.jetpack_frames = Player.frame_cache
         
         # Collision rectangle
         self.rect = pygame.Rect(self.x, self.y, self.width - 20, self.height - 20)
@@ -400,6 +697,9 @@ class Player:
             self.jetpack_frames.append(frame)
     
     def update(self):
+        # Remember where we were for render interpolation
+        self.prev_y = self.y
+        
         if not self.alive:
             return
             
@@ -412,19 +712,10 @@ class Player:
             # Gradually decrease velocity (accelerate upward) with a smoother transition
             self.velocity -= JETPACK_ACCELERATION
             
-            # Play jetpack sound
-            if "jetpack" in sounds and sounds["jetpack"] is not None:
-                if not pygame.mixer.get_busy():
-                    play_sound("jetpack")
-            
-            # Add some smoke particles for visual effect when jetpack is active
-            if random.random() > 0.7 and game_instance:
-                game_instance.add_particle(self.x + 5, self.y + self.height - 20)
+            # For the jetpack sound and smoke
+            if self.events is not None:
+                self.events.emit(EVENT_THRUST, self.x + 5, self.y + self.height - 20)
         else:
-            # Stop jetpack sound when not using jetpack
-            if "jetpack" in sounds and sounds["jetpack"] is not None:
-                pygame.mixer.stop()
-                
             # Add some deceleration when jetpack is turned off 
             if self.velocity < 0:
                 self.velocity += JETPACK_DECELERATION
@@ -444,13 +735,10 @@ class Player:
             self.velocity = self.velocity * -0.2  # Small bounce
         elif self.y > SCREEN_HEIGHT - self.height:
             self.y = SCREEN_HEIGHT - self.height
+            # Landings fast enough raise some dust
+            if self.events is not None and self.velocity >= DUST_LANDING_SPEED:
+                self.events.emit(EVENT_GROUND_IMPACT, self.x, self.y + self.height, self.velocity)
             self.velocity = self.velocity * -0.2  # Small bounce when hitting ground
-            
-            # Add some dust particles when hitting the ground
-            if self.velocity > 3 and game_instance:  # Only if coming down with some speed
-                for _ in range(5):
-                    game_instance.add_particle(self.x + random.randint(10, self.width - 10), 
-                                              self.y + self.height, is_dust=True)
         
         # Update collision rectangle
         self.rect.x = self.x + 10
@@ -459,38 +747,51 @@ class Player:
         # Update animation frame
         self.frame = (self.frame + self.animation_speed) % len(self.normal_frames)
     
-    def draw(self):
+    def draw(self, interpolation=1.0):
         # Choose appropriate frame based on jetpack state
         if self.jetpack_on:
             frame = self.jetpack_frames[int(self.frame)]
         else:
             frame = self.normal_frames[int(self.frame)]
         
-        # Draw player
-        screen.blit(frame, (self.x, self.y))
+        # Draw player between the last two simulation states
+        renderer.blit(frame, (self.x, lerp(self.prev_y, self.y, interpolation)))
         
         # Debug: draw collision rectangle
         # pygame.draw.rect(screen, RED, self.rect, 2)
+def obstacle_speed(obstacle_type):
+    return MISSILE_SPEED if obstacle_type == "missile" else SCROLL_SPEED
+
 class Obstacle:
-    def __init__(self, x, y, obstacle_type="missile"):
+    # Shared obstacle images keyed by (type, variant)
+    image_cache = {}
+    
+    def __init__(self, x, y, obstacle_type="missile", variant=None):
         self.x = x
         self.y = y
+        self.prev_x = x
         self.type = obstacle_type
         self.passed = False
         
-        if self.type == "missile":
-            self.width = 80
-            self.height = 30
-            self.speed = MISSILE_SPEED
-            self.create_missile_image()
-        elif self.type == "laser":
-            self.width = 30
-            self.height = 150
-            self.speed = SCROLL_SPEED
-            self.create_laser_image()
-        
-        # Collision rectangle
+        self.width, self.height = OBSTACLE_SIZES[self.type]
+        self.speed = obstacle_speed(self.type)
+        
+        # Pick one of the shared pre-drawn looks, drawing it the first time it's used
+        if variant is None:
+            variant = random.randrange(OBSTACLE_IMAGE_VARIANTS)
+        self.variant = variant
+        key = (self.type, variant)
+        if key not in Obstacle.image_cache:
+            if self.type == "missile":
+                self.create_missile_image()
+            elif self.type == "laser":
+                self.create_laser_image()
+            Obstacle.image_cache[key] = self.image
+        self.image = Obstacle.image_cache[key]
+        
+        # Collision rectangle, and the area it swept through on the last step
         self.rect = pygame.Rect(self.x, self.y, self.width, self.height)
+        self.sweep = self.rect.copy()
     
     def create_missile_image(self):
         self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
@@ -556,19 +857,70 @@ class Obstacle:
                 pygame.draw.rect(self.image, (255, 150, 150), (x, y, 2, 2))
     
     def update(self):
+        self.prev_x = self.x
         self.x -= self.speed
         self.rect.x = self.x
+        # A little larger than the exact area, as Rect rounds to whole pixels
+        self.sweep.update(self.x, self.y, self.prev_x - self.x + self.width, self.height)
+        self.sweep.inflate_ip(4, 4)
     
-    def draw(self):
-        screen.blit(self.image, (self.x, self.y))
+    def draw(self, interpolation=1.0):
+        renderer.blit(self.image, (lerp(self.prev_x, self.x, interpolation), self.y))
         
         # Debug: draw collision rectangle
         # pygame.draw.rect(screen, RED, self.rect, 2)
 
+def sweep_interval(start, velocity, low, high):
+    """The part of a step (0-1) during which start + velocity * t is strictly between low and high, as (enter, leave)"""
+    if velocity == 0:
+        return (0.0, 1.0) if low < start < high else (1.0, 0.0)
+    enter = (low - start) / velocity
+    leave = (high - start) / velocity
+    if enter > leave:
+        enter, leave = leave, enter
+    return max(enter, 0.0), min(leave, 1.0)
+
+def time_of_impact(player, obstacle):
+    """How far into the last step (0-1) the player's collision box first overlapped obstacle's, or None if it didn't"""
+    # Both boxes move in a straight line over a step: the obstacle from prev_x
+    # to x, the player's (inset 10px, see Player.update) from prev_y to y. In
+    # the player's frame of reference only the gap between them moves
+    box = player.rect
+    x_enter, x_leave = sweep_interval(obstacle.prev_x - (player.x + 10), obstacle.x - obstacle.prev_x,
+                                      -obstacle.width, box.width)
+    y_enter, y_leave = sweep_interval(obstacle.y - (player.prev_y + 10), player.prev_y - player.y,
+                                      -obstacle.height, box.height)
+    enter = max(x_enter, y_enter)
+    if enter < min(x_leave, y_leave):
+        return enter
+    return None
+
+def first_impact(player, obstacles):
+    """The obstacle the player ran into first during the last step, as (time_of_impact, obstacle), or None"""
+    # Cheap test first: which obstacles' swept areas overlap the player's at all
+    top = min(player.prev_y, player.y) + 10
+    sweep = pygame.Rect(player.x + 10, top, player.rect.width, abs(player.y - player.prev_y) + player.rect.height)
+    sweep.inflate_ip(4, 4)
+    # The exact test stays a loop: it rarely gets more than one obstacle, and
+    # for a handful NumPy's per-call overhead costs far more than it saves
+    impacts = []
+    for index in sweep.collidelistall([obstacle.sweep for obstacle in obstacles]):
+        hit_time = time_of_impact(player, obstacles[index])
+        if hit_time is not None:
+            impacts.append((hit_time, index))
+    if not impacts:
+        return None
+    hit_time, index = min(impacts)
+    return hit_time, obstacles[index]
+
 class Coin:
+    # Animation frames are the same for every coin, so they're drawn once and shared
+    frame_cache = None
+    
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        self.prev_x = x
         self.width = 30
         self.height = 30
         self.collected = False
@@ -576,8 +928,12 @@ class Coin:
         self.animation_speed = 0.1
         self.frames = []
         
-        # Create coin animation frames
-        self.create_coin_frames()
+        # Create coin animation frames (or reuse the shared ones)
+        if Coin.frame_cache is None:
+            self.create_coin_frames()
+            Coin.frame_cache = self.frames
+        else:
+            self.frames = Coin.frame_cache
         
         # Collision rectangle
         self.rect = pygame.Rect(self.x, self.y, self.width, self.height)
@@ -619,42 +975,264 @@ class Coin:
             self.frames.append(frame)
     
     def update(self):
+        self.prev_x = self.x
         self.x -= SCROLL_SPEED
         self.rect.x = self.x
         
         # Update animation
         self.animation_frame = (self.animation_frame + self.animation_speed) % len(self.frames)
     
-    def draw(self):
+    def draw(self, interpolation=1.0):
         if not self.collected:
-            screen.blit(self.frames[int(self.animation_frame)], (self.x, self.y))
+            x = lerp(self.prev_x, self.x, interpolation)
+            renderer.blit(self.frames[int(self.animation_frame)], (x, self.y))
             
             # Debug: draw collision rectangle
             # pygame.draw.rect(screen, RED, self.rect, 2)
+# Relative coin positions for the random spawn patterns, by coin number
+COIN_PATTERNS = {
+    "line": lambda i: (i * COIN_SPACING, 0),
+    "arc": lambda i: (i * COIN_SPACING, int(math.sin(i * 0.5) * 80)),
+    "zigzag": lambda i: (i * COIN_SPACING, 50 if i % 2 == 0 else -50),
+}
+
+# Shapes for bonus formations, one coin per "#"
+COIN_STENCILS = {
+    "heart": [
+        ".##...##.",
+        "####.####",
+        "#########",
+        ".#######.",
+        "..#####..",
+        "...###...",
+        "....#....",
+    ],
+    "diamond": [
+        "....#....",
+        "...###...",
+        "..#####..",
+        ".#######.",
+        "..#####..",
+        "...###...",
+        "....#....",
+    ],
+    "arrow": [
+        "....#....",
+        "....##...",
+        "#########",
+        "##########",
+        "#########",
+        "....##...",
+        "....#....",
+    ],
+}
+
+# A formation's coin positions relative to its top-left corner, sorted left
+# to right. origin is where the pattern's own (0, 0) ended up, so a pattern
+# can be placed by its starting point. Layouts are immutable and shared by every
+# formation (and snapshot) using them.
+CoinLayout = namedtuple("CoinLayout", ["name", "offsets", "xs", "width", "height", "origin"])
+
+def make_coin_layout(positions, name=None):
+    positions = sorted(positions)
+    min_x = min(x for x, y in positions)
+    min_y = min(y for x, y in positions)
+    offsets = tuple((x - min_x, y - min_y) for x, y in positions)
+    return CoinLayout(
+        name,
+        offsets,
+        tuple(x for x, y in offsets),
+        max(x for x, y in offsets) + COIN_SIZE,
+        max(y for x, y in offsets) + COIN_SIZE,
+        (-min_x, -min_y),
+    )
+
+coin_layouts = {}  # Layouts built so far, by name
+
+def pattern_layout(pattern, num_coins):
+    name = f"{pattern}:{num_coins}"
+    if name not in coin_layouts:
+        coin_layouts[name] = make_coin_layout([COIN_PATTERNS[pattern](i) for i in range(num_coins)], name)
+    return coin_layouts[name]
+
+def stencil_layout(rows, name=None):
+    positions = [(column * COIN_SPACING, row * COIN_SPACING)
+                 for row, line in enumerate(rows)
+                 for column, char in enumerate(line) if char == "#"]
+    return make_coin_layout(positions, name)
+
+def named_stencil_layout(stencil):
+    name = f"stencil:{stencil}"
+    if name not in coin_layouts:
+        coin_layouts[name] = stencil_layout(COIN_STENCILS[stencil], name)
+    return coin_layouts[name]
+
+# Spell text out in coins, one coin per pixel of a tiny rendering of it
+def text_layout(text, font_size=10):
+    name = f"text:{text}"
+    if name not in coin_layouts:
+        rendered = pygame.font.Font(None, font_size).render(text, False, WHITE)
+        mask = pygame.mask.from_surface(rendered)
+        rows = ["".join("#" if mask.get_at((x, y)) else "." for x in range(mask.get_size()[0]))
+                for y in range(mask.get_size()[1])]
+        coin_layouts[name] = stencil_layout(rows, name)
+    return coin_layouts[name]
+
+# Draw a coin frame at each offset onto a colorkeyed surface. Coin art only
+# has fully clear or fully opaque pixels, so a colorkey loses nothing, and
+# with RLE acceleration blits skip the clear runs instead of blending them.
+def keyed_coin_surface(width, height, frame, offsets):
+    surface = pygame.Surface((width, height))
+    surface.fill(FORMATION_COLORKEY)
+    surface.blits([(frame, offset) for offset in offsets], False)
+    surface.set_colorkey(FORMATION_COLORKEY, pygame.RLEACCEL)
+    return surface
+
+# A group of coins that moves, animates and is drawn as one entity. Which
+# coins have been collected is a bitset over the layout's offsets.
+class CoinFormation:
+    # Pre-drawn animation frames of whole formations, by layout name
+    surface_cache = {}
+    # Colorkeyed copies of the coin frames, for formations drawn coin by coin
+    frame_cache = None
+    
+    def __init__(self, layout, x, y):
+        self.layout = layout
+        self.x = x
+        self.y = y
+        self.prev_x = x
+        self.width = layout.width
+        self.height = layout.height
+        self.collected = 0  # Bit i set once coin i has been collected
+        self.remaining = list(layout.offsets)
+        self.animation_frame = 0
+        self.animation_speed = 0.1
+        if CoinFormation.frame_cache is None:
+            if Coin.frame_cache is None:
+                Coin(0, 0)
+            CoinFormation.frame_cache = [keyed_coin_surface(COIN_SIZE, COIN_SIZE, frame, [(0, 0)])
+                                         for frame in Coin.frame_cache]
+        self.frames = CoinFormation.frame_cache
+        
+        # Big named formations draw from shared whole-formation frames until
+        # a coin is collected, then coin by coin like the rest
+        self.surfaces = None
+        if CoinFormation.uses_surfaces(layout):
+            self.surfaces = CoinFormation.formation_surfaces(layout)
+        
+        # Bounding box, checked before any individual coin
+        self.rect = pygame.Rect(self.x, self.y, self.width, self.height)
+    
+    @staticmethod
+    def uses_surfaces(layout):
+        return layout.name is not None and len(layout.offsets) >= FORMATION_SURFACE_MIN_COINS
+    
+    @staticmethod
+    def draw_next_surface(layout):
+        """Draw one more of a layout's formation frames; returns True once they're all drawn"""
+        cache = CoinFormation.surface_cache
+        if layout.name not in cache:
+            if len(cache) >= FORMATION_SURFACE_CACHE_SIZE:
+                del cache[next(iter(cache))]  # Drop the oldest layout
+            cache[layout.name] = []
+        surfaces = cache[layout.name]
+        if len(surfaces) < len(Coin.frame_cache):
+            frame = Coin.frame_cache[len(surfaces)]
+            surfaces.append(keyed_coin_surface(layout.width, layout.height, frame, layout.offsets))
+        return len(surfaces) == len(Coin.frame_cache)
+    
+    @staticmethod
+    def formation_surfaces(layout):
+        while not CoinFormation.draw_next_surface(layout):
+            pass
+        return CoinFormation.surface_cache[layout.name]
+    
+    @property
+    def remaining_count(self):
+        return len(self.remaining)
+    
+    def set_collected(self, collected):
+        self.collected = collected
+        self.remaining = [offset for i, offset in enumerate(self.layout.offsets) if not collected >> i & 1]
+        if collected:
+            self.surfaces = None
+    
+    def update(self):
+        self.prev_x = self.x
+        self.x -= SCROLL_SPEED
+        self.rect.x = self.x
+        
+        # One animation frame for the whole formation
+        self.animation_frame = (self.animation_frame + self.animation_speed) % len(self.frames)
+    
+    def collect(self, rect):
+        """Collect every coin touching rect; returns how many were collected"""
+        if not self.rect.colliderect(rect):
+            return 0
+        
+        # Only coins in the columns rect spans can touch it
+        left = self.rect.x
+        top = self.rect.y
+        layout = self.layout
+        first = bisect.bisect_right(layout.xs, rect.left - left - COIN_SIZE)
+        last = bisect.bisect_left(layout.xs, rect.right - left)
+        collected = self.collected
+        for i in range(first, last):
+            y = top + layout.offsets[i][1]
+            if y < rect.bottom and y + COIN_SIZE > rect.top:
+                collected |= 1 << i
+        
+        count = (collected & ~self.collected).bit_count()
+        if count:
+            self.set_collected(collected)
+        return count
+    
+    def draw(self, interpolation=1.0):
+        x = lerp(self.prev_x, self.x, interpolation)
+        frame_index = int(self.animation_frame)
+        if self.surfaces is not None:
+            renderer.blit(self.surfaces[frame_index], (x, self.y))
+        else:
+            y = self.y
+            renderer.blits(self.frames[frame_index], [(x + dx, y + dy) for dx, dy in self.remaining])
+            
+        # Debug: draw bounding box
+        # pygame.draw.rect(screen, RED, self.rect, 2)
+
 class Background:
+    # Layer images are the same for every background, so they're drawn once and
+    # shared; each background only keeps its own scroll positions
+    image_cache = None
+    
     def __init__(self):
         self.width = SCREEN_WIDTH
         self.height = SCREEN_HEIGHT
-        
-        # Create layers for parallax effect
-        self.layers = []
-        
+        if Background.image_cache is None:
+            Background.image_cache = self.create_layer_images()
+        sky, buildings_far, buildings_mid, buildings_close, ground = Background.image_cache
+        
+        # Layers for parallax effect, back to front
+        self.layers = [
+            {"image": sky, "speed": 0, "x": 0, "prev_x": 0},
+            {"image": buildings_far, "speed": 1, "x": 0, "prev_x": 0},
+            {"image": buildings_mid, "speed": 2, "x": 0, "prev_x": 0},
+            {"image": buildings_close, "speed": 3, "x": 0, "prev_x": 0},
+            {"image": ground, "speed": BACKGROUND_SPEED, "x": 0, "prev_x": 0, "y": self.height - 100},
+        ]
+    
+    def create_layer_images(self):
         # Sky layer (static)
         sky = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
         sky.fill(LIGHT_BLUE)
-        self.layers.append({"image": sky, "speed": 0, "x": 0})
         
         # Distant buildings layer
         buildings_far = self.create_buildings_layer(0.7, 200, 300, GRAY)
-        self.layers.append({"image": buildings_far, "speed": 1, "x": 0})
         
         # Mid-distance buildings layer
         buildings_mid = self.create_buildings_layer(0.8, 150, 350, (80, 80, 100))
-        self.layers.append({"image": buildings_mid, "speed": 2, "x": 0})
         
         # Close buildings layer
         buildings_close = self.create_buildings_layer(1.0, 100, 400, (50, 50, 70))
-        self.layers.append({"image": buildings_close, "speed": 3, "x": 0})
         
         # Ground layer
         ground = pygame.Surface((self.width, 100), pygame.SRCALPHA)
@@ -666,7 +1244,8 @@ class Background:
             size = random.randint(2, 5)
             color = (80, 80, 80)
             pygame.draw.rect(ground, color, (x, y, size, size))
-        self.layers.append({"image": ground, "speed": BACKGROUND_SPEED, "x": 0, "y": self.height - 100})
+        
+        return sky, buildings_far, buildings_mid, buildings_close, ground
     
     def create_buildings_layer(self, opacity, min_height, max_height, base_color):
         layer = pygame.Surface((self.width * 2, self.height), pygame.SRCALPHA)
@@ -739,30 +1318,38 @@ class Background:
     def update(self):
         # Update layer positions for parallax scrolling
         for layer in self.layers:
+            layer["prev_x"] = layer["x"]
             layer["x"] -= layer["speed"]
             
             # Reset position when image has scrolled off screen
             if "speed" in layer and layer["speed"] > 0:
                 if layer["x"] <= -self.width:
                     layer["x"] = 0
+                    # Shift the previous position too so interpolation doesn't sweep back across the screen
+                    layer["prev_x"] += self.width
     
-    def draw(self):
+    def draw(self, interpolation=1.0):
         # Draw sky (static)
-        screen.blit(self.layers[0]["image"], (0, 0))
+        renderer.blit(self.layers[0]["image"], (0, 0))
         
         # Draw scrolling layers
         for i in range(1, len(self.layers)):
             layer = self.layers[i]
+            x = lerp(layer["prev_x"], layer["x"], interpolation)
             if "y" in layer:
-                screen.blit(layer["image"], (layer["x"], layer["y"]))
+                renderer.blit(layer["image"], (x, layer["y"]))
                 # Draw a second copy for seamless scrolling
-                screen.blit(layer["image"], (layer["x"] + self.width, layer["y"]))
+                renderer.blit(layer["image"], (x + self.width, layer["y"]))
             else:
-                screen.blit(layer["image"], (layer["x"], 0))
+                renderer.blit(layer["image"], (x, 0))
                 # Draw a second copy for seamless scrolling
-                screen.blit(layer["image"], (layer["x"] + self.width, 0))
+                renderer.blit(layer["image"], (x + self.width, 0))
 
 class Explosion:
+    # Drawing the frames pixel by pixel is slow enough to freeze the game
+    # for a moment, so it's done once and shared by every explosion
+    frame_cache = None
+    
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -772,8 +1359,12 @@ class Explosion:
         self.size = 100
         self.frames = []
         
-        # Create explosion frames
-        self.create_explosion_frames()
+        # Create explosion frames (or reuse the shared ones)
+        if Explosion.frame_cache is None:
+            self.create_explosion_frames()
+            Explosion.frame_cache = self.frames
+        else:
+            self.frames = Explosion.frame_cache
     
     def create_explosion_frames(self):
         for i in range(self.max_frames):
@@ -840,32 +1431,349 @@ class Explosion:
     def draw(self):
         if int(self.frame) < len(self.frames):
             frame = self.frames[int(self.frame)]
-            screen.blit(frame, (self.x - frame.get_width() // 2, self.y - frame.get_height() // 2))
+            renderer.blit(frame, (self.x - frame.get_width() // 2, self.y - frame.get_height() // 2))
+# The HUD's and menus' icons, drawn once and shared like the other sprites
+ui_icons = {}
+
+def ui_icon(name):
+    icon = ui_icons.get(name)
+    if icon is None:
+        icon = ui_icons[name] = draw_ui_icon(name)
+    return icon
+
+def draw_ui_icon(name):
+    if name == "hud_coin":
+        icon = pygame.Surface((16, 16), pygame.SRCALPHA)
+        pygame.draw.rect(icon, YELLOW, (0, 0, 16, 16))
+        pygame.draw.rect(icon, (200, 200, 0), (2, 2, 12, 12))
+    elif name == "coin":
+        icon = pygame.Surface((24, 24), pygame.SRCALPHA)
+        pygame.draw.rect(icon, YELLOW, (0, 0, 24, 24))
+        pygame.draw.rect(icon, (200, 200, 0), (4, 4, 16, 16))
+    elif name == "jetpack":
+        icon = pygame.Surface((40, 60), pygame.SRCALPHA)
+        pygame.draw.rect(icon, BLUE, (10, 0, 20, 40))  # Body
+        pygame.draw.rect(icon, GRAY, (0, 20, 10, 30))  # Jetpack
+        pygame.draw.rect(icon, ORANGE, (0, 50, 10, 10))  # Flame
+    elif name == "skull":
+        skull_size = 60
+        icon = pygame.Surface((skull_size, skull_size), pygame.SRCALPHA)
+        # Skull base
+        pygame.draw.rect(icon, WHITE, (10, 10, skull_size - 20, skull_size - 20))
+        # Eyes
+        pygame.draw.rect(icon, BLACK, (15, 25, 10, 10))
+        pygame.draw.rect(icon, BLACK, (skull_size - 25, 25, 10, 10))
+        # Nose
+        pygame.draw.rect(icon, BLACK, (skull_size // 2 - 2, 35, 4, 4))
+        # Teeth
+        for i in range(3):
+            pygame.draw.rect(icon, BLACK, (20 + i*10, 45, 2, 10))
+    else:
+        raise ValueError(f"no UI icon called {name!r}")
+    return icon
+
+UI_ICONS = ("hud_coin", "coin", "jetpack", "skull")
+
+# Text centred across the screen at height y; returns its width
+def draw_centered_text(font, string, color, y):
+    width = font.size(string)[0]
+    renderer.text(font, string, color, (SCREEN_WIDTH // 2 - width // 2, y))
+    return width
+
+# Draw every shared sprite up front so none of them is drawn mid-game. Big
+# coin formations (e.g. bonus stage stencils) are only pre-drawn if passed in.
+def prebuild_sprites(formation_layouts=()):
+    Background()
+    Coin(0, 0)
+    CoinFormation(pattern_layout("line", 1), 0, 0)
+    for layout in formation_layouts:
+        CoinFormation(layout, 0, 0)
+    for obstacle_type in ("missile", "laser"):
+        for variant in range(OBSTACLE_IMAGE_VARIANTS):
+            Obstacle(0, 0, obstacle_type, variant)
+    Explosion(0, 0)
+    for name in UI_ICONS:
+        ui_icon(name)
+
+# Every shared sprite surface, e.g. for a renderer to upload up front
+def sprite_surfaces(game):
+    for layer in game.background.layers:
+        yield layer["image"]
+    for frames in Player.frame_cache:
+        yield from frames
+    yield from Coin.frame_cache
+    yield from CoinFormation.frame_cache
+    for surfaces in CoinFormation.surface_cache.values():
+        yield from surfaces
+    yield from Obstacle.image_cache.values()
+    yield from Explosion.frame_cache
+    yield from ui_icons.values()
+
+# One planned spawn: kind is "missile", "laser" or "coins" (layout is set
+# for coins), x and y are where it enters the screen and time is the
+# simulation time it's due
+PlannedSpawn = namedtuple("PlannedSpawn", ["time", "kind", "x", "y", "layout"])
+
+def spawn_size(spawn):
+    if spawn.layout is not None:
+        return spawn.layout.width, spawn.layout.height
+    return OBSTACLE_SIZES[spawn.kind]
+
+def spawn_speed(spawn):
+    return SCROLL_SPEED if spawn.layout is not None else obstacle_speed(spawn.kind)
+
+# Left edge of a spawn at simulation time t
+def spawn_x(spawn, t):
+    return spawn.x - spawn_speed(spawn) * (t - spawn.time) / SIM_STEP_MS
+
+# Simulation time a spawn has scrolled off the left of the screen
+def spawn_exit_time(spawn):
+    return spawn.time + (spawn.x + spawn_size(spawn)[0]) / spawn_speed(spawn) * SIM_STEP_MS
+
+# Do two spawns ever come within clearance px of each other on screen?
+def paths_cross(a, b, clearance):
+    a_width, a_height = spawn_size(a)
+    b_width, b_height = spawn_size(b)
+    if a.y >= b.y + b_height + clearance or b.y >= a.y + a_height + clearance:
+        return False
+    start = max(a.time, b.time)
+    end = min(spawn_exit_time(a), spawn_exit_time(b))
+    if start >= end:
+        return False
+    # Both move at constant speed, so the gap between them changes linearly
+    low, high = sorted((spawn_x(a, start) - spawn_x(b, start), spawn_x(a, end) - spawn_x(b, end)))
+    return low < b_width + clearance and high > -a_width - clearance
+
+def intersect_intervals(intervals, others):
+    return [(max(low, other_low), min(high, other_high))
+            for low, high in intervals for other_low, other_high in others
+            if max(low, other_low) <= min(high, other_high)]
+
+def widen_intervals(intervals, amount, low_limit, high_limit):
+    widened = []
+    for low, high in sorted((max(low_limit, low - amount), min(high_limit, high + amount)) for low, high in intervals):
+        if widened and low <= widened[-1][1]:
+            widened[-1] = (widened[-1][0], max(widened[-1][1], high))
+        else:
+            widened.append((low, high))
+    return widened
+
+# Plans the level ahead of the simulation as plain PlannedSpawn data, so
+# spawns can be checked against each other before they happen: coins are
+# kept clear of obstacle paths, and every run of obstacles has to leave the
+# player a way through at PLAYER_CLIMB_RATE. Planning draws from the game's
+# seeded generator, so a seeded game still plays out the same.
+class LevelPlanner:
+    def __init__(self, rng, player):
+        self.rng = rng
+        self.obstacle_types = ["missile", "laser"]
+        self.pending = deque()  # Planned spawns that aren't due yet, in time order
+        self.released = deque()  # Spawns on screen (as far as the plan knows), for overlap checks
+        self.last_obstacle_time = 0
+        self.last_coin_time = 0
+        self.rejected = 0  # Placements that broke a constraint (for tuning, not saved in snapshots)
+        self.dropped = 0  # Spawns left out after PLAN_RETRIES rejections
+        
+        # Where the player's collision box can be
+        self.player_left = player.rect.left
+        self.player_right = player.rect.right
+        self.player_top = player.rect.y - player.y
+        self.player_bottom = SCREEN_HEIGHT - player.height + self.player_top
+        self.player_box_height = player.rect.height
+    
+    def snapshot(self):
+        return (tuple(self.pending), tuple(self.released), self.last_obstacle_time, self.last_coin_time)
+    
+    def restore(self, state):
+        pending, released, self.last_obstacle_time, self.last_coin_time = state
+        self.pending = deque(pending)
+        self.released = deque(released)
+    
+    def plan(self, until, max_spawns=1):
+        """Plan spawns due up to simulation time until, at most max_spawns of them per call"""
+        for _ in range(max_spawns):
+            obstacle_time = self.last_obstacle_time + OBSTACLE_FREQUENCY
+            coin_time = self.last_coin_time + COIN_FREQUENCY
+            if min(obstacle_time, coin_time) > until:
+                return
+            if obstacle_time <= coin_time:
+                self.last_obstacle_time = obstacle_time
+                self.plan_obstacle(obstacle_time)
+            else:
+                self.last_coin_time = coin_time
+                self.plan_coins(coin_time)
+    
+    def release(self, now):
+        """Take the spawns that are due by simulation time now off the plan"""
+        while self.released and spawn_exit_time(self.released[0]) < now:
+            self.released.popleft()
+        due = []
+        while self.pending and self.pending[0].time <= now:
+            spawn = self.pending.popleft()
+            self.released.append(spawn)
+            due.append(spawn)
+        return due
+    
+    def planned(self):
+        return list(self.released) + list(self.pending)
+    
+    def plan_obstacle(self, time):
+        obstacle_type = self.rng.choice(self.obstacle_types)
+        y_range = MISSILE_Y_RANGE if obstacle_type == "missile" else LASER_Y_RANGE
+        coins_on_screen = [other for other in self.released if other.layout is not None]
+        for _ in range(PLAN_RETRIES):
+            spawn = PlannedSpawn(time, obstacle_type, SCREEN_WIDTH, self.rng.randint(*y_range), None)
+            if (self.playable(spawn) and
+                    not any(paths_cross(spawn, coins, SPAWN_CLEARANCE) for coins in coins_on_screen)):
+                break
+            self.rejected += 1
+        else:
+            self.dropped += 1
+            return  # No fair place for it, so leave it out
+        
+        # Coins that haven't appeared yet make way for obstacles: move them, or drop them
+        pending = []
+        for other in self.pending:
+            if other.layout is not None and paths_cross(spawn, other, SPAWN_CLEARANCE):
+                other = self.place_coins(other.time, other.layout, exclude=spawn)
+            if other is not None:
+                pending.append(other)
+        pending.append(spawn)
+        self.pending = deque(pending)
+    
+    def plan_coins(self, time):
+        # A small cluster of coins: line, arc or zigzag
+        num_coins = self.rng.randint(3, 8)
+        pattern = self.rng.choice(["line", "arc", "zigzag"])
+        spawn = self.place_coins(time, pattern_layout(pattern, num_coins))
+        if spawn is not None:
+            self.pending.append(spawn)
+    
+    def place_coins(self, time, layout, exclude=None):
+        # Pick a height for a formation that keeps it clear of every obstacle path
+        obstacles = [other for other in self.planned() if other.layout is None]
+        if exclude is not None:
+            obstacles.append(exclude)
+        origin_x, origin_y = layout.origin
+        for _ in range(PLAN_RETRIES):
+            start_y = self.rng.randint(100, SCREEN_HEIGHT - 150)
+            spawn = PlannedSpawn(time, "coins", SCREEN_WIDTH - origin_x, start_y - origin_y, layout)
+            if not any(paths_cross(spawn, obstacle, SPAWN_CLEARANCE) for obstacle in obstacles):
+                return spawn
+            self.rejected += 1
+        self.dropped += 1
+        return None
+    
+    # Time window in which a spawn overlaps the player's column
+    def player_window(self, spawn):
+        speed = spawn_speed(spawn)
+        width = spawn_size(spawn)[0]
+        arrive = spawn.time + (spawn.x - self.player_right) / speed * SIM_STEP_MS
+        leave = spawn.time + (spawn.x + width - self.player_left) / speed * SIM_STEP_MS
+        return arrive, leave
+    
+    def playable(self, candidate):
+        """Can a player get past candidate and the obstacles planned around it?"""
+        arrive, leave = self.player_window(candidate)
+        windows = []
+        for spawn in self.planned() + [candidate]:
+            if spawn.layout is None:
+                window = self.player_window(spawn)
+                # Obstacles that have long passed (or are far off) don't constrain this one
+                if window[1] > arrive - LOOKAHEAD_MS and window[0] < leave + LOOKAHEAD_MS:
+                    windows.append(window + (spawn,))
+        windows.sort(key=lambda window: window[0])
+        
+        # Walk through the obstacles in the order they reach the player,
+        # tracking the heights the player could be at, starting from anywhere
+        reachable = [(self.player_top, self.player_bottom)]
+        active = []
+        time = windows[0][0]
+        for window_arrive, window_leave, spawn in windows:
+            climb = (window_arrive - time) / SIM_STEP_MS * PLAYER_CLIMB_RATE
+            reachable = widen_intervals(reachable, climb, self.player_top, self.player_bottom)
+            active = [(other_leave, safe) for other_leave, safe in active if other_leave > window_arrive]
+            active.append((window_leave, self.safe_heights(spawn)))
+            for _, safe in active:
+                reachable = intersect_intervals(reachable, safe)
+            if not reachable:
+                return False
+            time = window_arrive
+        return True
+    
+    # Heights the player's box can be at without touching an obstacle
+    def safe_heights(self, spawn):
+        height = spawn_size(spawn)[1]
+        safe = []
+        if spawn.y - self.player_box_height >= self.player_top:
+            safe.append((self.player_top, spawn.y - self.player_box_height))
+        if spawn.y + height <= self.player_bottom:
+            safe.append((spawn.y + height, self.player_bottom))
+        return safe
+
+# Compact copy of all simulation state. Everything in it is an immutable
+# tuple or number, so taking one never deep-copies and it can be restored
+# any number of times. Surfaces are never included - entities point back
+# at the shared sprite caches when they're restored. Visual-only state
+# (particles, explosions) is not part of a snapshot.
+GameSnapshot = namedtuple("GameSnapshot", [
+    "player",  # (y, prev_y, velocity, jetpack_on, alive, frame)
+    "obstacles",  # ((type, x, prev_x, y, passed, variant), ...)
+    "coin_formations",  # ((layout, x, prev_x, y, collected bits, animation_frame), ...)
+    "score",
+    "coins_collected",
+    "game_state",
+    "sim_time",
+    "level",  # LevelPlanner.snapshot()
+    "rng_state",
+])
+
 class Game:
-    def __init__(self):
+    def __init__(self, seed=None):
+        # Gameplay randomness (what spawns where) has its own generator so a
+        # seeded game plays out the same regardless of visual effects
+        self.seed = seed
+        self.rng = random.Random(seed)
+        
         self.player = Player()
         self.background = Background()
         self.obstacles = []
-        self.coins = []
+        self.coin_formations = []
         self.explosions = []
         self.particles = []  # Add particles list for visual effects
         self.score = 0
         self.high_score = 0
         self.coins_collected = 0  # Track collected coins separately
         self.game_state = "menu"  # menu, playing, game_over
-        self.last_obstacle_time = 0
-        self.last_coin_time = 0
-        self.obstacle_types = ["missile", "laser"]
-        
-        # Make this instance globally accessible for particles
-        global game_instance
-        game_instance = self
+        self.sim_time = 0  # Simulated milliseconds, advanced by SIM_STEP_MS per update
+        self.level = LevelPlanner(self.rng, self.player)
+        self.hotkeys = {}  # Extra key -> callback(game) bindings, e.g. debug reports
+        self.thrust_tapped = False  # Thrust pressed since the last step (it may be released already)
+        self.thrust_held = thrust_held  # callable() -> whether the thrust control is held right now
+        self.death_cause = None  # Type of the obstacle that ended the run
+        self.quit_requested = False  # Set by the window closing or Escape; the game loop stops
+        self.latency = None  # Optional jetpack_latency.LatencyMonitor, told about thrust input
+        self.ghosts = None  # Optional jetpack_ghosts.GhostRace, recording runs and racing earlier ones
+        self.autopilot = None  # Optional jetpack_autopilot.Autopilot, flying instead of the player
+        self.recorder = None  # Optional jetpack_session.SessionRecorder, keeping runs to replay
+        
+        # Sounds and effects are played from the events the simulation emits;
+        # take the consumers out to simulate without them
+        self.events = EventBus()
+        self.events.consumers = [event_sounds, event_effects]
+        self.player.events = self.events
+        
+        # Fresh-run state that start_game restores instead of rebuilding everything
+        self.pristine_state = self.snapshot()._replace(game_state="playing")
     
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                self.quit_requested = True
+                return
+            
+            if event.type == pygame.VIDEORESIZE:
+                renderer.resize(event.size)
             
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
@@ -876,11 +1784,11 @@ class Game:
                         play_sound("menu")
                         self.start_game()
                     elif self.game_state == "playing":
-                        self.player.jetpack_on = True
+                        self.thrust_input(event, True)
                 
                 if event.key == pygame.K_ESCAPE:
-                    pygame.quit()
-                    sys.exit()
+                    self.quit_requested = True
+                    return
                 
                 # Toggle music with M key
                 if event.key == pygame.K_m:
@@ -893,10 +1801,13 @@ class Game:
                 if event.key == pygame.K_s:
                     global sounds_enabled
                     sounds_enabled = not sounds_enabled
+                
+                if event.key in self.hotkeys:
+                    self.hotkeys[event.key](self)
             
             if event.type == pygame.KEYUP:
                 if event.key == pygame.K_SPACE and self.game_state == "playing":
-                    self.player.jetpack_on = False
+                    self.thrust_input(event, False)
             
             # Mouse controls
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -907,61 +1818,148 @@ class Game:
                     play_sound("menu")
                     self.start_game()
                 elif self.game_state == "playing":
-                    self.player.jetpack_on = True
+                    self.thrust_input(event, True)
             
             if event.type == pygame.MOUSEBUTTONUP and self.game_state == "playing":
-                self.player.jetpack_on = False
+                self.thrust_input(event, False)
+    
+    def thrust_input(self, event, pressed):
+        # The jetpack follows the live key and mouse state (see poll_input);
+        # presses are latched so a tap shorter than a step still counts
+        if pressed:
+            self.thrust_tapped = True
+        if self.latency is not None:
+            self.latency.input_arrived(getattr(event, "time", None))
+    
+    def poll_input(self):
+        """Set the jetpack from the keyboard and mouse as they are right now"""
+        if self.game_state != "playing":
+            self.thrust_tapped = False
+            return
+        if self.autopilot is not None:
+            self.player.jetpack_on = self.autopilot.decide(self)
+        else:
+            self.player.jetpack_on = self.thrust_held() or self.thrust_tapped
+        self.thrust_tapped = False
+    
+    def step(self):
+        """One simulation step driven by live input (update() alone leaves the jetpack as it is)"""
+        self.poll_input()
+        self.update()
+        if self.latency is not None:
+            self.latency.step_simulated()
     
     def start_game(self):
-        self.player = Player()
+        # Reset to the pristine state (this also resets coins collected)
+        self.restore(self.pristine_state)
+        
+        # New run, new spawn sequence (unless the game was seeded)
+        self.rng.seed(self.seed)
+        self.thrust_tapped = False
+        self.death_cause = None
+        if self.ghosts is not None:
+            self.ghosts.start()
+        if self.recorder is not None:
+            self.recorder.start(self)
+        
+        # The music resumes when the consumers hear of it
+        self.events.emit(EVENT_START)
+    
+    def snapshot(self):
+        """Capture the simulation state as a GameSnapshot"""
+        player = self.player
+        return GameSnapshot(
+            (player.y, player.prev_y, player.velocity, player.jetpack_on, player.alive, player.frame),
+            tuple((o.type, o.x, o.prev_x, o.y, o.passed, o.variant) for o in self.obstacles),
+            tuple((f.layout, f.x, f.prev_x, f.y, f.collected, f.animation_frame) for f in self.coin_formations),
+            self.score,
+            self.coins_collected,
+            self.game_state,
+            self.sim_time,
+            self.level.snapshot(),
+            self.rng.getstate(),
+        )
+    
+    def restore(self, snapshot):
+        """Put the simulation back into the state captured by snapshot()"""
+        # Reuse the player object - its frames are shared anyway
+        player = self.player
+        player.y, player.prev_y, player.velocity, player.jetpack_on, player.alive, player.frame = snapshot.player
+        player.rect.x = player.x + 10
+        player.rect.y = player.y + 10
+        
         self.obstacles = []
-        self.coins = []
+        for obstacle_type, x, prev_x, y, passed, variant in snapshot.obstacles:
+            obstacle = Obstacle(x, y, obstacle_type, variant)
+            obstacle.prev_x = prev_x
+            obstacle.passed = passed
+            self.obstacles.append(obstacle)
+        
+        self.coin_formations = []
+        for layout, x, prev_x, y, collected, animation_frame in snapshot.coin_formations:
+            formation = CoinFormation(layout, x, y)
+            formation.prev_x = prev_x
+            formation.animation_frame = animation_frame
+            if collected:
+                formation.set_collected(collected)
+            self.coin_formations.append(formation)
+        
         self.explosions = []
         self.particles = []
-        self.score = 0
-        self.coins_collected = 0  # Reset coins collected
-        self.game_state = "playing"
-        self.last_obstacle_time = pygame.time.get_ticks()
-        self.last_coin_time = pygame.time.get_ticks()
-        
-        # Resume background music
-        pygame.mixer.music.unpause()
+        self.events.discard()
+        self.score = snapshot.score
+        self.coins_collected = snapshot.coins_collected
+        self.game_state = snapshot.game_state
+        self.sim_time = snapshot.sim_time
+        self.level.restore(snapshot.level)
+        self.rng.setstate(snapshot.rng_state)
     
     def add_particle(self, x, y, is_dust=False):
         """Add a new particle effect at the specified position"""
         self.particles.append(Particle(x, y, is_dust))
     
     def update(self):
+        # Session recordings start each step with the state it starts from
+        if self.recorder is not None and self.game_state == "playing":
+            self.recorder.record(self)
+        
+        # Advance the simulation clock by one fixed step
+        self.sim_time += SIM_STEP_MS
+        
         # Update background
         self.background.update()
         
         if self.game_state == "playing":
             # Update player
             self.player.update()
+            if self.ghosts is not None:
+                self.ghosts.record(self.player)
             
-            # Spawn obstacles
-            current_time = pygame.time.get_ticks()
-            if current_time - self.last_obstacle_time > OBSTACLE_FREQUENCY:
-                self.spawn_obstacle()
-                self.last_obstacle_time = current_time
-            
-            # Spawn coins
-            if current_time - self.last_coin_time > COIN_FREQUENCY:
-                self.spawn_coins()
-                self.last_coin_time = current_time
+            # Keep the level planned ahead, and spawn whatever is due
+            # (timed on the simulation clock, not the wall clock)
+            self.level.plan(self.sim_time + LOOKAHEAD_MS)
+            for spawn in self.level.release(self.sim_time):
+                self.spawn(spawn)
             
             # Update obstacles
-            for obstacle in self.obstacles[:]:
+            for obstacle in self.obstacles:
                 obstacle.update()
-                
-                # Check collision with player
-                if self.player.rect.colliderect(obstacle.rect) and self.player.alive:
-                    self.player.alive = False
-                    self.explosions.append(Explosion(self.player.x + self.player.width // 2, 
-                                                    self.player.y + self.player.height // 2))
-                    play_sound("explosion")  # Play explosion sound
-                    self.game_over()
-                
+            
+            # Check collision with player. What's checked is the paths the player and
+            # the obstacles took over the step, not just where they ended up, so a
+            # thin or fast obstacle can't pass through the player between steps
+            impact = first_impact(self.player, self.obstacles) if self.player.alive else None
+            if impact is not None:
+                hit_time, obstacle = impact
+                self.player.alive = False
+                self.death_cause = obstacle.type
+                # The explosion goes where the player was when it was hit
+                impact_y = lerp(self.player.prev_y, self.player.y, hit_time)
+                self.events.emit(EVENT_DEATH, self.player.x + self.player.width // 2,
+                                 impact_y + self.player.height // 2, OBSTACLE_KINDS.index(obstacle.type))
+                self.game_over()
+            
+            for obstacle in self.obstacles[:]:
                 # Remove obstacles that are off screen
                 if obstacle.x + obstacle.width < 0:
                     self.obstacles.remove(obstacle)
@@ -969,24 +1967,27 @@ class Game:
                         self.score += 5
                         obstacle.passed = True
             
-            # Update coins
-            for coin in self.coins[:]:
-                coin.update()
+            # Update coin formations
+            for formation in self.coin_formations[:]:
+                formation.update()
                 
                 # Check collision with player
-                if not coin.collected and self.player.rect.colliderect(coin.rect):
-                    coin.collected = True
-                    self.score += 10
-                    self.coins_collected += 1  # Increment coin counter
-                    play_sound("coin")  # Play coin collection sound
+                collected = formation.collect(self.player.rect)
+                if collected:
+                    self.score += 10 * collected
+                    self.coins_collected += collected  # Increment coin counter
+                    self.events.emit(EVENT_COIN, formation.x, formation.y, collected)
                 
-                # Remove coins that are off screen or collected
-                if coin.x + coin.width < 0 or coin.collected:
-                    self.coins.remove(coin)
+                # Remove formations that are off screen or fully collected
+                if formation.x + formation.width < 0 or not formation.remaining:
+                    self.coin_formations.remove(formation)
             
             # Update score
             self.score += 0.1
         
+        # Sounds and effects for everything that happened this step
+        self.events.dispatch(self)
+        
         # Update explosions
         for explosion in self.explosions[:]:
             if not explosion.update():
@@ -997,76 +1998,71 @@ class Game:
             if not particle.update():
                 self.particles.remove(particle)
     
-    def spawn_obstacle(self):
-        obstacle_type = random.choice(self.obstacle_types)
-        
-        if obstacle_type == "missile":
-            y = random.randint(100, SCREEN_HEIGHT - 150)
-            obstacle = Obstacle(SCREEN_WIDTH, y, "missile")
-            # Play missile sound
-            play_sound("laser")
-        elif obstacle_type == "laser":
-            y = random.randint(0, SCREEN_HEIGHT - 200)
-            obstacle = Obstacle(SCREEN_WIDTH, y, "laser")
-            # Play laser sound
-            play_sound("laser")
-        
-        self.obstacles.append(obstacle)
-    
-    def spawn_coins(self):
-        # Create a small cluster of coins
-        num_coins = random.randint(3, 8)
-        start_x = SCREEN_WIDTH
-        start_y = random.randint(100, SCREEN_HEIGHT - 150)
-        
-        # Choose a pattern: line, arc, or zigzag
-        pattern = random.choice(["line", "arc", "zigzag"])
-        
-        for i in range(num_coins):
-            if pattern == "line":
-                x = start_x + i * 40
-                y = start_y
-            elif pattern == "arc":
-                x = start_x + i * 40
-                y = start_y + int(math.sin(i * 0.5) * 80)
-            elif pattern == "zigzag":
-                x = start_x + i * 40
-                y = start_y + (50 if i % 2 == 0 else -50)
-            
-            self.coins.append(Coin(x, y))
+    def spawn(self, spawn):
+        """Bring a PlannedSpawn on screen"""
+        if spawn.layout is not None:
+            self.coin_formations.append(CoinFormation(spawn.layout, spawn.x, spawn.y))
+        else:
+            self.obstacles.append(Obstacle(spawn.x, spawn.y, spawn.kind))
+            self.events.emit(EVENT_OBSTACLE_SPAWNED, spawn.x, spawn.y, OBSTACLE_KINDS.index(spawn.kind))
+    
+    def spawn_formation(self, layout, y):
+        """Bring a coin formation on screen now, with the layout's starting point at height y"""
+        origin_x, origin_y = layout.origin
+        spawn = PlannedSpawn(self.sim_time, "coins", SCREEN_WIDTH - origin_x, y - origin_y, layout)
+        # The planner keeps obstacles it hasn't placed yet clear of it
+        self.level.released.append(spawn)
+        self.spawn(spawn)
+    
+    def prewarm(self, deadline):
+        """Draw sprites planned spawns will need, one surface at a time, until perf_counter() reaches deadline"""
+        # At least one surface gets drawn, so the work gets done even without spare time
+        for spawn in self.level.pending:
+            layout = spawn.layout
+            if layout is None or not CoinFormation.uses_surfaces(layout):
+                continue
+            while not CoinFormation.draw_next_surface(layout):
+                if time.perf_counter() >= deadline:
+                    return
+            renderer.preload(CoinFormation.surface_cache[layout.name])
+            if time.perf_counter() >= deadline:
+                return
     
     def game_over(self):
         self.game_state = "game_over"
         if self.score > self.high_score:
             self.high_score = self.score
-        
-        # Stop jetpack sound if playing
-        pygame.mixer.stop()
-        
-        # Play game over sound
-        play_sound("gameover")
-        
-        # Pause background music
-        pygame.mixer.music.pause()
+        if self.ghosts is not None:
+            self.ghosts.finish(self.score)
+        # The sounds stop, the game over sound plays and the music pauses when
+        # the consumers hear of it
+        self.events.emit(EVENT_GAME_OVER, value=self.score)
+        if self.recorder is not None:
+            self.recorder.finish(self)
     
-    def draw(self):
+    def draw(self, interpolation=1.0):
+        # interpolation is how far we are between the last two simulation
+        # steps (0-1), so moving things are drawn smoothly at any refresh rate
+        
         # Draw background
-        self.background.draw()
+        self.background.draw(interpolation)
         
         # Draw obstacles
         for obstacle in self.obstacles:
-            obstacle.draw()
+            obstacle.draw(interpolation)
         
         # Draw coins
-        for coin in self.coins:
-            coin.draw()
+        for formation in self.coin_formations:
+            formation.draw(interpolation)
         
         # Draw particles (behind player)
         for particle in self.particles:
-            particle.draw()
+            particle.draw(interpolation)
         
-        # Draw player
-        self.player.draw()
+        # Draw ghosts of earlier runs, then the player over them
+        if self.ghosts is not None and self.game_state == "playing":
+            self.ghosts.draw(renderer, self.player, interpolation)
+        self.player.draw(interpolation)
         
         # Draw explosions
         for explosion in self.explosions:
@@ -1074,52 +2070,40 @@ class Game:
         
         # Draw UI with pixelated style
         # Create a black background for the score display (pixelated UI panel)
-        pygame.draw.rect(screen, (0, 0, 0), (10, 10, 280, 70))
-        pygame.draw.rect(screen, (50, 50, 50), (10, 10, 280, 70), 2)  # Border
+        renderer.fill_rect((0, 0, 0), (10, 10, 280, 70))
+        renderer.fill_rect((50, 50, 50), (10, 10, 280, 70), 2)  # Border
         
         # Draw score with pixelated font
-        score_text = font_small.render(f"SCORE:{int(self.score)}", True, WHITE)
-        screen.blit(score_text, (20, 20))
+        renderer.text(font_small, f"SCORE:{int(self.score)}", WHITE, (20, 20))
         
         # Draw high score (positioned to avoid overlap)
-        high_score_text = font_small.render(f"HI-SCORE:{int(self.high_score)}", True, WHITE)
-        screen.blit(high_score_text, (150, 20))
+        renderer.text(font_small, f"HI-SCORE:{int(self.high_score)}", WHITE, (150, 20))
         
         # Draw coin counter with coin icon
-        coin_icon = pygame.Surface((16, 16), pygame.SRCALPHA)
-        pygame.draw.rect(coin_icon, YELLOW, (0, 0, 16, 16))
-        pygame.draw.rect(coin_icon, (200, 200, 0), (2, 2, 12, 12))
-        screen.blit(coin_icon, (20, 45))
-        
-        coin_text = font_small.render(f"x{self.coins_collected}", True, YELLOW)
-        screen.blit(coin_text, (45, 45))
+        renderer.blit(ui_icon("hud_coin"), (20, 45))
+        renderer.text(font_small, f"x{self.coins_collected}", YELLOW, (45, 45))
         
         # Draw sound controls info in a separate UI panel
         if self.game_state == "playing":
             # Sound controls panel
-            pygame.draw.rect(screen, (0, 0, 0), (SCREEN_WIDTH - 150, 10, 140, 50))
-            pygame.draw.rect(screen, (50, 50, 50), (SCREEN_WIDTH - 150, 10, 140, 50), 2)  # Border
+            renderer.fill_rect((0, 0, 0), (SCREEN_WIDTH - 150, 10, 140, 50))
+            renderer.fill_rect((50, 50, 50), (SCREEN_WIDTH - 150, 10, 140, 50), 2)  # Border
             
             # Draw sound control text
-            music_text = font_small.render("M:MUSIC", True, WHITE)
-            screen.blit(music_text, (SCREEN_WIDTH - 140, 15))
-            
-            sfx_text = font_small.render("S:SFX", True, WHITE)
-            screen.blit(sfx_text, (SCREEN_WIDTH - 140, 35))
+            renderer.text(font_small, "M:MUSIC", WHITE, (SCREEN_WIDTH - 140, 15))
+            renderer.text(font_small, "S:SFX", WHITE, (SCREEN_WIDTH - 140, 35))
             
             # Show music status
             if pygame.mixer.music.get_busy():
-                music_status = font_small.render("ON", True, GREEN)
+                renderer.text(font_small, "ON", GREEN, (SCREEN_WIDTH - 60, 15))
             else:
-                music_status = font_small.render("OFF", True, RED)
-            screen.blit(music_status, (SCREEN_WIDTH - 60, 15))
+                renderer.text(font_small, "OFF", RED, (SCREEN_WIDTH - 60, 15))
             
             # Show SFX status
             if sounds_enabled:
-                sfx_status = font_small.render("ON", True, GREEN)
+                renderer.text(font_small, "ON", GREEN, (SCREEN_WIDTH - 60, 35))
             else:
-                sfx_status = font_small.render("OFF", True, RED)
-            screen.blit(sfx_status, (SCREEN_WIDTH - 60, 35))
+                renderer.text(font_small, "OFF", RED, (SCREEN_WIDTH - 60, 35))
         
         # Draw menu or game over screen
         if self.game_state == "menu":
@@ -1129,9 +2113,7 @@ class Game:
     
     def draw_menu(self):
         # Semi-transparent overlay (pixelated)
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))
-        screen.blit(overlay, (0, 0))
+        renderer.shade((0, 0, 0), 150)
         
         # Pixelated border for menu
         border_width = 600
@@ -1140,63 +2122,53 @@ class Game:
         border_y = 150
         
         # Draw pixelated border
-        pygame.draw.rect(screen, (50, 50, 50), 
+        renderer.fill_rect((50, 50, 50), 
                        (border_x, border_y, border_width, border_height))
-        pygame.draw.rect(screen, (100, 100, 100), 
+        renderer.fill_rect((100, 100, 100), 
                        (border_x + 4, border_y + 4, border_width - 8, border_height - 8))
-        pygame.draw.rect(screen, (0, 0, 0), 
+        renderer.fill_rect((0, 0, 0), 
                        (border_x + 8, border_y + 8, border_width - 16, border_height - 16))
         
         # Title with pixelated effect - render with line breaks if needed
         title_text = "JETPACK ADVENTURE"
-        title_surface = font_large.render(title_text, True, WHITE)
+        title_font = font_large
         
         # Check if title fits, if not use medium font
-        if title_surface.get_width() > border_width - 40:
-            title_surface = font_medium.render(title_text, True, WHITE)
+        if title_font.size(title_text)[0] > border_width - 40:
+            title_font = font_medium
+        title_width = title_font.size(title_text)[0]
         
-        screen.blit(title_surface, (SCREEN_WIDTH // 2 - title_surface.get_width() // 2, 200))
+        renderer.text(title_font, title_text, WHITE, (SCREEN_WIDTH // 2 - title_width // 2, 200))
         
         # Pixelated underline
-        pygame.draw.rect(screen, YELLOW, 
-                       (SCREEN_WIDTH // 2 - title_surface.get_width() // 2, 240, 
-                        title_surface.get_width(), 4))
+        renderer.fill_rect(YELLOW, 
+                       (SCREEN_WIDTH // 2 - title_width // 2, 240, 
+                        title_width, 4))
         
         # Instructions with pixelated font - break into multiple lines if needed
         instructions_text = "PRESS SPACE OR CLICK"
-        instructions_surface = font_medium.render(instructions_text, True, WHITE)
-        screen.blit(instructions_surface, (SCREEN_WIDTH // 2 - instructions_surface.get_width() // 2, 300))
+        draw_centered_text(font_medium, instructions_text, WHITE, 300)
         
         instructions_text2 = "TO START"
-        instructions_surface2 = font_medium.render(instructions_text2, True, WHITE)
-        screen.blit(instructions_surface2, (SCREEN_WIDTH // 2 - instructions_surface2.get_width() // 2, 330))
+        draw_centered_text(font_medium, instructions_text2, WHITE, 330)
         
         # Controls with pixelated font - break into multiple lines
         controls_text1 = "HOLD SPACE OR MOUSE"
-        controls_surface1 = font_small.render(controls_text1, True, WHITE)
-        screen.blit(controls_surface1, (SCREEN_WIDTH // 2 - controls_surface1.get_width() // 2, 380))
+        draw_centered_text(font_small, controls_text1, WHITE, 380)
         
         controls_text2 = "BUTTON TO FLY"
-        controls_surface2 = font_small.render(controls_text2, True, WHITE)
-        screen.blit(controls_surface2, (SCREEN_WIDTH // 2 - controls_surface2.get_width() // 2, 405))
+        draw_centered_text(font_small, controls_text2, WHITE, 405)
         
         # Sound controls
         sound_text = "M:MUSIC  S:SFX"
-        sound_surface = font_small.render(sound_text, True, WHITE)
-        screen.blit(sound_surface, (SCREEN_WIDTH // 2 - sound_surface.get_width() // 2, 440))
+        draw_centered_text(font_small, sound_text, WHITE, 440)
         
         # Draw pixelated jetpack icon
-        jetpack_icon = pygame.Surface((40, 60), pygame.SRCALPHA)
-        pygame.draw.rect(jetpack_icon, BLUE, (10, 0, 20, 40))  # Body
-        pygame.draw.rect(jetpack_icon, GRAY, (0, 20, 10, 30))  # Jetpack
-        pygame.draw.rect(jetpack_icon, ORANGE, (0, 50, 10, 10))  # Flame
-        screen.blit(jetpack_icon, (SCREEN_WIDTH // 2 - 20, 470))
+        renderer.blit(ui_icon("jetpack"), (SCREEN_WIDTH // 2 - 20, 470))
     
     def draw_game_over(self):
         # Semi-transparent overlay (pixelated)
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))
-        screen.blit(overlay, (0, 0))
+        renderer.shade((0, 0, 0), 150)
         
         # Pixelated border for game over screen
         border_width = 600
@@ -1205,80 +2177,415 @@ class Game:
         border_y = 150
         
         # Draw pixelated border with red theme for game over
-        pygame.draw.rect(screen, (100, 0, 0), 
+        renderer.fill_rect((100, 0, 0), 
                        (border_x, border_y, border_width, border_height))
-        pygame.draw.rect(screen, (150, 0, 0), 
+        renderer.fill_rect((150, 0, 0), 
                        (border_x + 4, border_y + 4, border_width - 8, border_height - 8))
-        pygame.draw.rect(screen, (0, 0, 0), 
+        renderer.fill_rect((0, 0, 0), 
                        (border_x + 8, border_y + 8, border_width - 16, border_height - 16))
         
         # Game over text with pixelated effect
-        game_over_text = font_large.render("GAME OVER", True, RED)
-        screen.blit(game_over_text, (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, 200))
+        game_over_width = draw_centered_text(font_large, "GAME OVER", RED, 200)
         
         # Pixelated underline
-        pygame.draw.rect(screen, RED, 
-                       (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, 240, 
-                        game_over_text.get_width(), 4))
+        renderer.fill_rect(RED, 
+                       (SCREEN_WIDTH // 2 - game_over_width // 2, 240, 
+                        game_over_width, 4))
         
         # Final score with pixelated font - break into multiple lines if needed
         score_text = f"FINAL SCORE:{int(self.score)}"
-        score_surface = font_medium.render(score_text, True, WHITE)
-        screen.blit(score_surface, (SCREEN_WIDTH // 2 - score_surface.get_width() // 2, 280))
+        draw_centered_text(font_medium, score_text, WHITE, 280)
         
         # Coins collected with icon
-        coin_icon = pygame.Surface((24, 24), pygame.SRCALPHA)
-        pygame.draw.rect(coin_icon, YELLOW, (0, 0, 24, 24))
-        pygame.draw.rect(coin_icon, (200, 200, 0), (4, 4, 16, 16))
+        coin_icon = ui_icon("coin")
         
         # Position coin icon and text centered
-        coins_text = font_medium.render(f"COINS:{self.coins_collected}", True, YELLOW)
-        coin_display_width = coin_icon.get_width() + 10 + coins_text.get_width()
+        coins_text = f"COINS:{self.coins_collected}"
+        coin_display_width = coin_icon.get_width() + 10 + font_medium.size(coins_text)[0]
         coin_x = SCREEN_WIDTH // 2 - coin_display_width // 2
         
-        screen.blit(coin_icon, (coin_x, 330))
-        screen.blit(coins_text, (coin_x + coin_icon.get_width() + 10, 330))
+        renderer.blit(coin_icon, (coin_x, 330))
+        renderer.text(font_medium, coins_text, YELLOW, (coin_x + coin_icon.get_width() + 10, 330))
         
         # Restart instructions with pixelated font - break into multiple lines
         restart_text1 = "PRESS SPACE OR CLICK"
-        restart_surface1 = font_medium.render(restart_text1, True, WHITE)
-        screen.blit(restart_surface1, (SCREEN_WIDTH // 2 - restart_surface1.get_width() // 2, 380))
+        draw_centered_text(font_medium, restart_text1, WHITE, 380)
         
         restart_text2 = "TO RESTART"
-        restart_surface2 = font_medium.render(restart_text2, True, WHITE)
-        screen.blit(restart_surface2, (SCREEN_WIDTH // 2 - restart_surface2.get_width() // 2, 410))
+        draw_centered_text(font_medium, restart_text2, WHITE, 410)
         
         # Draw pixelated skull icon
-        skull_size = 60
-        skull = pygame.Surface((skull_size, skull_size), pygame.SRCALPHA)
-        
-        # Skull base
-        pygame.draw.rect(skull, WHITE, (10, 10, skull_size - 20, skull_size - 20))
-        
-        # Eyes
-        pygame.draw.rect(skull, BLACK, (15, 25, 10, 10))
-        pygame.draw.rect(skull, BLACK, (skull_size - 25, 25, 10, 10))
-        
-        # Nose
-        pygame.draw.rect(skull, BLACK, (skull_size // 2 - 2, 35, 4, 4))
-        
-        # Teeth
-        for i in range(3):
-            pygame.draw.rect(skull, BLACK, (20 + i*10, 45, 2, 10))
-        
-        screen.blit(skull, (SCREEN_WIDTH // 2 - skull_size // 2, 460))
+        skull = ui_icon("skull")
+        renderer.blit(skull, (SCREEN_WIDTH // 2 - skull.get_width() // 2, 460))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure")
+    parser.add_argument("--renderer", choices=["surface", "texture"], default="surface",
+                        help="draw with software Surface blits or with SDL textures (GPU where available)")
+    parser.add_argument("--vsync", action="store_true",
+                        help="sync rendering to the display refresh rate")
+    parser.add_argument("--resolution", metavar="WIDTHxHEIGHT",
+                        help="window size; the game is scaled to fit, from sprites pre-scaled for it "
+                             "(default: the game's own %dx%d)" % (SCREEN_WIDTH, SCREEN_HEIGHT))
+    parser.add_argument("--resizable", action="store_true",
+                        help="let the window be resized; sprites are scaled for each new size in the background")
+    parser.add_argument("--render-fps", type=int, default=RENDER_FPS,
+                        help="cap the render rate (default: %(default)s, 0 = uncapped, ignored with --vsync)")
+    parser.add_argument("--late-latch", action="store_true",
+                        help="sleep before reading input instead of after presenting, so input is read "
+                             "as late as the frame allows (paced by --render-fps, else one frame per step)")
+    parser.add_argument("--split", action="store_true",
+                        help="run the simulation in a separate process, which shares its state through shared memory")
+    parser.add_argument("--latency", action="store_true",
+                        help="measure input-to-flip latency and print it on exit")
+    parser.add_argument("--capture", metavar="DIR",
+                        help="record gameplay frames into DIR")
+    parser.add_argument("--capture-format", choices=["raw", "png"], default="raw",
+                        help="raw frames + index (cheapest) or a PNG sequence")
+    parser.add_argument("--spectate-port", type=int, metavar="PORT",
+                        help="broadcast live game state to spectators on PORT")
+    parser.add_argument("--spectate-host", default="127.0.0.1",
+                        help="address the spectator server listens on (default: %(default)s)")
+    parser.add_argument("--hitch-ms", type=float, default=100,
+                        help="report frames slower than this many ms (0 = off, default: %(default)s)")
+    parser.add_argument("--hitch-report", default=os.path.join(assets_dir, "hitch_reports.json"),
+                        help="file the most recent hitch reports are kept in")
+    parser.add_argument("--hitch-profile", type=int, default=0, metavar="FRAMES",
+                        help="after a hitch, run cProfile for this many frames")
+    parser.add_argument("--hitch-sample-ms", type=float, default=0, metavar="MS",
+                        help="sample the main thread's stack every MS milliseconds to attribute hitches")
+    parser.add_argument("--no-gc-tuning", action="store_true",
+                        help="leave the garbage collector at Python's defaults")
+    parser.add_argument("--scores-dir", default=assets_dir,
+                        help="where high scores and run statistics are kept (default: the assets directory)")
+    parser.add_argument("--ghosts", type=int, default=0, metavar="COUNT",
+                        help="race up to COUNT ghosts of your best and latest runs (default: off)")
+    parser.add_argument("--ghosts-dir", default=os.path.join(assets_dir, "ghosts"),
+                        help="where the best runs are kept for ghost racing")
+    parser.add_argument("--record-sessions", metavar="DIR",
+                        help="save every run into DIR as a seekable session, to replay or render with jetpack_render.py")
+    parser.add_argument("--autopilot", action="store_true",
+                        help="attract mode: the game plays itself, starting a new run after each one")
+    parser.add_argument("--autopilot-budget-ms", type=float, default=2.0, metavar="MS",
+                        help="time the autopilot may take deciding each step (default: %(default)s)")
+    parser.add_argument("--memory-trace", action="store_true",
+                        help="track Python allocations with tracemalloc for memory reports")
+    parser.add_argument("--memory-report", metavar="PATH",
+                        help="write a JSON memory report to PATH on exit")
+    parser.add_argument("--audio-frequency", type=int, default=AUDIO_FREQUENCY, metavar="HZ",
+                        help="mixer sample rate (default: %(default)s)")
+    parser.add_argument("--audio-buffer", type=int, default=AUDIO_BUFFER, metavar="FRAMES",
+                        help="mixer buffer size; smaller is less delay, but easier to underrun (default: %(default)s)")
+    parser.add_argument("--audio-channels", type=int, default=AUDIO_CHANNELS, choices=[1, 2],
+                        help="mixer channels (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.resolution is not None:
+        from jetpack_resolution import parse_resolution
+        try:
+            args.resolution = parse_resolution(args.resolution)
+        except ValueError as error:
+            parser.error(f"--resolution: {error}")
+    if (args.resolution or args.resizable) and args.renderer == "texture":
+        parser.error("--resolution and --resizable are for the surface renderer; the texture renderer's window "
+                     "is always resizable")
+    if args.resizable and args.capture:
+        parser.error("--capture needs a window that stays the same size")
+    return args
 
 # Main game loop
-def main():
+def main(argv=None):
+    global screen, renderer
+    args = parse_args(argv)
+    if (args.audio_frequency, args.audio_buffer, args.audio_channels) != audio_settings:
+        init_audio(args.audio_frequency, args.audio_buffer, args.audio_channels)
+    
+    if args.renderer == "texture":
+        from jetpack_renderer import TextureRenderer
+        # It opens a window of its own, so close the one opened at import
+        pygame.display.quit()
+        pygame.display.init()
+        screen = None
+        renderer = TextureRenderer((SCREEN_WIDTH, SCREEN_HEIGHT), "Jetpack Adventure", vsync=args.vsync)
+    elif args.resolution or args.resizable:
+        from jetpack_resolution import ScaledRenderer
+        # vsync needs a renderer-backed display, which SCALED gives us; at the
+        # window's own size SDL has nothing to scale
+        flags = pygame.RESIZABLE if args.resizable else 0
+        if args.vsync:
+            flags |= pygame.SCALED
+        screen = pygame.display.set_mode(args.resolution or (SCREEN_WIDTH, SCREEN_HEIGHT), flags,
+                                         vsync=int(args.vsync))
+        renderer = ScaledRenderer(screen, (SCREEN_WIDTH, SCREEN_HEIGHT), args.resizable, font_specs)
+    elif args.vsync:
+        # vsync needs a renderer-backed display, which SCALED gives us
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SCALED, vsync=1)
+        renderer = SurfaceRenderer(screen)
+    render_fps = 0 if args.vsync else args.render_fps
+    filter_events()
+    
     game = Game()
+    prebuild_sprites()
+    renderer.preload(sprite_surfaces(game))
     
-    while True:
-        game.handle_events()
-        game.update()
-        game.draw()
+    # Things that run once per presented frame
+    frame_hooks = []
+    
+    # High scores and run statistics, written to disk in the background
+    from jetpack_scores import ScoreStore
+    score_store = ScoreStore(args.scores_dir)
+    game.high_score = score_store.high_score
+    
+    # Input-to-flip latency; first, so it times the flip and not the other hooks
+    latency = None
+    if args.latency:
+        from jetpack_latency import LatencyMonitor
+        latency = game.latency = LatencyMonitor()
+        frame_hooks.append(latency)
+    frame_hooks.append(score_store)
+    
+    # Ghosts of earlier runs. The window process of --split doesn't step the game, so there's nothing to record
+    ghosts = None
+    if args.ghosts > 0 and not args.split:
+        from jetpack_ghosts import GhostRace
+        ghosts = game.ghosts = GhostRace(args.ghosts_dir, args.ghosts)
+    
+    # Every run kept for replay; like the ghosts, recorded where the game is stepped
+    recorder = None
+    if args.record_sessions and not args.split:
+        from jetpack_session import SessionRecorder
+        recorder = game.recorder = SessionRecorder(args.record_sessions)
+    
+    # Attract mode
+    autopilot = None
+    if args.autopilot:
+        from jetpack_autopilot import Autopilot
+        autopilot = game.autopilot = Autopilot(args.autopilot_budget_ms)
+        frame_hooks.append(autopilot)
+    
+    # Keep garbage collection pauses out of active gameplay
+    gc_manager = None
+    if not args.no_gc_tuning:
+        from jetpack_gc import GCManager
+        gc_manager = GCManager()
+        gc_manager.freeze_assets()
+        frame_hooks.append(gc_manager)
+    
+    # Optional gameplay recording on a background writer thread
+    capture = None
+    if args.capture:
+        from jetpack_capture import FrameCapture
+        capture = FrameCapture(renderer.frame_surface(), args.capture, args.capture_format)
+        frame_hooks.append(lambda game: capture.grab(renderer.frame_surface()))
+    
+    # Optional live state broadcast for spectators
+    spectator = None
+    if args.spectate_port is not None:
+        from jetpack_spectator import SpectatorServer
+        spectator = SpectatorServer(args.spectate_host, args.spectate_port).start()
+        frame_hooks.append(spectator.publish)
+    
+    # Memory accounting: sampled in the background, dumped with F9
+    from jetpack_memory import MemoryTracker
+    memory_tracker = MemoryTracker(assets_dir, trace=args.memory_trace)
+    frame_hooks.append(memory_tracker)
+    game.hotkeys[pygame.K_F9] = memory_tracker.dump
+    
+    # Always-on watchdog for single slow frames
+    watchdog = None
+    if args.hitch_ms > 0:
+        from jetpack_hitch import HitchWatchdog
+        watchdog = HitchWatchdog(args.hitch_report, args.hitch_ms,
+                                 profile_frames=args.hitch_profile, sample_ms=args.hitch_sample_ms)
+        if gc_manager is not None:
+            watchdog.extra_sections["gc_pauses"] = gc_manager.pause_summary
+        if latency is not None:
+            watchdog.extra_sections["input_latency"] = latency.as_dict
+        frame_hooks.append(watchdog)
+    
+    try:
+        if args.split:
+            from jetpack_split import run_split
+            run_split(game, render_fps, frame_hooks)
+        else:
+            asyncio.run(run(game, render_fps, frame_hooks, args.late_latch))
+    finally:
+        score_store.close()
+        if ghosts is not None:
+            ghosts.close()
+        if recorder is not None:
+            recorder.close()
+        if latency is not None:
+            print(latency.summary())
+        if autopilot is not None:
+            print(autopilot.summary())
+        if watchdog is not None:
+            watchdog.close()
+            print(watchdog.summary())
+        if gc_manager is not None:
+            gc_manager.close()
+            print(gc_manager.summary())
+        if args.memory_report:
+            memory_tracker.export(game, args.memory_report)
+        if capture is not None:
+            capture.close()
+            print(capture.summary())
+        if spectator is not None:
+            spectator.stop()
+        pygame.quit()
+
+def sleep_until(deadline):
+    # time.sleep can overshoot by a fraction of a millisecond; spin the last bit
+    remaining = deadline - time.perf_counter()
+    if remaining > 0.002:
+        time.sleep(remaining - 0.002)
+    while time.perf_counter() < deadline:
+        pass
+
+# Waits for frame deadlines in the event loop. asyncio.sleep can wake late,
+# by however long other coroutines hold on to the loop, so the pacer wakes
+# early by the most it has recently overslept (within the PACING_ limits)
+# and spins the rest, yielding to the loop on every turn. It keeps how late each wait ended; frames whose work
+# ran past the deadline are counted separately, since no wait could help.
+class FramePacer:
+    def __init__(self, samples=3600):
+        self.margin = PACING_MIN_MARGIN
+        self.lateness = deque(maxlen=samples)  # Seconds each wait ended after its deadline
+        self.overruns = 0  # Waits that began with the deadline already gone
+    
+    async def wait_until(self, deadline):
+        if time.perf_counter() >= deadline:
+            self.overruns += 1
+            await asyncio.sleep(0)  # Out of time, but other coroutines still get a turn
+            return
+        remaining = deadline - time.perf_counter() - self.margin
+        if remaining > 0:
+            woken_at = time.perf_counter() + remaining
+            await asyncio.sleep(remaining)
+            overslept = time.perf_counter() - woken_at
+            self.margin = min(PACING_MAX_MARGIN, max(PACING_MIN_MARGIN, overslept + PACING_MIN_MARGIN,
+                                                     self.margin * 0.99))
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(0)  # Spinning, but still giving other coroutines their turns
+        self.lateness.append(time.perf_counter() - deadline)
+    
+    def summary(self):
+        lateness = sorted(self.lateness)
+        if not lateness:
+            return "frame pacing: no paced frames"
+        return (f"frame pacing: {len(lateness)} waits ended {sum(lateness) / len(lateness) * 1000:.3f} ms late "
+                f"on average, p99 {lateness[int(len(lateness) * 0.99)] * 1000:.3f} ms, max {lateness[-1] * 1000:.3f} ms; "
+                f"{self.overruns} frames overran")
+
+async def run(game, render_fps=RENDER_FPS, frame_hooks=(), late_latch=False,
+              on_start=None, on_game_over=None, on_quit=None, pacer=None, max_frames=None):
+    """Play game until it's quit, sharing the thread with the running event loop.
+    
+    on_start, on_game_over and on_quit are coroutine functions called with the
+    game. Start and game over ones run as tasks so they can't hold up frames;
+    their exceptions are printed to stderr when they happen. on_quit is
+    awaited before returning, after those tasks have finished.
+    """
+    # Fixed-step simulation with a variable-rate renderer: real time is
+    # accumulated and consumed in SIM_STEP slices, and whatever is left over
+    # is used to interpolate the drawing between the last two steps.
+    #
+    # Normally the loop reads input, simulates, draws and presents, then
+    # waits out the rest of the frame, so input arriving during that wait
+    # waits for the next frame. With late_latch the wait comes first: the
+    # loop wakes just in time to read input, simulate and draw before the
+    # frame is due, going by the longest recent frame's work. Either way
+    # the wait is where other coroutines get to run.
+    if pacer is None:
+        pacer = FramePacer()
+    frame_period = 1.0 / render_fps if render_fps else SIM_STEP
+    work_estimate = 0.0  # Seconds from reading input to presenting; decays slowly after a spike
+    accumulator = 0.0
+    previous_time = time.perf_counter()
+    present_due = previous_time + frame_period
+    frames = 0
+    state = game.game_state
+    lifecycle_tasks = set()
+    
+    def lifecycle_done(task):
+        lifecycle_tasks.discard(task)
+        # A failing hook is reported as it fails; the game plays on
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            print(f"{task.get_name()} failed:", file=sys.stderr)
+            traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+    
+    def start_lifecycle_task(hook, name):
+        task = asyncio.create_task(hook(game), name=name)
+        lifecycle_tasks.add(task)
+        task.add_done_callback(lifecycle_done)
+    
+    while not game.quit_requested and (max_frames is None or frames < max_frames):
+        if late_latch:
+            wake_time = present_due - work_estimate - LATE_LATCH_MARGIN
+            # Sprites the level will need soon are drawn in the wait
+            game.prewarm(wake_time)
+            await pacer.wait_until(wake_time)
+        
+        current_time = time.perf_counter()
+        if late_latch:
+            # Simulate up to when the frame will be seen. Rounding can leave
+            # that a hair short of a step, which would skip a step this frame
+            # and run two the next
+            frame_time = present_due - previous_time
+            if abs(frame_time - SIM_STEP) < 1e-6:
+                frame_time = SIM_STEP
+            previous_time = present_due
+        else:
+            frame_time = current_time - previous_time
+            previous_time = current_time
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        # Clamp the backlog so one long hitch can't trigger a spiral of death
+        accumulator = min(accumulator + frame_time, MAX_CATCHUP_STEPS * SIM_STEP)
+        
+        game.handle_events()
+        while accumulator >= SIM_STEP:
+            game.step()
+            accumulator -= SIM_STEP
+        
+        game.draw(accumulator / SIM_STEP)
+        
+        # With vsync, present() blocks until the flip, so that wait isn't work
+        work_estimate = max(time.perf_counter() - current_time, work_estimate * 0.98)
+        renderer.present()
+        presented = time.perf_counter()
+        for hook in frame_hooks:
+            hook(game)
+        frames += 1
+        
+        if game.game_state != state:
+            if game.game_state == "playing" and on_start is not None:
+                start_lifecycle_task(on_start, "on_start")
+            elif game.game_state == "game_over" and on_game_over is not None:
+                start_lifecycle_task(on_game_over, "on_game_over")
+            state = game.game_state
+        
+        if late_latch:
+            # Keep to the frame rate's schedule, or follow the display's when it made us wait
+            present_due = max(present_due, presented) + frame_period
+        elif render_fps:
+            # Spend what's left of this frame's time drawing sprites the level will need soon
+            game.prewarm(present_due)
+            await pacer.wait_until(present_due)
+            # Keep to the schedule unless a whole frame was lost, then start it again from now
+            present_due = max(present_due + frame_period, time.perf_counter())
+        else:
+            game.prewarm(current_time + SIM_STEP)
+            await asyncio.sleep(0)
+    
+    # Only the ones still running are left
+    await asyncio.gather(*lifecycle_tasks, return_exceptions=True)
+    if on_quit is not None:
+        await on_quit(game)
+    return frames
+
+def run_loop(game, render_fps, frame_hooks=(), late_latch=False, max_frames=None):
+    """Blocking version of run()"""
+    return asyncio.run(run(game, render_fps, frame_hooks, late_latch, max_frames=max_frames))
 
 if __name__ == "__main__":
     main()
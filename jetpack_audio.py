@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# Audio latency self-test for Jetpack Adventure
+#
+# Measures how long a sound takes from being triggered (Sound.play(), the way
+# the game plays a coin or an explosion) to being in the mixer's output, for
+# a given mixer rate, buffer size and channel count:
+#
+#   python jetpack_audio.py --buffer 512 --triggers 40 --load
+#
+# It runs under SDL's disk audio driver, which writes the mixed output to a
+# file at about the pace a sound card would take it. While the game's coin
+# sound is triggered at random moments, a thread notes when the file grows.
+# Afterwards each sound is found in the file. The time the mixer buffer with
+# its first sample was written is interpolated from the growth timeline, and
+# the trigger time is subtracted from it. A real device then takes about one
+# more buffer to play it.
+#
+# The same timeline shows underruns. A buffer written later than the one
+# before it by more than a buffer's length would have left a real device
+# with nothing to play. --load runs the game (simulating and drawing, with
+# harmless obstacles so a game over never stops the sounds) between
+# triggers, to show whether the game's own work holds up the mixer. The exit
+# status is 1 if there were underruns.
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import threading
+
+import numpy as np
+
+POLL_SECONDS = 0.0002  # Between looks at the output file's size
+SWITCH_INTERVAL = 0.0005  # Python thread switch interval during the test, so the watcher isn't starved
+WARMUP_SECONDS = 0.3
+SILENCE_AFTER = 0.4  # Seconds waited after the last trigger, for its sound to come out
+
+# Mixer sample size -> (numpy dtype, value of silence)
+SAMPLE_FORMATS = {
+    -8: (np.int8, 0), 8: (np.uint8, 128),
+    -16: (np.int16, 0), 16: (np.uint16, 32768),
+    -32: (np.int32, 0), 32: (np.float32, 0.0),
+}
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+class OutputWatcher:
+    """Notes (perf_counter time, bytes written) whenever the output file grows"""
+    def __init__(self, path):
+        self.path = path
+        self.timeline = []
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.watch, name="audio-watcher", daemon=True)
+
+    def watch(self):
+        last = -1
+        while not self.stopping.is_set():
+            written = os.path.getsize(self.path)
+            if written != last:
+                self.timeline.append((time.perf_counter(), written))
+                last = written
+            time.sleep(POLL_SECONDS)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+def native_format_ok(jp):
+    """Whether every sound holds samples in the mixer's own format"""
+    frequency, size, channels = jp.pygame.mixer.get_init()
+    dtype = SAMPLE_FORMATS[size][0]
+    for sound in jp.sounds.values():
+        samples = jp.pygame.sndarray.array(sound)
+        if samples.dtype != dtype or (samples.ndim == 2) != (channels > 1):
+            return False
+    return True
+
+def trigger_sounds(jp, triggers, spacing, load, rng):
+    """Play the coin sound triggers times at random moments; returns when each was triggered"""
+    sound = jp.sounds["coin"]
+    game = None
+    if load:
+        jp.first_impact = lambda player, obstacles: None  # Nothing ends the run
+        game = jp.Game(seed=rng.randrange(1 << 30))
+        game.events.consumers.remove(jp.event_sounds)  # Only the test's sound is heard
+        game.start_game()
+    times = []
+    next_trigger = time.perf_counter() + spacing
+    while len(times) < triggers:
+        now = time.perf_counter()
+        if now >= next_trigger:
+            times.append(time.perf_counter())
+            sound.play()
+            next_trigger = now + spacing * (1 + rng.random())
+        elif game is not None:
+            if rng.random() < 0.1:
+                game.player.jetpack_on = not game.player.jetpack_on
+            game.update()
+            game.draw(1.0)
+        else:
+            time.sleep(POLL_SECONDS)
+    return times
+
+def analyse(timeline, trigger_times, output, frame_bytes, buffer, frequency, silence, block_size):
+    # The driver writes through a stdio buffer of block_size bytes. A write at
+    # least that big goes straight to the file, so a buffer shows up once its
+    # last byte is in. Smaller ones pile up until one doesn't fit, so a flush
+    # is seen as the next buffer is written: the file reaching a buffer's
+    # first byte marks when that buffer was written.
+    written_by = buffer * frame_bytes if buffer * frame_bytes >= block_size else 0
+    times = np.array([moment for moment, _ in timeline])
+    sizes = np.array([written for _, written in timeline], dtype=float)
+    delays = []
+    for triggered in trigger_times:
+        # Nothing written before the trigger can hold its sound
+        seen = np.searchsorted(times, triggered, side="right") - 1
+        first_frame = int(sizes[max(seen, 0)]) // frame_bytes
+        sounding = np.flatnonzero(output[first_frame:] != silence)
+        if not len(sounding):
+            continue  # Never came out
+        onset = first_frame + sounding[0]
+        # The buffer holding the onset is written all at once
+        buffer_start = onset // buffer * buffer * frame_bytes
+        delays.append(float(np.interp(buffer_start + written_by, sizes, times)) - triggered)
+
+    # The driver's own pace, seconds per byte, going by the usual gap between writes
+    steps = np.diff(sizes)
+    gaps = np.diff(times)
+    pace = float(np.median(gaps[steps > 0] / steps[steps > 0]))
+    lateness = gaps - steps * pace
+    buffer_seconds = buffer / frequency
+    late = lateness > buffer_seconds
+    underruns = int(np.count_nonzero(late[1:] & ~late[:-1]) + (late[0] if len(late) else 0))
+    return delays, underruns, float(lateness.max()) if len(lateness) else 0.0
+
+def run_selftest(frequency, buffer, channels, triggers, spacing, load, seed):
+    """Measure in this process; the disk driver is set up before the game module is imported"""
+    output_path = os.path.join(tempfile.mkdtemp(prefix="jetpack_audio_"), "output.raw")
+    os.environ["SDL_AUDIODRIVER"] = "disk"
+    os.environ["SDL_DISKAUDIOFILE"] = output_path
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import jetpack_adventure as jp
+
+    # Reopening the mixer starts the output file again
+    jp.init_audio(frequency, buffer, channels)
+    jp.pygame.mixer.music.stop()
+    jp.sounds_enabled = False  # Only the test's own sound is played
+    actual_frequency, size, actual_channels = jp.pygame.mixer.get_init()
+    dtype, silence = SAMPLE_FORMATS[size]
+    frame_bytes = np.dtype(dtype).itemsize * actual_channels
+    native_format = native_format_ok(jp)
+
+    watcher = OutputWatcher(output_path)
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(SWITCH_INTERVAL)
+    try:
+        watcher.start()
+        time.sleep(WARMUP_SECONDS)
+        trigger_times = trigger_sounds(jp, triggers, spacing, load, random.Random(seed))
+        time.sleep(SILENCE_AFTER)
+        watcher.stop()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    jp.pygame.mixer.quit()  # Flushes the output file
+
+    block_size = os.stat(output_path).st_blksize
+    output = np.fromfile(output_path, dtype=dtype)[::actual_channels]  # The first channel is enough
+    os.remove(output_path)
+    os.rmdir(os.path.dirname(output_path))
+    delays, underruns, worst_lateness = analyse(watcher.timeline, trigger_times, output, frame_bytes,
+                                                buffer, actual_frequency, silence, block_size)
+    delays.sort()
+    return {
+        "frequency": actual_frequency,
+        "sample_size": size,
+        "channels": actual_channels,
+        "buffer": buffer,
+        "buffer_ms": round(buffer / actual_frequency * 1000, 2),
+        "native_format": native_format,
+        "load": load,
+        "triggers": triggers,
+        "heard": len(delays),
+        "delay_ms": {
+            "mean": round(sum(delays) / len(delays) * 1000, 2) if delays else None,
+            "p50": round(percentile(delays, 0.5) * 1000, 2) if delays else None,
+            "p95": round(percentile(delays, 0.95) * 1000, 2) if delays else None,
+            "max": round(delays[-1] * 1000, 2) if delays else None,
+        },
+        "underruns": underruns,
+        "worst_lateness_ms": round(worst_lateness * 1000, 2),
+    }
+
+def summary(result):
+    delay = result["delay_ms"]
+    lines = [
+        f"mixer: {result['frequency']} Hz, sample size {result['sample_size']}, {result['channels']} channel(s), "
+        f"{result['buffer']}-frame buffers ({result['buffer_ms']} ms)",
+        f"sounds in the mixer's format: {'yes' if result['native_format'] else 'NO'}",
+        f"trigger to output buffer over {result['heard']}/{result['triggers']} triggers"
+        f"{' with the game running' if result['load'] else ''}: mean {delay['mean']} ms, p50 {delay['p50']}, "
+        f"p95 {delay['p95']}, max {delay['max']}",
+        f"underruns: {result['underruns']} (a buffer came at most {result['worst_lateness_ms']} ms late)",
+    ]
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure audio latency self-test (SDL disk driver)")
+    parser.add_argument("--frequency", type=int, default=44100)
+    parser.add_argument("--buffer", type=int, default=512, help="mixer buffer size in sample frames")
+    parser.add_argument("--channels", type=int, default=1, choices=[1, 2])
+    parser.add_argument("--triggers", type=int, default=40)
+    parser.add_argument("--spacing", type=float, default=0.35,
+                        help="least seconds between triggers (more than the coin sound's length)")
+    parser.add_argument("--load", action="store_true", help="run the game between triggers")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args(argv)
+
+    result = run_selftest(args.frequency, args.buffer, args.channels, args.triggers, args.spacing, args.load,
+                          args.seed)
+    print(summary(result))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(result, json_file, indent=1)
+    if result["underruns"] or result["heard"] < result["triggers"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
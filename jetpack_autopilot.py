@@ -0,0 +1,291 @@
+# Autopilot for Jetpack Adventure
+#
+# Flies the player for attract mode and automated testing. Every simulation
+# step it looks HORIZON steps ahead: a bank of candidate thrust sequences
+# (hold, release, switch after n steps, pulse at different duty cycles, and
+# the rest of the previous best plan) is run through Player.update's physics
+# all at once as NumPy arrays, one row per candidate. The resulting heights
+# are checked against where the obstacles on screen, and the ones the level
+# planner has yet to spawn, will be at each step, and against the coins
+# ahead. The candidate that survives longest wins, then the one collecting
+# most coins, then the one keeping nearest the middle of the screen; its
+# first step is taken.
+#
+# Every decision has a time budget (2 ms by default). The physics is stepped
+# one step of the horizon at a time, and stops early when the rest of the
+# budget is needed for scoring, so a slow machine plans a shorter horizon.
+# If there isn't time for even MIN_HORIZON steps, the previous plan is
+# followed without checking it.
+#
+#   python jetpack_adventure.py --autopilot            # attract mode
+#   python jetpack_batch.py sweep OUT --policy rollout
+#   python jetpack_bench.py autopilot                  # latency and survival
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+DEFAULT_BUDGET_MS = 2.0
+HORIZON = 60  # Steps looked ahead (one second)
+MIN_HORIZON = 8  # Fewer steps than this aren't worth scoring
+SAFETY_MARGIN = 3  # Pixels obstacles are grown by, for rounding in pygame.Rect
+ATTRACT_DELAY = 2.0  # Seconds on the menu or game over screen before attract mode starts a run
+LATENCY_SAMPLES_KEPT = 10000
+RUN_SAMPLES_KEPT = 1000  # Recent runs the median survival time is taken over
+
+# Score weights: a step survived outweighs every coin, a coin outweighs staying central
+SURVIVAL_WEIGHT = 1000
+COIN_WEIGHT = 20
+CENTRE_WEIGHT = 10
+
+def candidate_bank(horizon):
+    """Thrust sequences tried every step, one per row"""
+    rows = [np.zeros(horizon, bool), np.ones(horizon, bool)]
+    for switch in range(2, horizon, 2):
+        rows.append(np.arange(horizon) < switch)  # Thrust, then let go
+        rows.append(np.arange(horizon) >= switch)  # Fall, then thrust
+    # Pulsing hovers, climbs and sinks, starting at different points of the pulse
+    for period in range(2, 9):
+        for on_steps in range(1, period):
+            for phase in (0, period // 2):
+                rows.append((np.arange(horizon) + phase) % period < on_steps)
+    bank = np.unique(np.array(rows), axis=0)
+    return bank
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+class Autopilot:
+    def __init__(self, budget_ms=DEFAULT_BUDGET_MS, horizon=HORIZON):
+        self.budget = None if budget_ms is None else budget_ms / 1000  # None: no limit (deterministic)
+        self.horizon = horizon
+        self.bank = candidate_bank(horizon)
+        self.plan = np.zeros(horizon, bool)  # Best sequence found last step
+        self.scoring_time = 0.0  # Recent time taken to score, to leave room for it
+
+        # Statistics
+        self.latencies = deque(maxlen=LATENCY_SAMPLES_KEPT)
+        self.horizons = deque(maxlen=LATENCY_SAMPLES_KEPT)
+        self.decisions = 0
+        self.over_budget = 0
+        self.fallbacks = 0
+        self.runs = 0
+        self.survival_total = 0.0
+        self.score_total = 0
+        self.coins_total = 0
+        self.deaths = {}  # Death cause -> runs
+        self.survival_times = deque(maxlen=RUN_SAMPLES_KEPT)
+        self.state = None
+        self.state_since = time.perf_counter()
+
+    # Player.update's physics, for every candidate at once
+
+    def simulate(self, jp, player, sequences, deadline):
+        """Heights after each step (steps x candidates), stopping early at deadline"""
+        count = len(sequences)
+        # Per step and candidate: the change thrust or gravity makes, and the
+        # extra slowing of a rise when not thrusting
+        thrust = sequences.T
+        acceleration = np.where(thrust, -jp.JETPACK_ACCELERATION, jp.GRAVITY)
+        deceleration = np.where(thrust, 0.0, jp.JETPACK_DECELERATION)
+        heights = np.empty((self.horizon, count))
+        y = np.full(count, float(player.y))
+        velocity = np.full(count, float(player.velocity))
+        rising = np.empty(count, bool)
+        slowing = np.empty(count)
+        floor = jp.SCREEN_HEIGHT - player.height
+        # In-place ufuncs throughout: at this size the calls cost more than the arithmetic
+        for step in range(self.horizon):
+            if deadline is not None and step >= MIN_HORIZON and time.perf_counter() >= deadline:
+                return heights[:step]
+            velocity += acceleration[step]
+            np.less(velocity, 0, out=rising)
+            np.multiply(rising, deceleration[step], out=slowing)
+            velocity += slowing
+            np.minimum(velocity, jp.MAX_VELOCITY, out=velocity)
+            np.maximum(velocity, -jp.MAX_VELOCITY, out=velocity)
+            y += velocity
+            if y.min() < 0 or y.max() > floor:
+                bounced = (y < 0) | (y > floor)
+                np.clip(y, 0, floor, out=y)
+                velocity[bounced] *= -0.2
+            heights[step] = y
+        return heights
+
+    # What's ahead, as (step, top, bottom) of everything the player's box
+    # overlaps horizontally at each step
+
+    def obstacle_overlaps(self, jp, game, steps):
+        left = game.player.rect.x - SAFETY_MARGIN
+        right = left + game.player.rect.width + 2 * SAFETY_MARGIN
+        step_numbers = np.arange(1, steps + 1)
+        found = []
+
+        def add(x_at_step_one, speed, width, top, height, first_step=1):
+            xs = x_at_step_one - speed * (step_numbers - first_step)
+            hit = (xs < right) & (xs + width > left) & (step_numbers >= first_step)
+            for step in np.nonzero(hit)[0]:
+                found.append((step, top - SAFETY_MARGIN, top + height + SAFETY_MARGIN))
+
+        for obstacle in game.obstacles:
+            add(obstacle.x - obstacle.speed, obstacle.speed, obstacle.width, obstacle.y, obstacle.height)
+        # Spawns still on the plan appear at their x on the step they're due, and move on that step
+        for spawn in game.level.pending:
+            first_step = int(np.ceil((spawn.time - game.sim_time) / jp.SIM_STEP_MS))
+            if first_step > steps:
+                break
+            if spawn.layout is None:
+                width, height = jp.OBSTACLE_SIZES[spawn.kind]
+                speed = jp.obstacle_speed(spawn.kind)
+                add(spawn.x - speed, speed, width, spawn.y, height, max(first_step, 1))
+        return np.array(found, float).reshape(-1, 3)
+
+    def coin_overlaps(self, jp, game, steps):
+        """As obstacle_overlaps, plus which coin each row is for"""
+        rect = game.player.rect
+        reach = rect.right + jp.SCROLL_SPEED * steps
+        found = []
+        coin = 0
+        for formation in game.coin_formations:
+            if formation.x > reach:
+                continue
+            for dx, dy in formation.remaining:
+                x = formation.x + dx - jp.SCROLL_SPEED
+                if x > reach or x + jp.COIN_SIZE < rect.left:
+                    continue
+                # Steps during which this coin is over the player's box
+                first = max(0, int((x - rect.right) // jp.SCROLL_SPEED) + 1)
+                last = min(steps - 1, int((x + jp.COIN_SIZE - rect.left) // jp.SCROLL_SPEED))
+                top = formation.y + dy
+                for step in range(first, last + 1):
+                    step_x = x - jp.SCROLL_SPEED * step
+                    if step_x < rect.right and step_x + jp.COIN_SIZE > rect.left:
+                        found.append((step, top, top + jp.COIN_SIZE, coin))
+                coin += 1
+        return np.array(found, float).reshape(-1, 4)
+
+    def score(self, jp, game, sequences_heights, obstacles, coins):
+        steps, count = sequences_heights.shape
+        player = game.player
+        offset = player.rect.y - player.y  # Collision box below the sprite's top
+        box_height = player.rect.height
+
+        survived = np.full(count, steps)
+        if len(obstacles):
+            rows = obstacles[:, 0].astype(int)
+            tops = sequences_heights[rows] + offset  # (overlaps, candidates)
+            hit = (tops < obstacles[:, 2:3]) & (tops + box_height > obstacles[:, 1:2])
+            survived = np.where(hit, rows[:, None], steps).min(axis=0)
+
+        collected = np.zeros(count)
+        if len(coins):
+            rows = coins[:, 0].astype(int)
+            tops = sequences_heights[rows] + offset
+            hit = (tops < coins[:, 2:3]) & (tops + box_height > coins[:, 1:2]) & (rows[:, None] < survived)
+            # Rows are grouped by coin; a coin counts once however many steps touch it
+            starts = np.flatnonzero(np.r_[True, np.diff(coins[:, 3]) != 0])
+            collected = np.logical_or.reduceat(hit, starts, axis=0).sum(axis=0)
+
+        middle = (jp.SCREEN_HEIGHT - player.height) / 2
+        off_centre = np.abs(sequences_heights - middle).mean(axis=0) / jp.SCREEN_HEIGHT
+        return survived * SURVIVAL_WEIGHT + collected * COIN_WEIGHT - off_centre * CENTRE_WEIGHT
+
+    def decide(self, game):
+        """Whether to thrust on the next step"""
+        start = time.perf_counter()
+        jp = sys.modules[type(game).__module__]
+        deadline = None if self.budget is None else start + self.budget - 1.5 * self.scoring_time
+        # The previous best plan, a step on, is always a candidate
+        carried = np.r_[self.plan[1:], self.plan[-1:]]
+        sequences = np.vstack((carried, self.bank))
+
+        obstacles = self.obstacle_overlaps(jp, game, self.horizon)
+        coins = self.coin_overlaps(jp, game, self.horizon)
+        if deadline is not None and time.perf_counter() >= deadline:
+            heights = None
+        else:
+            heights = self.simulate(jp, game.player, sequences, deadline)
+
+        if heights is None or len(heights) < MIN_HORIZON:
+            # Out of time: keep to the plan. The time kept for scoring may
+            # have been inflated by a one-off stall, so let it shrink
+            self.fallbacks += 1
+            self.plan = carried
+            self.scoring_time *= 0.95
+            self.horizons.append(0)
+        else:
+            scoring_start = time.perf_counter()
+            steps = len(heights)
+            scores = self.score(jp, game, heights, obstacles[obstacles[:, 0] < steps], coins[coins[:, 0] < steps])
+            self.plan = sequences[int(np.argmax(scores))]
+            self.scoring_time = min(max(time.perf_counter() - scoring_start, self.scoring_time * 0.95),
+                                    (self.budget or 0) / 3)
+            self.horizons.append(steps)
+
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+        self.decisions += 1
+        if self.budget is not None and latency > self.budget:
+            self.over_budget += 1
+        return bool(self.plan[0])
+
+    # Frame hook for attract mode: starts a run when the game has sat on the
+    # menu or game over screen for a while, and keeps the survival statistics
+
+    def __call__(self, game):
+        now = time.perf_counter()
+        if game.game_state != self.state:
+            if self.state == "playing":
+                self.record_run(game)
+            self.state = game.game_state
+            self.state_since = now
+        elif game.game_state != "playing" and now - self.state_since >= ATTRACT_DELAY:
+            game.start_game()
+
+    def record_run(self, game):
+        survived = game.sim_time / 1000
+        self.runs += 1
+        self.survival_total += survived
+        self.score_total += int(game.score)
+        self.coins_total += game.coins_collected
+        cause = game.death_cause or "none"  # Ended some other way, like a time limit
+        self.deaths[cause] = self.deaths.get(cause, 0) + 1
+        self.survival_times.append(survived)
+
+    def as_dict(self):
+        report = {"decisions": self.decisions, "over_budget": self.over_budget, "fallbacks": self.fallbacks,
+                  "budget_ms": None if self.budget is None else self.budget * 1000}
+        if self.latencies:
+            latencies = sorted(latency * 1000 for latency in self.latencies)
+            report["latency_ms"] = {"mean": round(sum(latencies) / len(latencies), 3),
+                                    "p50": round(percentile(latencies, 0.5), 3),
+                                    "p99": round(percentile(latencies, 0.99), 3),
+                                    "max": round(latencies[-1], 3)}
+            report["mean_horizon"] = round(sum(self.horizons) / len(self.horizons), 1)
+        if self.runs:
+            report["runs"] = {"count": self.runs,
+                              "survival_mean_s": round(self.survival_total / self.runs, 1),
+                              # Over the last RUN_SAMPLES_KEPT runs
+                              "survival_p50_s": round(percentile(sorted(self.survival_times), 0.5), 1),
+                              "score_mean": round(self.score_total / self.runs, 1),
+                              "coins_mean": round(self.coins_total / self.runs, 1),
+                              "deaths": dict(self.deaths)}
+        return report
+
+    def summary(self):
+        report = self.as_dict()
+        if "latency_ms" not in report:
+            return "autopilot: no decisions made"
+        latency = report["latency_ms"]
+        budget = f"{report['budget_ms']:g} ms" if report["budget_ms"] is not None else "no"
+        lines = [f"autopilot: {report['decisions']} decisions with a {budget} budget, "
+                 f"mean {latency['mean']:.3f} ms, p50 {latency['p50']:.3f}, p99 {latency['p99']:.3f}, "
+                 f"max {latency['max']:.3f}; {report['over_budget']} over budget, {report['fallbacks']} fell back "
+                 f"to the previous plan; mean horizon {report['mean_horizon']} steps"]
+        if "runs" in report:
+            runs = report["runs"]
+            lines.append(f"  {runs['count']} runs: survived {runs['survival_mean_s']}s on average "
+                         f"(median {runs['survival_p50_s']}s), score {runs['score_mean']}, "
+                         f"{runs['coins_mean']} coins, deaths {runs['deaths']}")
+        return "\n".join(lines)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# Batch evaluator for Jetpack Adventure
+#
+# Plays thousands of seeded, headless games across a multiprocessing pool to
+# help balance the spawn and speed constants. Each game is driven by a
+# policy (random, scripted or a simple heuristic autopilot) and runs as fast
+# as the CPU allows - no window, no real-time pacing.
+#
+#   python jetpack_batch.py sweep OUT_DIR --games 2000 --policy heuristic \
+#       --param OBSTACLE_FREQUENCY=1000,1500,2000 --param MISSILE_SPEED=8,12
+#
+# Every combination of --param values is played with the same seeds. Results
+# are written per chunk into OUT_DIR as they finish, so an interrupted sweep
+# picks up where it left off when run again with the same arguments, and are
+# merged into OUT_DIR/results.npz (one array per column) at the end.
+import os
+import sys
+import ast
+import json
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+
+import numpy as np
+
+SPEC_FILE = "sweep.json"
+RESULTS_FILE = "results.npz"
+DEFAULT_CHUNK_SIZE = 25
+DEFAULT_MAX_SECONDS = 300
+
+# Result columns and their storage types
+COLUMNS = [
+    ("config", np.uint16),
+    ("seed", np.uint32),
+    ("survival", np.float32),  # Seconds of game time survived
+    ("score", np.float32),
+    ("coins", np.uint16),
+    ("died", np.bool_),  # False if the game hit the time limit
+]
+
+# Game module, imported lazily in each worker so the parent never touches SDL
+jp = None
+
+def init_worker():
+    global jp
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    # SDL turns SIGTERM into a quit event by default, which would stop
+    # Pool.terminate() (and Ctrl+C) from ending the workers
+    os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+    import jetpack_adventure
+    jp = jetpack_adventure
+    jp.sounds_enabled = False
+    jp.pygame.mixer.music.stop()
+
+# Policies decide player.jetpack_on for every simulation step
+
+class RandomPolicy:
+    def __init__(self, seed, toggle_chance=0.08):
+        self.rng = random.Random(seed)
+        self.toggle_chance = toggle_chance
+        self.thrust = False
+
+    def decide(self, game):
+        if self.rng.random() < self.toggle_chance:
+            self.thrust = not self.thrust
+        return self.thrust
+
+class ScriptedPolicy:
+    # Repeating pattern of thrust/no-thrust step counts, e.g. [12, 18]
+    def __init__(self, seed, pattern=(12, 18)):
+        self.pattern = pattern
+        self.step = 0
+
+    def decide(self, game):
+        position = self.step % sum(self.pattern)
+        self.step += 1
+        for i, length in enumerate(self.pattern):
+            if position < length:
+                return i % 2 == 0
+            position -= length
+        return False
+
+class HeuristicPolicy:
+    # Steer towards a target height: clear of the nearest obstacle ahead,
+    # otherwise towards the next coins, otherwise the middle of the screen
+    LOOKAHEAD = 320  # How far ahead of the player (px) obstacles are considered
+    MARGIN = 20
+
+    def __init__(self, seed):
+        pass
+
+    def decide(self, game):
+        player = game.player
+        top = player.rect.y
+        bottom = player.rect.y + player.rect.height
+        target = jp.SCREEN_HEIGHT / 2
+
+        threat = None
+        for obstacle in game.obstacles:
+            if obstacle.x + obstacle.width > player.rect.x and obstacle.x < player.rect.right + self.LOOKAHEAD:
+                if threat is None or obstacle.x < threat.x:
+                    threat = obstacle
+
+        if threat is not None:
+            space_above = threat.y
+            space_below = jp.SCREEN_HEIGHT - (threat.y + threat.height)
+            if space_above > space_below:
+                target = threat.y - self.MARGIN - player.rect.height / 2
+            else:
+                target = threat.y + threat.height + self.MARGIN + player.rect.height / 2
+        else:
+            target = self.next_coin_height(game, target)
+
+        # Thrust if we'll be below the target shortly, allowing for momentum
+        predicted_center = (top + bottom) / 2 + player.velocity * 8
+        return predicted_center > target
+
+    def next_coin_height(self, game, default):
+        # Centre of the first uncollected coin ahead of the player
+        player_x = game.player.rect.x
+        for formation in game.coin_formations:
+            for dx, dy in formation.remaining:
+                if formation.x + dx > player_x:
+                    return formation.y + dy + jp.COIN_SIZE / 2
+        return default
+
+class RolloutPolicy:
+    # jetpack_autopilot's rollout planner, without its time budget so games
+    # play out the same on any machine
+    def __init__(self, seed):
+        from jetpack_autopilot import Autopilot
+        self.autopilot = Autopilot(budget_ms=None)
+
+    def decide(self, game):
+        return self.autopilot.decide(game)
+
+POLICIES = {
+    "random": RandomPolicy,
+    "scripted": ScriptedPolicy,
+    "heuristic": HeuristicPolicy,
+    "rollout": RolloutPolicy,
+}
+
+def play_game(seed, policy_name, max_seconds):
+    """Play one seeded game headless; returns (survival seconds, score, coins, died)"""
+    game = jp.Game(seed=seed)
+    game.events.consumers = []  # Nobody sees or hears these games
+    game.start_game()
+    policy = POLICIES[policy_name](seed)
+    max_steps = int(max_seconds * jp.FPS)
+
+    steps = 0
+    while game.game_state == "playing" and steps < max_steps:
+        game.player.jetpack_on = policy.decide(game)
+        game.update()
+        steps += 1
+    return steps * jp.SIM_STEP, game.score, game.coins_collected, game.game_state == "game_over"
+
+def run_chunk(job):
+    """Worker entry point: play a chunk of seeds with one parameter set"""
+    config_index, params, seeds, policy_name, max_seconds = job
+    for name, value in params.items():
+        setattr(jp, name, tuple(value) if isinstance(value, list) else value)
+
+    rows = [(config_index, seed) + play_game(seed, policy_name, max_seconds) for seed in seeds]
+    columns = {name: np.array([row[i] for row in rows], dtype=dtype) for i, (name, dtype) in enumerate(COLUMNS)}
+    return config_index, seeds[0], columns
+
+# "1500" -> 1500, "0.3" -> 0.3, "100:550" -> (100, 550)
+def parse_value(text):
+    if ":" in text:
+        return tuple(parse_value(part) for part in text.split(":"))
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+# Upper-case names assigned at the top of the game module. They're read from
+# its source, as importing it here would start SDL in the parent.
+def game_constants():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jetpack_adventure.py")
+    with open(path) as source:
+        tree = ast.parse(source.read(), path)
+    names = set()
+    for node in tree.body:
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target] if isinstance(node, ast.AnnAssign) else []
+        names.update(target.id for target in targets if isinstance(target, ast.Name) and target.id.isupper())
+    return names
+
+def parse_params(param_args):
+    """--param arguments -> one dict per combination; ValueError for a malformed one or an unknown constant"""
+    constants = game_constants()
+    axes = []
+    for arg in param_args:
+        name, _, values = arg.partition("=")
+        if not values:
+            raise ValueError(f"--param needs NAME=VALUE[,VALUE...], got {arg!r}")
+        if name not in constants:
+            # Setting it would only add a new attribute, and the sweep would play the defaults
+            raise ValueError(f"--param {name}: not a constant of the game (e.g. OBSTACLE_FREQUENCY, MISSILE_SPEED)")
+        axes.append([(name, parse_value(value)) for value in values.split(",")])
+    return [dict(combination) for combination in itertools.product(*axes)]
+
+def chunk_path(out_dir, config_index, first_seed):
+    return os.path.join(out_dir, f"chunk_{config_index:04d}_{first_seed:08d}.npz")
+
+def save_npz(path, **arrays):
+    # Write to a temporary file first so an interruption never leaves a partial chunk behind
+    temp_path = path + ".tmp.npz"
+    np.savez_compressed(temp_path, **arrays)
+    os.replace(temp_path, path)
+
+def sweep(args):
+    configs = parse_params(args.param)
+    seeds = list(range(args.seed, args.seed + args.games))
+    spec = {"configs": configs, "seeds": [seeds[0], len(seeds)], "policy": args.policy,
+            "max_seconds": args.max_seconds, "chunk_size": args.chunk_size}
+    # Normalise tuples to lists so the spec compares equal after a JSON round trip
+    spec = json.loads(json.dumps(spec))
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    spec_path = os.path.join(args.out_dir, SPEC_FILE)
+    if os.path.exists(spec_path):
+        with open(spec_path) as spec_file:
+            if json.load(spec_file) != spec:
+                raise SystemExit(f"{args.out_dir} holds a different sweep; use a new directory")
+    else:
+        with open(spec_path, "w") as spec_file:
+            json.dump(spec, spec_file, indent=2)
+
+    jobs = []
+    for config_index, params in enumerate(spec["configs"]):
+        for start in range(0, len(seeds), args.chunk_size):
+            chunk = seeds[start:start + args.chunk_size]
+            if not os.path.exists(chunk_path(args.out_dir, config_index, chunk[0])):
+                jobs.append((config_index, params, chunk, args.policy, args.max_seconds))
+
+    total_chunks = len(configs) * len(range(0, len(seeds), args.chunk_size))
+    print(f"{len(configs)} configs x {len(seeds)} seeds, {total_chunks - len(jobs)}/{total_chunks} chunks already done")
+
+    start_time = time.perf_counter()
+    games = 0
+    if jobs:
+        # Spawned (not forked) workers, so none of them inherits SDL state
+        with multiprocessing.get_context("spawn").Pool(args.workers, initializer=init_worker) as pool:
+            for config_index, first_seed, columns in pool.imap_unordered(run_chunk, jobs):
+                save_npz(chunk_path(args.out_dir, config_index, first_seed), **columns)
+                games += len(columns["seed"])
+                print(f"\r{games} games", end="", flush=True)
+            pool.close()
+            pool.join()
+        elapsed = time.perf_counter() - start_time
+        print(f"\r{games} games in {elapsed:.1f}s ({games / elapsed:.1f} games/s on {args.workers or os.cpu_count()} workers)")
+
+    results = merge(args.out_dir, configs)
+    summarize(results, configs)
+
+def merge(out_dir, configs):
+    parts = {name: [] for name, _ in COLUMNS}
+    for name in sorted(os.listdir(out_dir)):
+        if name.startswith("chunk_") and name.endswith(".npz") and ".tmp" not in name:
+            with np.load(os.path.join(out_dir, name)) as chunk:
+                for column in parts:
+                    parts[column].append(chunk[column])
+    results = {name: np.concatenate(arrays) if arrays else np.zeros(0, dtype)
+               for (name, dtype), arrays in zip(COLUMNS, parts.values())}
+    save_npz(os.path.join(out_dir, RESULTS_FILE), configs=np.array(json.dumps(configs)), **results)
+    return results
+
+def summarize(results, configs):
+    print(f"{'config':<40} {'games':>6} {'survival p50/p90':>18} {'score mean':>11} {'coins mean':>11} {'died':>6}")
+    for config_index, params in enumerate(configs):
+        rows = results["config"] == config_index
+        if not rows.any():
+            continue
+        survival = results["survival"][rows]
+        label = " ".join(f"{name}={value}" for name, value in params.items()) or "defaults"
+        percentiles = f"{np.percentile(survival, 50):.1f}/{np.percentile(survival, 90):.1f}s"
+        print(f"{label:<40} {rows.sum():>6} {percentiles:>18} "
+              f"{results['score'][rows].mean():>11.1f} {results['coins'][rows].mean():>11.2f} "
+              f"{results['died'][rows].mean():>6.0%}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure batch evaluator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sweep_parser = subparsers.add_parser("sweep", help="play seeded games for every parameter combination")
+    sweep_parser.add_argument("out_dir")
+    sweep_parser.add_argument("--games", type=int, default=1000, help="seeds per parameter combination")
+    sweep_parser.add_argument("--seed", type=int, default=0, help="first seed")
+    sweep_parser.add_argument("--policy", choices=sorted(POLICIES), default="heuristic")
+    sweep_parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                              help="game constant to vary, e.g. MISSILE_SPEED=8,12 or MISSILE_Y_RANGE=100:550")
+    sweep_parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS,
+                              help="stop a game that survives this long")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    sweep_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="games per work unit")
+
+    args = parser.parse_args(argv)
+    if args.command == "sweep":
+        try:
+            parse_params(args.param)
+        except ValueError as error:
+            sweep_parser.error(str(error))
+        sweep(args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
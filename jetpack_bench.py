@@ -0,0 +1,1017 @@
+#!/usr/bin/env python3
+# Benchmarks for Jetpack Adventure
+#
+# Runs headless with SDL's dummy video/audio drivers, e.g.:
+#   python jetpack_bench.py snapshot
+import os
+import sys
+import json
+import time
+import random
+import pickle
+import argparse
+
+# Must be set before pygame is imported by the game module
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import jetpack_adventure as jp
+
+# Play a seeded game for a number of steps with a simple random thrust pattern
+# so the benchmarks run against a realistic mid-game state
+def play_steps(game, steps, seed=0):
+    rng = random.Random(seed)
+    for _ in range(steps):
+        if game.game_state != "playing":
+            game.start_game()
+        if rng.random() < 0.1:
+            game.player.jetpack_on = not game.player.jetpack_on
+        game.update()
+
+# Obstacle variants are cosmetic (picked with the global random), so
+# determinism checks leave them out
+def gameplay_state(snapshot):
+    return snapshot._replace(obstacles=tuple(obstacle[:5] for obstacle in snapshot.obstacles))
+
+def report(name, seconds, count):
+    print(f"{name:<24} {seconds / count * 1e6:10.2f} us/op  ({count} ops)")
+
+def bench_snapshot(args):
+    jp.sounds_enabled = False
+    game = jp.Game(seed=args.seed)
+    game.start_game()
+    play_steps(game, args.warmup, args.seed)
+
+    snapshot = game.snapshot()
+    print(f"entities: {len(game.obstacles)} obstacles, {len(game.coin_formations)} coin formations")
+    print(f"snapshot size: {len(pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL))} bytes pickled")
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        game.snapshot()
+    report("snapshot", time.perf_counter() - start, args.iterations)
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        game.restore(snapshot)
+    report("restore", time.perf_counter() - start, args.iterations)
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        game.start_game()
+    report("restart (start_game)", time.perf_counter() - start, args.iterations)
+
+    # Restoring and replaying must land on the same state
+    game.restore(snapshot)
+    play_steps(game, 120, args.seed + 1)
+    first = gameplay_state(game.snapshot())
+    game.restore(snapshot)
+    play_steps(game, 120, args.seed + 1)
+    print("deterministic replay:", "ok" if gameplay_state(game.snapshot()) == first else "MISMATCH")
+
+# Per-frame cost of a dense bonus formation: the same coins as one
+# CoinFormation and as individual Coin objects (the old way)
+def bench_coins(args):
+    jp.sounds_enabled = False
+    jp.prebuild_sprites()
+    layout = jp.text_layout(args.text, args.font_size)
+    # The player flies straight through the middle of the formation
+    player_rect = jp.pygame.Rect(100, jp.SCREEN_HEIGHT // 2, 50, 60)
+    y = (jp.SCREEN_HEIGHT - layout.height) // 2
+    steps = (jp.SCREEN_WIDTH + layout.width) // jp.SCROLL_SPEED
+    print(f"{len(layout.offsets)} coins, {layout.width}x{layout.height} px, {steps} frames on screen")
+
+    def run_formations():
+        formation = jp.CoinFormation(layout, jp.SCREEN_WIDTH, y)
+        collected = 0
+        for _ in range(steps):
+            formation.update()
+            collected += formation.collect(player_rect)
+            formation.draw()
+        return collected
+
+    def run_coins():
+        coins = [jp.Coin(jp.SCREEN_WIDTH + dx, y + dy) for dx, dy in layout.offsets]
+        collected = 0
+        for _ in range(steps):
+            for coin in coins[:]:
+                coin.update()
+                if not coin.collected and player_rect.colliderect(coin.rect):
+                    coin.collected = True
+                    collected += 1
+                if coin.x + coin.width < 0 or coin.collected:
+                    coins.remove(coin)
+            for coin in coins:
+                coin.draw()
+        return collected
+
+    for name, run in (("CoinFormation", run_formations), ("Coin objects", run_coins)):
+        run()  # Warm up (and build the formation's frames)
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            collected = run()
+        report(f"{name} frame", time.perf_counter() - start, args.iterations * steps)
+        print(f"  {collected} coins collected per pass")
+
+# Per-step cost of planning the level ahead (LevelPlanner.plan)
+def bench_level(args):
+    jp.sounds_enabled = False
+    game = jp.Game(seed=args.seed)
+    game.start_game()
+    level = game.level
+    rng = random.Random(args.seed)
+    timings = []
+    for _ in range(args.steps):
+        if game.game_state != "playing":
+            game.start_game()
+        if rng.random() < 0.1:
+            game.player.jetpack_on = not game.player.jetpack_on
+        # Do the planning the coming update would do, timed on its own
+        start = time.perf_counter()
+        level.plan(game.sim_time + jp.SIM_STEP_MS + jp.LOOKAHEAD_MS)
+        timings.append(time.perf_counter() - start)
+        game.update()
+
+    timings.sort()
+    print(f"{args.steps} steps, {level.rejected} placements rejected, {level.dropped} spawns dropped")
+    report("plan (mean)", sum(timings), len(timings))
+    print(f"{'p99':<24} {timings[int(len(timings) * 0.99)] * 1e6:10.2f} us")
+    print(f"{'max':<24} {timings[-1] * 1e6:10.2f} us")
+
+# Draw the same game states with the Surface and the texture renderer and
+# compare the pixels. Blending rounds slightly differently in SDL's
+# renderers, so channels may differ by up to --tolerance. Also reports what
+# a frame costs with each.
+def bench_parity(args):
+    import numpy as np
+    from jetpack_renderer import TextureRenderer
+    from jetpack_resolution import ScaledRenderer
+
+    jp.sounds_enabled = False
+    random.seed(args.seed)  # Particles use the global random
+    game = jp.Game(seed=args.seed)
+    jp.prebuild_sprites()
+    size = (jp.SCREEN_WIDTH, jp.SCREEN_HEIGHT)
+    surface_renderer = jp.SurfaceRenderer(jp.pygame.Surface(size))
+    texture_renderer = TextureRenderer(size, hidden=True)
+    texture_renderer.frame_surface()
+    # At the game's own size, scaled sprites are the sprites themselves in another pixel format
+    scaled_renderer = ScaledRenderer(jp.pygame.Surface(size).convert(), size, font_specs=jp.font_specs)
+    scaled_renderer.preload(jp.sprite_surfaces(game))
+    renderers = (surface_renderer, texture_renderer, scaled_renderer)
+
+    def scenes():
+        yield "menu"
+        game.start_game()
+        play_steps(game, 300, args.seed)
+        game.player.jetpack_on = True
+        for _ in range(20):
+            game.update()
+        game.spawn_formation(jp.text_layout("BONUS", 16), 200)
+        game.update()
+        yield "playing"
+        game.player.alive = False
+        game.explosions.append(jp.Explosion(game.player.x, game.player.y))
+        game.game_over()
+        for _ in range(5):
+            game.update()
+        yield "game over"
+
+    failed = False
+    for scene in scenes():
+        frames = []
+        frame_times = []
+        for renderer in renderers:
+            jp.renderer = renderer
+            start = time.perf_counter()
+            for _ in range(args.frames):
+                game.draw(0.5)
+                renderer.present()
+            frame_times.append((time.perf_counter() - start) / args.frames * 1000)
+            frames.append(jp.pygame.surfarray.array3d(renderer.frame_surface()).astype(np.int16))
+        for renderer, frame, frame_time in zip(renderers[1:], frames[1:], frame_times[1:]):
+            difference = np.abs(frames[0] - frame).max(axis=2)
+            mismatched = (difference > args.tolerance).mean()
+            ok = mismatched <= args.max_mismatch
+            failed |= not ok
+            print(f"{scene:<12} {renderer.name:<8} max channel difference {difference.max():3}, "
+                  f"{mismatched:.4%} of pixels over {args.tolerance}: {'ok' if ok else 'MISMATCH'}  "
+                  f"(surface {frame_times[0]:.2f} ms/frame, {renderer.name} {frame_time:.2f} ms/frame)")
+    texture_renderer.close()
+    if failed:
+        sys.exit(1)
+
+# A display that flips at a fixed refresh rate: present() blocks until the
+# next refresh, the way a vsynced flip does
+class VsyncRenderer:
+    def __init__(self, renderer, refresh_hz):
+        self.renderer = renderer
+        self.period = 1.0 / refresh_hz
+        self.start = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self.renderer, name)
+
+    def present(self):
+        elapsed = time.perf_counter() - self.start
+        jp.sleep_until(self.start + (int(elapsed / self.period) + 1) * self.period)
+        self.renderer.present()
+
+# Input-to-flip latency of the game loop, with and without late latching.
+# A thread posts timestamped thrust presses and releases at random moments,
+# so they land anywhere in the frame, like real input.
+def bench_latency(args):
+    import threading
+    from jetpack_latency import LatencyMonitor
+
+    jp.sounds_enabled = False
+    jp.filter_events()
+    jp.prebuild_sprites()
+    if args.vsync_hz:
+        jp.renderer = VsyncRenderer(jp.renderer, args.vsync_hz)
+    render_fps = 0 if args.vsync_hz else args.render_fps
+
+    def keep_playing(game):
+        if game.game_state != "playing":
+            game.start_game()
+
+    def post_input(stop):
+        rng = random.Random(args.seed)
+        event_type = jp.pygame.KEYDOWN
+        while not stop.wait(rng.uniform(0.02, 0.08)):
+            jp.pygame.event.post(jp.pygame.event.Event(event_type, key=jp.pygame.K_SPACE, time=time.perf_counter()))
+            event_type = jp.pygame.KEYUP if event_type == jp.pygame.KEYDOWN else jp.pygame.KEYDOWN
+
+    pacing = f"{args.vsync_hz} Hz vsync" if args.vsync_hz else f"{args.render_fps} fps cap"
+    print(f"{args.frames} frames per loop, {pacing}")
+    for late_latch in (False, True):
+        game = jp.Game(seed=args.seed)
+        game.start_game()
+        monitor = game.latency = LatencyMonitor()
+        stop = threading.Event()
+        poster = threading.Thread(target=post_input, args=(stop,), daemon=True)
+        jp.pygame.event.clear()
+        poster.start()
+        jp.run_loop(game, render_fps, [monitor, keep_playing], late_latch, max_frames=args.frames)
+        stop.set()
+        poster.join()
+        print(("late latch" if late_latch else "default") + " " + monitor.summary())
+
+# Frame-to-frame times of the single-process loop and of the render side of
+# --split, with the same frame cap. Runs restart as soon as they end.
+def bench_split(args):
+    from statistics import mean, pstdev
+    from jetpack_split import run_split
+
+    jp.sounds_enabled = False
+    jp.prebuild_sprites()
+
+    def frame_times(run):
+        stamps = []
+        run(lambda game: stamps.append(time.perf_counter()))
+        return sorted((b - a) * 1000 for a, b in zip(stamps[1:], stamps[2:]))
+
+    def keep_playing(game):
+        if game.game_state != "playing":
+            game.start_game()
+
+    def single(hook):
+        game = jp.Game(seed=args.seed)
+        game.start_game()
+        jp.run_loop(game, args.render_fps, [hook, keep_playing], max_frames=args.frames)
+
+    def split(hook):
+        game = jp.Game(seed=args.seed)
+        # Start from the menu like a player would
+        jp.pygame.event.post(jp.pygame.event.Event(jp.pygame.KEYDOWN, key=jp.pygame.K_SPACE))
+        run_split(game, args.render_fps, [hook], seed=args.seed, restart=True, max_frames=args.frames)
+
+    print(f"{args.frames} frames each, {args.render_fps or 'uncapped'} fps cap")
+    for name, run in (("single process", single), ("split", split)):
+        times = frame_times(run)
+        print(f"{name:<16} frame time mean {mean(times):6.2f} ms, stdev {pstdev(times):5.2f}, "
+              f"p99 {times[int(len(times) * 0.99)]:6.2f}, max {times[-1]:6.2f}")
+
+# What recording a finished run costs the game loop, how fast the writer
+# gets runs to disk, and whether the store recovers from a torn write and
+# from a crash in the middle of compacting
+def bench_scores(args):
+    import tempfile
+    import jetpack_scores
+
+    game = jp.Game(seed=args.seed)
+    game.death_cause = "missile"
+    rng = random.Random(args.seed)
+    frame_times = [0.016] * 3600  # A minute's worth of frames per run
+    jetpack_scores.COMPACT_INTERVAL = args.runs // 4
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = jetpack_scores.ScoreStore(directory)
+        submit_times = []
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            game.score = rng.randrange(10000)
+            game.coins_collected = rng.randrange(100)
+            game.sim_time = rng.uniform(1000, 120000)
+            submitted = time.perf_counter()
+            store.submit(game, list(frame_times))
+            submit_times.append(time.perf_counter() - submitted)
+        store.close()
+        elapsed = time.perf_counter() - start
+        submit_times.sort()
+        report("submit (mean)", sum(submit_times), len(submit_times))
+        print(f"{'submit p99':<24} {submit_times[int(len(submit_times) * 0.99)] * 1e6:10.2f} us")
+        print(f"{store.records_written} runs written in {store.batches_written} batches, {elapsed:.2f}s, "
+              f"log {os.path.getsize(store.log_path)} bytes after compaction")
+        expected = dict(store.index)
+
+        checks = []
+        # A crash in the middle of an append leaves a partial line at the end
+        with open(store.log_path, "ab") as log_file:
+            log_file.write(jetpack_scores.encode_line({"score": 1})[:-7])
+        reopened = jetpack_scores.ScoreStore(directory)
+        reopened.close()
+        checks.append(("torn append", reopened.index == expected))
+
+        # A crash between compacting the log and writing the index
+        jetpack_scores.write_atomic(store.index_path, json.dumps(dict(expected, generation=expected["generation"] - 1)).encode())
+        reopened = jetpack_scores.ScoreStore(directory)
+        reopened.close()
+        checks.append(("compaction crash", {key: reopened.index[key] for key in ("high_score", "top", "runs", "total_coins")}
+                       == {key: expected[key] for key in ("high_score", "top", "runs", "total_coins")}))
+
+        start = time.perf_counter()
+        jetpack_scores.ScoreStore(directory).close()
+        print(f"{'startup':<24} {(time.perf_counter() - start) * 1e3:10.2f} ms")
+        for name, ok in checks:
+            print(f"{name:<24} {'ok' if ok else 'MISMATCH'}")
+        if not all(ok for name, ok in checks):
+            sys.exit(1)
+
+# Frame pacing of the asyncio loop at a fixed frame rate, alone and with
+# other coroutines keeping the event loop busy in chunks of CPU work between
+# awaits. A wait yields to them as it spins, so it can end up to one round
+# of their chunks late; fails if the p99 lateness of the frame waits goes
+# over that by more than --max-late-ms (frames whose own work overran are
+# counted, not timed). Each loop starts a run from the menu and ends it with
+# a forced death halfway through, and fails unless the start, game over and
+# quit hooks each ran once.
+def bench_pacing(args):
+    import asyncio
+
+    jp.sounds_enabled = False
+    jp.prebuild_sprites()
+
+    async def busy(chunk, done):
+        while True:
+            deadline = time.perf_counter() + chunk
+            while time.perf_counter() < deadline:
+                pass
+            done[0] += 1
+            await asyncio.sleep(0)
+
+    async def session(workers):
+        game = jp.Game(seed=args.seed)
+        pacer = jp.FramePacer()
+        events = {"start": 0, "game over": 0, "quit": 0}
+
+        def counter(name):
+            async def hook(game):
+                events[name] += 1
+            return hook
+
+        frames = [0]
+        def script(game):
+            # A little of the menu, a run, then the game over screen
+            frames[0] += 1
+            if frames[0] == args.frames // 10:
+                game.start_game()
+            elif frames[0] == args.frames // 2 and game.game_state == "playing":
+                game.player.alive = False
+                game.game_over()
+
+        done = [0]
+        tasks = [asyncio.create_task(busy(args.chunk_ms / 1000, done)) for _ in range(workers)]
+        start = time.perf_counter()
+        await jp.run(game, args.render_fps, frame_hooks=[script], on_start=counter("start"),
+                     on_game_over=counter("game over"), on_quit=counter("quit"), pacer=pacer, max_frames=args.frames)
+        elapsed = time.perf_counter() - start
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return pacer, done[0] * args.chunk_ms / 1000 / elapsed, events
+
+    print(f"{args.frames} frames at {args.render_fps} fps, background work in {args.chunk_ms} ms chunks")
+    worst = 0.0
+    hooks_ok = True
+    for workers in (0, args.workers):
+        pacer, share, events = asyncio.run(session(workers))
+        lateness = sorted(pacer.lateness)
+        p99 = lateness[int(len(lateness) * 0.99)] * 1000
+        worst = max(worst, p99 - workers * args.chunk_ms)
+        print(f"{workers} busy coroutines: waits late mean {sum(lateness) / len(lateness) * 1000:6.3f} ms, "
+              f"p99 {p99:6.3f}, max {lateness[-1] * 1000:6.3f}; background got {share:5.1%} of the time; "
+              f"{pacer.overruns} overran; hooks {events}")
+        if any(count != 1 for count in events.values()):
+            print(f"each hook should have run once, not {events}")
+            hooks_ok = False
+    if worst > args.max_late_ms:
+        print(f"p99 lateness {worst:.3f} ms beyond a round of background chunks is over {args.max_late_ms} ms")
+    if worst > args.max_late_ms or not hooks_ok:
+        sys.exit(1)
+
+# Memory and per-frame cost of ghost racing: trajectories are recorded from
+# seeded games played by the batch evaluator's heuristic autopilot, then raced
+# in fields of growing size, and compared with the same number of Player
+# objects updated and drawn one by one
+def bench_ghosts(args):
+    import numpy as np
+    import jetpack_batch
+    from jetpack_ghosts import ALIVE, GhostRace, Trajectory
+
+    jp.sounds_enabled = False
+    jp.prebuild_sprites()
+    jetpack_batch.jp = jp
+    race = GhostRace(max_ghosts=args.ghosts)
+    trajectories = []
+    for seed in range(args.seed, args.seed + args.ghosts):
+        game = jp.Game(seed=seed)
+        game.ghosts = race
+        policy = jetpack_batch.HeuristicPolicy(seed)
+        game.start_game()
+        for _ in range(int(args.minutes * 60 * jp.FPS)):
+            if game.game_state != "playing":
+                break
+            game.player.jetpack_on = policy.decide(game)
+            game.update()
+        else:
+            game.game_over()
+        trajectories.append(race.recent[-1])
+    minutes = sum(len(ghost.heights) for ghost in trajectories) / (60 * jp.FPS)
+    total = sum(ghost.nbytes for ghost in trajectories)
+    print(f"{len(trajectories)} trajectories, {minutes:.1f} minutes: {total / 1024:.1f} KiB, "
+          f"{total / minutes / 1024:.2f} KiB per minute")
+
+    # Race every run recorded, with the shorter ones repeated so the whole field stays on screen
+    frames = args.frames
+    race.best = [Trajectory(np.resize(ghost.heights, frames + 1), np.resize(ghost.flags, frames + 1) | ALIVE, ghost.score)
+                 for ghost in trajectories]
+    race.recent.clear()
+    player = jp.Game().player
+    for count in sorted({1, 10, args.ghosts}):
+        race.max_ghosts = count
+        race.start()
+        race.draw(jp.renderer, player)  # Warm up (and tint the frames)
+        start = time.perf_counter()
+        for _ in range(frames):
+            race.record(player)
+            race.draw(jp.renderer, player, 0.5)
+        report(f"{count} ghosts frame", time.perf_counter() - start, frames)
+
+        # The same field as Player objects, each updated and drawn on its own
+        players = [jp.Player() for _ in range(count)]
+        ghosts = race.field()
+        start = time.perf_counter()
+        for step in range(frames):
+            for ghost_player, ghost in zip(players, ghosts):
+                ghost_player.jetpack_on = bool(ghost.flags[step] & 1)
+                ghost_player.update()
+                ghost_player.draw(0.5)
+        report(f"{count} Player objects frame", time.perf_counter() - start, frames)
+    print(f"stacked arrays for {args.ghosts} ghosts of {frames} steps: {race.memory()['stacked_bytes'] / 1024:.1f} KiB")
+
+# Decision latency of the rollout autopilot against its time budget, and how
+# long it survives, on seeded games played headless (up to --max-seconds of
+# game time each). The batch evaluator's heuristic policy plays the same
+# seeds for comparison.
+def bench_autopilot(args):
+    import jetpack_batch
+    from jetpack_autopilot import Autopilot
+
+    jp.sounds_enabled = False
+    jp.prebuild_sprites()
+    jetpack_batch.jp = jp
+    max_steps = int(args.max_seconds * jp.FPS)
+
+    def play(decide_for):
+        survival = []
+        for seed in range(args.seed, args.seed + args.games):
+            game = jp.Game(seed=seed)
+            decide = decide_for(game)
+            game.start_game()
+            steps = 0
+            while game.game_state == "playing" and steps < max_steps:
+                game.player.jetpack_on = decide(game)
+                game.update()
+                steps += 1
+            survival.append(steps / jp.FPS)
+            if game.game_state == "playing":
+                game.game_over()
+            yield game
+
+    print(f"{args.games} games of up to {args.max_seconds:g}s")
+    for budget in (args.budget_ms, None):
+        autopilot = Autopilot(budget)
+        for game in play(lambda game: autopilot.decide):
+            autopilot.record_run(game)
+        print(autopilot.summary())
+
+    survival = []
+    for game in play(lambda game: jetpack_batch.HeuristicPolicy(0).decide):
+        survival.append(game.sim_time / 1000)
+    survival.sort()
+    print(f"heuristic policy: survived {sum(survival) / len(survival):.1f}s on average "
+          f"(median {survival[len(survival) // 2]:.1f}s)")
+
+# Swept collision at a multiple of the normal speeds: every obstacle type is
+# flown past the player at --speed times its speed, for a grid of heights,
+# starting offsets and player velocities (up to --speed times MAX_VELOCITY,
+# either way). The paths are also stepped through in --substeps pieces per
+# step to find every hit and roughly when it happened; a hit the swept check
+# misses, or places at the wrong time, is an error. The old end-of-step
+# colliderect test is run on the same paths for comparison. Then the cost of a
+# step's collision check is timed against the number of obstacles on screen.
+def bench_collision(args):
+    jp.sounds_enabled = False
+    player = jp.Player()
+    box_width, box_height = player.rect.size
+
+    def overlapping(player_top, obstacle_x, obstacle):
+        return (obstacle_x < player.x + 10 + box_width and player.x + 10 < obstacle_x + obstacle.width
+                and obstacle.y < player_top + box_height and player_top < obstacle.y + obstacle.height)
+
+    hits = swept_missed = discrete_missed = extra = wrong_time = 0
+    worst_error = 0.0
+    for kind in jp.OBSTACLE_SIZES:
+        speed = jp.obstacle_speed(kind) * args.speed
+        max_velocity = jp.MAX_VELOCITY * args.speed
+        width, height = jp.OBSTACLE_SIZES[kind]
+        for velocity in range(-max_velocity, max_velocity + 1, 3):
+            for offset in range(-height - box_height - 10, box_height + 10, 7):
+                for phase in range(0, speed, 3):
+                    player.y = player.prev_y = 5000.0
+                    # Heights are set relative to where the player is when the obstacle reaches it
+                    steps_to_reach = 10
+                    obstacle = jp.Obstacle(player.x + 10 + box_width + speed * steps_to_reach - phase,
+                                           player.y + 10 + velocity * steps_to_reach + offset, kind, 0)
+                    obstacle.speed = speed
+                    found = swept = discrete = None
+                    for step in range(2 * steps_to_reach + (width + box_width) // speed + 2):
+                        player.prev_y = player.y
+                        player.y += velocity
+                        player.rect.y = player.y + 10
+                        obstacle.update()
+                        if found is None:
+                            for substep in range(1, args.substeps + 1):
+                                t = substep / args.substeps
+                                if overlapping(jp.lerp(player.prev_y, player.y, t) + 10,
+                                               jp.lerp(obstacle.prev_x, obstacle.x, t), obstacle):
+                                    found = (step, t)
+                                    break
+                        if swept is None:
+                            impact = jp.first_impact(player, [obstacle])
+                            if impact is not None:
+                                swept = (step, impact[0])
+                        if discrete is None and player.rect.colliderect(obstacle.rect):
+                            discrete = step
+                    if found is None:
+                        # A touch shorter than a substep can fall between them
+                        extra += swept is not None
+                        continue
+                    hits += 1
+                    discrete_missed += discrete is None
+                    if swept is None or swept[0] > found[0]:
+                        swept_missed += 1
+                    elif swept[0] == found[0]:
+                        # The substep found the hit within one substep after it happened
+                        error = found[1] - swept[1]
+                        worst_error = max(worst_error, abs(error))
+                        wrong_time += not -1e-9 <= error <= 1 / args.substeps + 1e-9
+    print(f"{args.speed}x speed: {hits} hits on {args.substeps} substeps a step")
+    print(f"  swept check missed {swept_missed}, timed {wrong_time} wrongly "
+          f"(largest difference {worst_error:.4f} of a step), found {extra} between substeps")
+    print(f"  end-of-step colliderect missed {discrete_missed}")
+
+    rng = random.Random(args.seed)
+    player = jp.Game().player
+    for count in (1, 10, 100, 1000):
+        obstacles = [jp.Obstacle(rng.uniform(player.x + 300, jp.SCREEN_WIDTH * 4), rng.uniform(0, jp.SCREEN_HEIGHT),
+                                 rng.choice(list(jp.OBSTACLE_SIZES)), 0) for _ in range(count)]
+        for obstacle in obstacles:
+            obstacle.update()
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            jp.first_impact(player, obstacles)
+        report(f"{count} obstacles swept", time.perf_counter() - start, args.iterations)
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            for obstacle in obstacles:
+                player.rect.colliderect(obstacle.rect)
+        report(f"{count} obstacles colliderect", time.perf_counter() - start, args.iterations)
+    if swept_missed or wrong_time:
+        sys.exit(1)
+
+# Offline rendering of a recorded session: a run played by the heuristic
+# policy is rendered once in a single chunk, then in chunks across 1, 2, 4...
+# workers (up to --workers). Every chunked render must come out byte for byte
+# the same as the unbroken one.
+def bench_render(args):
+    import filecmp
+    import tempfile
+    import jetpack_render
+    from jetpack_session import record_policy
+
+    with tempfile.TemporaryDirectory() as directory:
+        session_path = os.path.join(directory, "session.jps")
+        session = record_policy(session_path, "heuristic", args.seed, args.seconds)
+        print(f"session: {len(session.inputs)} steps, score {session.metadata['score']}")
+
+        def render(name, workers, chunk_frames):
+            output_dir = os.path.join(directory, name)
+            index = jetpack_render.render_session(session_path, output_dir, workers, chunk_frames, args.tail_seconds)
+            print(f"{name:<24} {index['frames']} frames in {index['seconds']:6.2f}s  "
+                  f"{index['frames_per_second']:7.1f} fps")
+            return output_dir, index
+
+        reference, index = render("unbroken, 1 worker", 1, 10 ** 9)
+        print(f"replay score {index['score']}, recorded {session.metadata['score']}")
+        names = [jetpack_render.FRAME_FILE.format(frame) for frame in range(index["frames"])]
+        mismatched = 0
+        workers = 1
+        while workers <= args.workers:
+            output_dir, _ = render(f"chunked, {workers} workers", workers, args.chunk_frames)
+            _, mismatch, errors = filecmp.cmpfiles(reference, output_dir, names, shallow=False)
+            mismatched += len(mismatch) + len(errors)
+            workers *= 2
+    print(f"chunked frames differing from the unbroken render: {mismatched}")
+    if mismatched:
+        sys.exit(1)
+
+# Seekable session files: one long run is recorded (the heuristic policy
+# flying, with obstacles made harmless so it lasts --minutes), then saved with
+# keyframes every N steps for each N in --intervals. For each, the file size
+# per minute and the time to seek to random steps are reported, and every
+# seek must land on the state playing the run through from the start reaches.
+def bench_session(args):
+    import tempfile
+    import jetpack_batch
+    from jetpack_session import RecordedSession, SessionReader, SessionRecorder, encode_keyframe, save_session
+
+    jp.sounds_enabled = False
+    jetpack_batch.jp = jp
+    intervals = sorted(args.intervals)
+    if any(interval % intervals[0] for interval in intervals):
+        raise SystemExit("every --intervals value must be a multiple of the smallest")
+    first_impact, jp.first_impact = jp.first_impact, lambda player, obstacles: None
+    try:
+        game = jp.Game(seed=args.seed)
+        recorder = game.recorder = SessionRecorder(keyframe_interval=intervals[0])
+        policy = jetpack_batch.HeuristicPolicy(args.seed)
+        steps = int(args.minutes * 60 * jp.FPS)
+        game.start_game()
+        for _ in range(steps):
+            game.player.jetpack_on = policy.decide(game)
+            game.update()
+        snapshot = game.snapshot()
+        game.game_over()
+        recorded = recorder.sessions[-1]
+        print(f"{args.minutes:g} minute run, {steps} steps, {len(recorded.layouts)} coin layouts")
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            encode_keyframe(snapshot, {})
+        report("keyframe encode", time.perf_counter() - start, args.iterations)
+
+        rng = random.Random(args.seed)
+        frames = [rng.randrange(steps + 1) for _ in range(args.seeks)]
+        expected = {}
+        game = jp.Game()
+        wrong = 0
+        with tempfile.TemporaryDirectory() as directory:
+            for interval in intervals:
+                path = os.path.join(directory, f"session_{interval}.jps")
+                save_session(path, RecordedSession(recorded.inputs, recorded.keyframes[::interval // intervals[0]],
+                                                   recorded.layouts, recorded.metadata, interval))
+                with SessionReader(path) as reader:
+                    if not expected:
+                        # Where each step lands when the run is played through from the start
+                        reader.seek(game, 0)
+                        for step in range(steps + 1):
+                            if step in frames:
+                                expected[step] = gameplay_state(game.snapshot())
+                            if step < steps:
+                                reader.play_step(game, step)
+                    timings = []
+                    for frame in frames:
+                        start = time.perf_counter()
+                        reader.seek(game, frame)
+                        timings.append(time.perf_counter() - start)
+                        wrong += gameplay_state(game.snapshot()) != expected[frame]
+                    timings.sort()
+                    size = os.path.getsize(path)
+                    print(f"keyframes every {interval:>4} steps: {size / 1024:8.1f} KiB, "
+                          f"{size / args.minutes / 1024:6.1f} KiB per minute; seek "
+                          f"p50 {timings[len(timings) // 2] * 1000:6.2f} ms, "
+                          f"p99 {timings[int(len(timings) * 0.99)] * 1000:6.2f} ms, max {timings[-1] * 1000:6.2f} ms")
+    finally:
+        jp.first_impact = first_impact
+    print(f"seeks landing on the wrong state: {wrong} of {len(frames) * len(intervals)}")
+    if wrong:
+        sys.exit(1)
+
+# The gameplay event bus: what emitting and dispatching cost, that emitting
+# allocates nothing, and that a seeded game plays out the same with the sound
+# and effects consumers taken out (and how much faster it steps without them).
+def bench_events(args):
+    jp.sounds_enabled = False
+    bus = jp.EventBus()
+    per_step = args.events_per_step
+    for _ in range(1000):  # Warm up
+        bus.emit(jp.EVENT_COIN, 1.0, 2.0, 1.0)
+        bus.dispatch(None)
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for _ in range(per_step):
+            bus.emit(jp.EVENT_COIN, 1.0, 2.0, 1.0)
+        bus.dispatch(None)
+    report(f"{per_step} events a step", time.perf_counter() - start, args.iterations)
+    allocated = sys.getallocatedblocks() - blocks
+    print(f"memory blocks still allocated after {args.iterations * per_step} events: {allocated}")
+
+    states = []
+    for name, consumers in (("with consumers", None), ("without consumers", [])):
+        game = jp.Game(seed=args.seed)
+        if consumers is not None:
+            game.events.consumers = consumers
+        game.start_game()
+        start = time.perf_counter()
+        play_steps(game, args.steps, args.seed)
+        report(f"step {name}", time.perf_counter() - start, args.steps)
+        states.append(gameplay_state(game.snapshot()))
+        summary = game.events.summary()
+    print("events:", ", ".join(f"{name} {count}" for name, count in summary.items()))
+    same = states[0] == states[1]
+    print("same play without consumers:", "ok" if same else "MISMATCH")
+    if allocated > 0 or not same:
+        sys.exit(1)
+
+# The kiosk host: N sessions played with random thrust and drawn every
+# step. Reports the time a frame of all of them takes, the assets they share,
+# and what each holds on its own against the kiosk's budget (the exit status
+# is 1 if a session goes over it); N separate processes would each build
+# their own copy of the shared assets.
+def bench_kiosk(args):
+    import jetpack_kiosk
+
+    jp.sounds_enabled = False
+    host = jetpack_kiosk.KioskHost(args.sessions, args.columns, [jp.pygame.K_1 + n for n in range(args.sessions)],
+                                   args.seed)
+    rng = random.Random(args.seed)
+    for session in host.sessions:
+        thrust = [False]
+        def held(thrust=thrust):
+            if rng.random() < 0.1:
+                thrust[0] = not thrust[0]
+            return thrust[0]
+        session.game.thrust_held = held
+    start = time.perf_counter()
+    for step in range(args.steps):
+        for session in host.sessions:
+            if session.game.game_state != "playing":
+                session.game.start_game()
+        host.step()
+        host.draw()
+        if step % args.sample_every == 0:
+            host.sample_memory()
+    report(f"{args.sessions} sessions frame", time.perf_counter() - start, args.steps)
+    start = time.perf_counter()
+    host.sample_memory()
+    print(f"memory sample: {(time.perf_counter() - start) * 1000:.2f} ms")
+    print(host.memory_summary())
+    print(f"as {args.sessions} processes: the shared assets {args.sessions} times, "
+          f"{args.sessions * host.shared_memory / 1024 ** 2:.1f} MiB")
+    if host.over_budget():
+        sys.exit(1)
+
+# Trigger-to-output delay and underruns of the mixer at each buffer size,
+# from jetpack_audio.py's self-test under SDL's disk audio driver. Each size
+# is measured in a process of its own, as the driver is picked when the game
+# module is imported.
+def bench_audio(args):
+    import subprocess
+    import tempfile
+
+    print(f"{args.frequency} Hz, {args.channels} channel(s), {args.triggers} triggers each"
+          f"{', game running' if args.load else ''}")
+    print(f"{'buffer':>8} {'ms':>7} {'mean':>7} {'p50':>7} {'p95':>7} {'max':>7}  underruns")
+    failed = False
+    for buffer in args.buffers:
+        with tempfile.TemporaryDirectory() as directory:
+            result_path = os.path.join(directory, "result.json")
+            command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "jetpack_audio.py"),
+                       "--frequency", str(args.frequency), "--buffer", str(buffer), "--channels", str(args.channels),
+                       "--triggers", str(args.triggers), "--seed", str(args.seed), "--json", result_path]
+            if args.load:
+                command.append("--load")
+            completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            failed = failed or completed.returncode != 0
+            with open(result_path) as result_file:
+                result = json.load(result_file)
+        delay = result["delay_ms"]
+        print(f"{buffer:>8} {result['buffer_ms']:>7.2f} {delay['mean']:>7.2f} {delay['p50']:>7.2f} "
+              f"{delay['p95']:>7.2f} {delay['max']:>7.2f}  {result['underruns']}"
+              f"{'' if result['native_format'] else '  (sounds not in the mixer format)'}")
+    if failed:
+        sys.exit(1)
+
+# Drawing at a cabinet's resolution: scaling each finished frame up from the
+# logical size, against ScaledRenderer blitting sprites pre-scaled once. Also
+# how long a SpriteCache takes to build, what it holds, and how many frames
+# are drawn with the old one while a resize's cache is built in the background.
+def bench_resolution(args):
+    from jetpack_resolution import ScaledRenderer, fit, scaled_size
+
+    jp.sounds_enabled = False
+    logical_size = (jp.SCREEN_WIDTH, jp.SCREEN_HEIGHT)
+    game = jp.Game(seed=args.seed)
+    jp.prebuild_sprites()
+
+    def frame_ms(present):
+        play_steps(game, 300, args.seed)  # Mid-game
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            if game.game_state != "playing":
+                game.start_game()
+            if rng.random() < 0.1:
+                game.player.jetpack_on = not game.player.jetpack_on
+            game.update()
+            game.draw(0.5)
+            present()
+        return (time.perf_counter() - start) / args.frames * 1000
+
+    for size in args.resolutions:
+        display = jp.pygame.display.set_mode(size)
+        print(f"{size[0]}x{size[1]}:")
+        # Everything drawn at the logical size, then the frame scaled into the window
+        frame = jp.pygame.Surface(logical_size).convert()
+        jp.renderer = jp.SurfaceRenderer(frame)
+        scale, offset = fit(logical_size, size)
+        viewport = display.subsurface(jp.pygame.Rect(offset, scaled_size(logical_size, scale)))
+        print(f"  frame scaled up           {frame_ms(lambda: jp.pygame.transform.scale(frame, viewport.get_size(), viewport)):7.2f} ms/frame")
+
+        start = time.perf_counter()
+        jp.renderer = renderer = ScaledRenderer(display, logical_size, font_specs=jp.font_specs)
+        renderer.preload(jp.sprite_surfaces(game))
+        built = time.perf_counter() - start
+        print(f"  pre-scaled sprites        {frame_ms(lambda: None):7.2f} ms/frame  "
+              f"(cache built in {built * 1000:.0f} ms, {renderer.scaled_bytes() / 1024 ** 2:.1f} MiB)")
+
+    # A resize from the last resolution to the first
+    frames = 0
+    start = time.perf_counter()
+    jp.pygame.event.post(jp.pygame.event.Event(jp.pygame.VIDEORESIZE, size=args.resolutions[0]))
+    while frames == 0 or renderer.build is not None:
+        game.handle_events()
+        if game.game_state != "playing":
+            game.start_game()
+        game.update()
+        game.draw(0.5)
+        renderer.present()
+        frames += 1
+    print(f"resize to {args.resolutions[0][0]}x{args.resolutions[0][1]}: new sprites ready after "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms, {frames} frames drawn with the old ones meanwhile")
+
+def main(argv=None):
+    from jetpack_resolution import parse_resolution
+
+    parser = argparse.ArgumentParser(description="Jetpack Adventure benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="cost of snapshot/restore/restart")
+    snapshot_parser.add_argument("--iterations", type=int, default=10000)
+    snapshot_parser.add_argument("--warmup", type=int, default=600, help="steps to play before measuring")
+    snapshot_parser.add_argument("--seed", type=int, default=1)
+    snapshot_parser.set_defaults(func=bench_snapshot)
+
+    coins_parser = subparsers.add_parser("coins", help="per-frame cost of a dense coin formation")
+    coins_parser.add_argument("--text", default="BONUS", help="text the formation spells out")
+    coins_parser.add_argument("--font-size", type=int, default=16, help="size of the text (one coin per pixel)")
+    coins_parser.add_argument("--iterations", type=int, default=5, help="passes across the screen")
+    coins_parser.set_defaults(func=bench_coins)
+
+    level_parser = subparsers.add_parser("level", help="per-step cost of the lookahead level planner")
+    level_parser.add_argument("--steps", type=int, default=36000)
+    level_parser.add_argument("--seed", type=int, default=1)
+    level_parser.set_defaults(func=bench_level)
+
+    parity_parser = subparsers.add_parser("parity", help="compare the texture and scaled renderers' output with the Surface renderer's")
+    parity_parser.add_argument("--seed", type=int, default=1)
+    parity_parser.add_argument("--tolerance", type=int, default=2, help="channel difference allowed per pixel")
+    parity_parser.add_argument("--max-mismatch", type=float, default=0.0, help="fraction of pixels allowed over tolerance")
+    parity_parser.add_argument("--frames", type=int, default=30, help="frames drawn per scene for timing")
+    parity_parser.set_defaults(func=bench_parity)
+
+    latency_parser = subparsers.add_parser("latency", help="input-to-flip latency with and without late latching")
+    latency_parser.add_argument("--frames", type=int, default=600, help="frames run per loop")
+    latency_parser.add_argument("--vsync-hz", type=int, default=60, help="emulated display refresh rate (0 = no vsync)")
+    latency_parser.add_argument("--render-fps", type=int, default=60, help="frame cap used when --vsync-hz is 0")
+    latency_parser.add_argument("--seed", type=int, default=1)
+    latency_parser.set_defaults(func=bench_latency)
+
+    split_parser = subparsers.add_parser("split", help="frame times with the simulation in its own process")
+    split_parser.add_argument("--frames", type=int, default=1200, help="frames run per loop")
+    split_parser.add_argument("--render-fps", type=int, default=60, help="frame cap for both loops (0 = uncapped)")
+    split_parser.add_argument("--seed", type=int, default=1)
+    split_parser.set_defaults(func=bench_split)
+
+    scores_parser = subparsers.add_parser("scores", help="cost of recording runs, and crash recovery of the score log")
+    scores_parser.add_argument("--runs", type=int, default=2000)
+    scores_parser.add_argument("--seed", type=int, default=1)
+    scores_parser.set_defaults(func=bench_scores)
+
+    pacing_parser = subparsers.add_parser("pacing", help="asyncio frame pacing with other coroutines busy")
+    pacing_parser.add_argument("--frames", type=int, default=600, help="frames run per loop")
+    pacing_parser.add_argument("--render-fps", type=int, default=60)
+    pacing_parser.add_argument("--workers", type=int, default=2, help="busy coroutines in the loaded run")
+    pacing_parser.add_argument("--chunk-ms", type=float, default=1.0, help="CPU work each does between awaits")
+    pacing_parser.add_argument("--max-late-ms", type=float, default=1.0,
+                               help="p99 lateness of frame waits allowed beyond one round of background chunks")
+    pacing_parser.add_argument("--seed", type=int, default=1)
+    pacing_parser.set_defaults(func=bench_pacing)
+
+    ghosts_parser = subparsers.add_parser("ghosts", help="memory and per-frame cost of racing ghosts")
+    ghosts_parser.add_argument("--ghosts", type=int, default=100, help="runs recorded and raced")
+    ghosts_parser.add_argument("--minutes", type=float, default=1.0, help="longest run recorded (game time)")
+    ghosts_parser.add_argument("--frames", type=int, default=600, help="frames timed per field size")
+    ghosts_parser.add_argument("--seed", type=int, default=1)
+    ghosts_parser.set_defaults(func=bench_ghosts)
+
+    autopilot_parser = subparsers.add_parser("autopilot", help="decision latency and survival of the autopilot")
+    autopilot_parser.add_argument("--games", type=int, default=10)
+    autopilot_parser.add_argument("--max-seconds", type=float, default=60, help="game time limit per game")
+    autopilot_parser.add_argument("--budget-ms", type=float, default=2.0, help="time budget per decision")
+    autopilot_parser.add_argument("--seed", type=int, default=1)
+    autopilot_parser.set_defaults(func=bench_autopilot)
+
+    collision_parser = subparsers.add_parser("collision", help="swept collision at high speed: missed hits and cost")
+    collision_parser.add_argument("--speed", type=int, default=4, help="multiple of the normal speeds")
+    collision_parser.add_argument("--substeps", type=int, default=64, help="pieces each step's paths are checked in")
+    collision_parser.add_argument("--iterations", type=int, default=2000, help="collision checks timed per obstacle count")
+    collision_parser.add_argument("--seed", type=int, default=1)
+    collision_parser.set_defaults(func=bench_collision)
+
+    render_parser = subparsers.add_parser("render", help="offline rendering throughput, and chunks matching an unbroken render")
+    render_parser.add_argument("--seconds", type=float, default=10, help="length of the session rendered (game time)")
+    render_parser.add_argument("--tail-seconds", type=float, default=1.0)
+    render_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="most workers tried")
+    render_parser.add_argument("--chunk-frames", type=int, default=60)
+    render_parser.add_argument("--seed", type=int, default=1)
+    render_parser.set_defaults(func=bench_render)
+
+    session_parser = subparsers.add_parser("session", help="size and seek latency of seekable session files")
+    session_parser.add_argument("--minutes", type=float, default=30, help="length of the run recorded (game time)")
+    session_parser.add_argument("--intervals", type=lambda text: [int(value) for value in text.split(",")],
+                                default=[60, 300, 600], help="steps between keyframes, e.g. 60,300,600")
+    session_parser.add_argument("--seeks", type=int, default=200, help="random steps sought per interval")
+    session_parser.add_argument("--iterations", type=int, default=2000, help="keyframes encoded for timing")
+    session_parser.add_argument("--seed", type=int, default=1)
+    session_parser.set_defaults(func=bench_session)
+
+    events_parser = subparsers.add_parser("events", help="cost of the gameplay event bus, and play without its consumers")
+    events_parser.add_argument("--iterations", type=int, default=100000, help="steps' worth of events timed")
+    events_parser.add_argument("--events-per-step", type=int, default=4)
+    events_parser.add_argument("--steps", type=int, default=20000, help="game steps played each way")
+    events_parser.add_argument("--seed", type=int, default=1)
+    events_parser.set_defaults(func=bench_events)
+
+    kiosk_parser = subparsers.add_parser("kiosk", help="frame time and per-session memory of the multi-session kiosk")
+    kiosk_parser.add_argument("--sessions", type=int, default=4)
+    kiosk_parser.add_argument("--columns", type=int, default=2)
+    kiosk_parser.add_argument("--steps", type=int, default=3000)
+    kiosk_parser.add_argument("--sample-every", type=int, default=60, help="steps between memory samples")
+    kiosk_parser.add_argument("--seed", type=int, default=1)
+    kiosk_parser.set_defaults(func=bench_kiosk)
+
+    audio_parser = subparsers.add_parser("audio", help="trigger-to-output delay and underruns at several mixer buffer sizes")
+    audio_parser.add_argument("--buffers", type=lambda text: [int(size) for size in text.split(",")],
+                              default=[256, 512, 1024, 2048], help="buffer sizes in sample frames, comma separated")
+    audio_parser.add_argument("--frequency", type=int, default=44100)
+    audio_parser.add_argument("--channels", type=int, default=1, choices=[1, 2])
+    audio_parser.add_argument("--triggers", type=int, default=30)
+    audio_parser.add_argument("--load", action="store_true", help="run the game between triggers")
+    audio_parser.add_argument("--seed", type=int, default=1)
+    audio_parser.set_defaults(func=bench_audio)
+
+    resolution_parser = subparsers.add_parser("resolution", help="frame time at cabinet resolutions: scaled frames vs. pre-scaled sprites")
+    resolution_parser.add_argument("--resolutions", type=lambda text: [parse_resolution(size) for size in text.split(",")],
+                                   default=[(1920, 1080), (3840, 2160)], help="comma separated, e.g. 1920x1080,3840x2160")
+    resolution_parser.add_argument("--frames", type=int, default=300)
+    resolution_parser.add_argument("--seed", type=int, default=1)
+    resolution_parser.set_defaults(func=bench_resolution)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# Gameplay capture for Jetpack Adventure
+#
+# FrameCapture copies the display surface into a pool of preallocated
+# buffers right after pygame.display.flip(), and a writer thread does all
+# the encoding and disk I/O. The main loop never waits: when the writer
+# falls behind and no buffer is free, the frame is dropped and counted.
+#
+# Output formats:
+#   raw - every frame appended to frames.raw in the display's pixel format,
+#         plus index.json with the layout and per-frame offsets/timestamps
+#   png - one frame_NNNNNN.png per frame, plus index.json
+#
+# Raw captures can be turned into PNGs afterwards with:
+#   python jetpack_capture.py export CAPTURE_DIR
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import struct
+import zlib
+import threading
+
+import numpy as np
+import pygame
+
+RAW_FILE = "frames.raw"
+INDEX_FILE = "index.json"
+DEFAULT_POOL_SIZE = 8
+PNG_COMPRESSION = 1  # zlib level - fast, since capture has to keep up with the game
+
+# Work out the pygame.image.frombuffer() format string matching a surface's
+# pixel layout, so buffers can be copied straight out of the surface.
+# Returns None if the layout isn't one we can read directly.
+def buffer_format(surface):
+    if surface.get_bytesize() != 4 or sys.byteorder != "little":
+        return None
+    red, green, blue, alpha = surface.get_masks()
+    if (red, green, blue) == (0xFF0000, 0xFF00, 0xFF):
+        return "BGRA"
+    if (red, green, blue) == (0xFF, 0xFF00, 0xFF0000):
+        return "RGBX" if alpha == 0 else "RGBA"
+    return None
+
+class FrameCapture:
+    def __init__(self, surface, output_dir, image_format="raw", pool_size=DEFAULT_POOL_SIZE):
+        if image_format not in ("raw", "png"):
+            raise ValueError(f"unknown capture format: {image_format}")
+
+        self.output_dir = output_dir
+        self.image_format = image_format
+        self.size = surface.get_size()
+
+        # Copy pixels exactly as they sit in the surface when we can; otherwise
+        # fall back to converting to packed RGB
+        self.pixel_format = buffer_format(surface)
+        if self.pixel_format is not None:
+            self.pitch = surface.get_pitch()
+        else:
+            self.pixel_format = "RGB"
+            self.pitch = self.size[0] * 3
+        self.frame_bytes = self.pitch * self.size[1]
+
+        # Buffers circulate between the free pool and the writer queue, so
+        # nothing is allocated per frame
+        self.free_buffers = queue.Queue()
+        for _ in range(pool_size):
+            self.free_buffers.put(bytearray(self.frame_bytes))
+        self.pending = queue.Queue(maxsize=pool_size)
+
+        # Stats
+        self.frames_seen = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.index = []  # (frame number, timestamp, byte offset) for raw captures
+        self.start_time = time.perf_counter()
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.raw_file = None
+        if image_format == "raw":
+            self.raw_file = open(os.path.join(output_dir, RAW_FILE), "wb")
+
+        self.writer = threading.Thread(target=self.writer_loop, name="capture-writer", daemon=True)
+        self.writer.start()
+
+    def grab(self, surface):
+        """Queue a copy of surface for writing. Never blocks; returns False if the frame was dropped."""
+        frame_number = self.frames_seen
+        self.frames_seen += 1
+
+        try:
+            buffer = self.free_buffers.get_nowait()
+        except queue.Empty:
+            # Writer is behind and every buffer is in flight
+            self.frames_dropped += 1
+            return False
+
+        if self.pixel_format == "RGB":
+            buffer[:] = pygame.image.tobytes(surface, "RGB")
+        else:
+            # Single memcpy from the surface's pixels into our buffer
+            memoryview(buffer)[:] = surface.get_view("0")
+
+        timestamp = time.perf_counter() - self.start_time
+        try:
+            self.pending.put_nowait((frame_number, timestamp, buffer))
+        except queue.Full:
+            self.free_buffers.put(buffer)
+            self.frames_dropped += 1
+            return False
+        return True
+
+    def writer_loop(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            frame_number, timestamp, buffer = item
+            try:
+                self.write_frame(frame_number, timestamp, buffer)
+            finally:
+                self.free_buffers.put(buffer)
+
+    def write_frame(self, frame_number, timestamp, buffer):
+        if self.image_format == "raw":
+            self.index.append((frame_number, round(timestamp, 6), self.raw_file.tell()))
+            self.raw_file.write(buffer)
+        else:
+            save_png(buffer, self.size, self.pixel_format, self.pitch,
+                     os.path.join(self.output_dir, f"frame_{frame_number:06d}.png"))
+        self.frames_written += 1
+
+    def close(self):
+        """Flush queued frames, stop the writer thread and write the index"""
+        self.pending.put(None)
+        self.writer.join()
+        if self.raw_file is not None:
+            self.raw_file.close()
+
+        index = {
+            "format": self.image_format,
+            "width": self.size[0],
+            "height": self.size[1],
+            "pitch": self.pitch,
+            "pixel_format": self.pixel_format,
+            "frame_bytes": self.frame_bytes,
+            "frames_seen": self.frames_seen,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "frames": self.index,
+        }
+        with open(os.path.join(self.output_dir, INDEX_FILE), "w") as index_file:
+            json.dump(index, index_file)
+
+    def summary(self):
+        return (f"capture: {self.frames_written} written, {self.frames_dropped} dropped "
+                f"of {self.frames_seen} frames")
+
+# Channel positions of red, green and blue within a 4-byte pixel
+CHANNEL_ORDER = {"BGRA": (2, 1, 0), "RGBA": (0, 1, 2), "RGBX": (0, 1, 2)}
+
+def png_chunk(chunk_type, data):
+    chunk = chunk_type + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xFFFFFFFF)
+
+# Encode a frame buffer as an RGB PNG. pygame.image.save() holds the GIL
+# while it compresses, which would stall the game loop, so this builds the
+# scanlines with NumPy and lets zlib (which releases the GIL) do the work.
+def save_png(buffer, size, pixel_format, pitch, path):
+    width, height = size
+    rows = np.frombuffer(buffer, dtype=np.uint8).reshape(height, pitch)
+    if pixel_format == "RGB":
+        rgb = rows[:, :width * 3].reshape(height, width, 3)
+    else:
+        pixels = rows[:, :width * 4].reshape(height, width, 4)
+        rgb = pixels[:, :, CHANNEL_ORDER[pixel_format]]
+
+    # Each scanline starts with filter type 0 (none)
+    scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rgb.reshape(height, width * 3)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8-bit RGB
+    with open(path, "wb") as png_file:
+        png_file.write(b"\x89PNG\r\n\x1a\n")
+        png_file.write(png_chunk(b"IHDR", header))
+        png_file.write(png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), PNG_COMPRESSION)))
+        png_file.write(png_chunk(b"IEND", b""))
+
+# Convert a raw capture into a PNG sequence
+def export_png(capture_dir):
+    with open(os.path.join(capture_dir, INDEX_FILE)) as index_file:
+        index = json.load(index_file)
+    size = (index["width"], index["height"])
+    with open(os.path.join(capture_dir, RAW_FILE), "rb") as raw_file:
+        for frame_number, _, offset in index["frames"]:
+            raw_file.seek(offset)
+            buffer = raw_file.read(index["frame_bytes"])
+            save_png(buffer, size, index["pixel_format"], index["pitch"],
+                     os.path.join(capture_dir, f"frame_{frame_number:06d}.png"))
+    print(f"exported {len(index['frames'])} frames to {capture_dir}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure capture tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="convert a raw capture to PNG files")
+    export_parser.add_argument("capture_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_png(args.capture_dir)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,108 @@
+# Garbage collector management for Jetpack Adventure
+#
+# Every frame churns through short-lived objects (particles, text surfaces,
+# list copies), so CPython's cyclic GC runs often, and the occasional full
+# (generation 2) collection shows up as a stutter. GCManager:
+#
+#   - freezes everything alive once the sprites are built (gc.freeze()), so
+#     those objects are never scanned again
+#   - raises the thresholds while a run is in progress, which makes young
+#     collections rarer and puts full collections off entirely
+#   - does a full collection when the game drops to the menu or game over
+#     screen, where a pause can't be seen
+#   - keeps a histogram of every collection's pause via gc.callbacks
+#
+# It's a per-frame hook: call it with the game once per presented frame.
+import gc
+import time
+
+# Thresholds used while playing: young collections every 5000 net allocations,
+# and a gen-2 threshold nothing reaches before the run ends
+PLAYING_THRESHOLDS = (5000, 50, 1000000)
+
+# Pause histogram bucket upper bounds in milliseconds
+PAUSE_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, float("inf"))
+
+class PauseHistogram:
+    def __init__(self):
+        self.counts = [0] * len(PAUSE_BUCKETS_MS)
+        self.total = 0.0
+        self.longest = 0.0
+        self.collections = 0
+
+    def add(self, milliseconds):
+        for i, bound in enumerate(PAUSE_BUCKETS_MS):
+            if milliseconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += milliseconds
+        self.longest = max(self.longest, milliseconds)
+        self.collections += 1
+
+    def as_dict(self):
+        return {
+            "collections": self.collections,
+            "total_ms": round(self.total, 3),
+            "max_ms": round(self.longest, 3),
+            "buckets": {f"<={bound}ms": count for bound, count in zip(PAUSE_BUCKETS_MS, self.counts)},
+        }
+
+class GCManager:
+    def __init__(self, playing_thresholds=PLAYING_THRESHOLDS):
+        self.default_thresholds = gc.get_threshold()
+        self.playing_thresholds = playing_thresholds
+        self.state = None
+        self.explicit_collections = 0
+
+        # One histogram per generation, filled in by the collector itself
+        self.pauses = [PauseHistogram() for _ in range(3)]
+        self.pause_start = None
+        gc.callbacks.append(self.on_collection)
+
+    def on_collection(self, phase, info):
+        if phase == "start":
+            self.pause_start = time.perf_counter()
+        elif self.pause_start is not None:
+            self.pauses[info["generation"]].add((time.perf_counter() - self.pause_start) * 1000)
+            self.pause_start = None
+
+    def freeze_assets(self):
+        """Move everything alive now (sprites, sounds, fonts) out of the collector's sight"""
+        gc.collect()
+        gc.freeze()
+
+    def __call__(self, game):
+        if game.game_state == self.state:
+            return
+        self.state = game.game_state
+
+        if self.state == "playing":
+            gc.set_threshold(*self.playing_thresholds)
+        else:
+            # Menu or game over: nothing's moving, so this is the time to clean up
+            gc.set_threshold(*self.default_thresholds)
+            gc.collect()
+            self.explicit_collections += 1
+
+    def close(self):
+        gc.set_threshold(*self.default_thresholds)
+        if self.on_collection in gc.callbacks:
+            gc.callbacks.remove(self.on_collection)
+
+    def pause_summary(self):
+        return {
+            "frozen_objects": gc.get_freeze_count(),
+            "explicit_collections": self.explicit_collections,
+            "generations": [histogram.as_dict() for histogram in self.pauses],
+        }
+
+    def summary(self):
+        lines = ["gc pauses:"]
+        for generation, histogram in enumerate(self.pauses):
+            if histogram.collections:
+                lines.append(f"  gen {generation}: {histogram.collections} collections, "
+                             f"{histogram.total / histogram.collections:.3f} ms avg, "
+                             f"{histogram.longest:.3f} ms max")
+        lines.append(f"  {self.explicit_collections} explicit collections, "
+                     f"{gc.get_freeze_count()} frozen objects")
+        return "\n".join(lines)
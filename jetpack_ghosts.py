@@ -0,0 +1,209 @@
+# Ghost racing for Jetpack Adventure
+#
+# Earlier runs fly alongside the player as translucent "ghost" jetpackers.
+# A ghost is just its trajectory: one int16 height and one flags byte
+# (jetpack on, alive) per simulation step, 3 bytes a step or about 10.5 KiB
+# a minute. There are no Player objects behind them:
+#
+#   - when a run starts, the ghosts' trajectories are stacked into two 2-D
+#     arrays (ghost x step), so moving every ghost on a step is indexing one
+#     column of each
+#   - every ghost is on the same step, so they all share the player's
+#     animation frame; they're drawn from one pre-tinted copy of the
+#     player's frames, with one batched blit per sprite in use (two at most:
+#     jetpack on and off). The player's pixels are either clear or opaque,
+#     so the copies are colorkeyed with a surface alpha and RLE acceleration
+#     rather than blended pixel by pixel, which takes about half as long
+#
+# GhostRace is attached to the game as Game.ghosts. It records the player on
+# every step of a run; the ghosts raced are the best runs kept in the ghosts
+# directory plus the most recent runs of this session. Saving happens on a
+# background thread, like the scores.
+#
+# python jetpack_bench.py ghosts reports the memory and per-frame cost.
+import os
+import time
+import queue
+import threading
+from array import array
+from collections import deque
+
+import numpy as np
+import pygame
+
+MAX_GHOSTS = 100
+TOP_GHOSTS_KEPT = 50  # Best runs kept on disk
+RECENT_GHOSTS = 50  # Runs of this session raced, besides the best ones
+GHOST_TINT = (170, 210, 255)  # Multiplies the player's colours
+GHOST_ALPHA = 90
+GHOST_COLORKEY = (255, 0, 255)  # Not a colour the player is drawn in
+STEPS_PER_MINUTE = 60 * 60  # At the game's 60 simulation steps a second
+
+JETPACK = 1
+ALIVE = 2
+
+class Trajectory:
+    def __init__(self, heights, flags, score):
+        self.heights = heights  # int16 per step
+        self.flags = flags  # uint8 per step
+        self.score = score
+
+    @property
+    def nbytes(self):
+        return self.heights.nbytes + self.flags.nbytes
+
+def load_trajectory(path):
+    with np.load(path) as data:
+        return Trajectory(data["heights"], data["flags"], int(data["score"]))
+
+def save_trajectory(path, trajectory):
+    # Written to a temporary file first so a crash never leaves a partial ghost behind
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as ghost_file:
+        np.savez(ghost_file, heights=trajectory.heights, flags=trajectory.flags, score=trajectory.score)
+    os.replace(temp_path, path)
+
+class GhostRace:
+    # Tinted copies of the player's (normal, jetpack) frames, made once
+    frame_cache = None
+
+    def __init__(self, directory=None, max_ghosts=MAX_GHOSTS):
+        self.directory = directory
+        self.max_ghosts = max_ghosts
+        self.best = []  # Best runs so far, highest score first
+        self.recent = deque(maxlen=RECENT_GHOSTS)
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            for name in sorted(self.ghost_files(), reverse=True)[:TOP_GHOSTS_KEPT]:
+                try:
+                    self.best.append(load_trajectory(os.path.join(directory, name)))
+                except (OSError, ValueError, KeyError):
+                    pass  # A damaged ghost just isn't raced
+
+        # The run being recorded
+        self.heights = array("h")
+        self.flags = bytearray()
+
+        # The ghosts being raced, stacked (see start())
+        self.stacked_heights = np.zeros((0, 1), np.int16)
+        self.stacked_flags = np.zeros((0, 1), np.uint8)
+        self.step = 0
+
+        self.queue = None
+        if directory is not None:
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self.write_loop, name="ghost-writer", daemon=True)
+            self.thread.start()
+
+    def ghost_files(self):
+        # Named by zero-padded score, so sorting the names sorts the runs
+        return [name for name in os.listdir(self.directory) if name.startswith("ghost_") and name.endswith(".npz")]
+
+    def field(self):
+        """The trajectories raced: the best ones, then this session's most recent ones"""
+        ghosts = self.best[:self.max_ghosts]
+        for trajectory in reversed(self.recent):
+            if len(ghosts) >= self.max_ghosts:
+                break
+            if trajectory not in ghosts:
+                ghosts.append(trajectory)
+        return ghosts
+
+    # Game side: start() and finish() bracket a run, record() is called every step of it
+
+    def start(self):
+        ghosts = self.field()
+        length = max((len(ghost.heights) for ghost in ghosts), default=0) + 1
+        # Padded with flags of 0 (not alive), so a ghost whose run is over isn't drawn
+        self.stacked_heights = np.zeros((len(ghosts), length), np.int16)
+        self.stacked_flags = np.zeros((len(ghosts), length), np.uint8)
+        for row, ghost in enumerate(ghosts):
+            self.stacked_heights[row, :len(ghost.heights)] = ghost.heights
+            self.stacked_flags[row, :len(ghost.flags)] = ghost.flags
+        self.heights = array("h")
+        self.flags = bytearray()
+        self.step = 0
+
+    def record(self, player):
+        self.heights.append(int(player.y))
+        self.flags.append((JETPACK if player.jetpack_on else 0) | (ALIVE if player.alive else 0))
+        self.step += 1
+
+    def finish(self, score):
+        if not self.heights:
+            return
+        trajectory = Trajectory(np.frombuffer(self.heights, np.int16).copy(),
+                                np.frombuffer(self.flags, np.uint8).copy(), int(score))
+        self.recent.append(trajectory)
+        if len(self.best) < TOP_GHOSTS_KEPT or trajectory.score > self.best[-1].score:
+            self.best.append(trajectory)
+            self.best.sort(key=lambda ghost: -ghost.score)
+            del self.best[TOP_GHOSTS_KEPT:]
+            if self.queue is not None:
+                self.queue.put(trajectory)
+        self.heights = array("h")
+        self.flags = bytearray()
+
+    def frames(self, player):
+        if GhostRace.frame_cache is None:
+            tinted = []
+            for frames in (player.normal_frames, player.jetpack_frames):
+                copies = []
+                for frame in frames:
+                    tinted_frame = frame.copy()
+                    tinted_frame.fill(GHOST_TINT, special_flags=pygame.BLEND_RGB_MULT)
+                    copy = pygame.Surface(frame.get_size())
+                    if pygame.display.get_surface() is not None:
+                        copy = copy.convert()  # Same pixel format as the display, so blits don't convert
+                    copy.fill(GHOST_COLORKEY)
+                    copy.blit(tinted_frame, (0, 0))
+                    copy.set_colorkey(GHOST_COLORKEY, pygame.RLEACCEL)
+                    copy.set_alpha(GHOST_ALPHA, pygame.RLEACCEL)
+                    copies.append(copy)
+                tinted.append(copies)
+            GhostRace.frame_cache = tuple(tinted)
+        return GhostRace.frame_cache
+
+    def draw(self, renderer, player, interpolation=1.0):
+        count = len(self.stacked_heights)
+        if count == 0:
+            return
+        # The player is drawn between its last two steps, which were recorded
+        # at step - 2 and step - 1; the ghosts are drawn between theirs
+        column = min(max(self.step - 1, 0), self.stacked_heights.shape[1] - 1)
+        previous = max(column - 1, 0)
+        heights = self.stacked_heights[:, previous] + (
+            self.stacked_heights[:, column] - self.stacked_heights[:, previous]) * interpolation
+        flags = self.stacked_flags[:, column]
+        visible = (flags & ALIVE) != 0
+        normal_frames, jetpack_frames = self.frames(player)
+        frame = int(player.frame)
+        for frames, on in ((normal_frames, False), (jetpack_frames, True)):
+            rows = visible & (((flags & JETPACK) != 0) == on)
+            if rows.any():
+                renderer.blits(frames[frame], [(player.x, y) for y in heights[rows].tolist()])
+
+    def memory(self):
+        """Bytes of trajectory held, and how many minutes of play that is"""
+        trajectories = self.best + [ghost for ghost in self.recent if ghost not in self.best]
+        steps = sum(len(ghost.heights) for ghost in trajectories)
+        return {"ghosts": len(trajectories), "bytes": sum(ghost.nbytes for ghost in trajectories),
+                "minutes": steps / STEPS_PER_MINUTE, "stacked_bytes": self.stacked_heights.nbytes + self.stacked_flags.nbytes}
+
+    def close(self):
+        """Write out the ghosts still queued and stop the writer"""
+        if self.queue is not None:
+            self.queue.put(None)
+            self.thread.join()
+
+    # Writer thread
+
+    def write_loop(self):
+        while True:
+            trajectory = self.queue.get()
+            if trajectory is None:
+                return
+            name = f"ghost_{trajectory.score:08d}_{time.time_ns()}.npz"
+            save_trajectory(os.path.join(self.directory, name), trajectory)
+            for old_name in sorted(self.ghost_files(), reverse=True)[TOP_GHOSTS_KEPT:]:
+                os.remove(os.path.join(self.directory, old_name))
@@ -0,0 +1,176 @@
+# Hitch watchdog for Jetpack Adventure
+#
+# HitchWatchdog is a per-frame hook that times each frame. When one takes
+# longer than the threshold it records what the game was doing - game state,
+# entity counts, GC statistics and where the time went - and keeps the last
+# few reports in a JSON file. Attribution comes from two opt-in helpers:
+#
+#   profile_frames - after a hitch, run cProfile for the next N frames and
+#                    attach the top functions to the report
+#   sample_ms      - a background thread samples the main thread's stack
+#                    every few milliseconds; samples that fall inside a hitch
+#                    are summarised in its report
+#
+# With both off the per-frame cost is one perf_counter() call and a compare.
+import io
+import gc
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import traceback
+from collections import Counter, deque
+
+DEFAULT_THRESHOLD_MS = 100
+DEFAULT_MAX_REPORTS = 20
+PROFILE_TOP_FUNCTIONS = 25
+STACK_SAMPLES_KEPT = 4000
+
+class StackSampler:
+    def __init__(self, interval_ms, thread_id=None):
+        self.interval = interval_ms / 1000
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples = deque(maxlen=STACK_SAMPLES_KEPT)  # (timestamp, stack tuple)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="hitch-sampler", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = tuple(f"{entry.name} ({entry.filename.rsplit('/', 1)[-1]}:{entry.lineno})"
+                              for entry in traceback.extract_stack(frame))
+                self.samples.append((time.perf_counter(), stack))
+            del frame
+            time.sleep(self.interval)
+
+    def summarize(self, start, end):
+        stacks = [stack for timestamp, stack in list(self.samples) if start <= timestamp <= end]
+        if not stacks:
+            return None
+        # Innermost function is where the time was spent; the full stacks show how we got there
+        innermost = Counter(stack[-1] for stack in stacks)
+        return {
+            "samples": len(stacks),
+            "hot_functions": innermost.most_common(10),
+            "top_stacks": [{"count": count, "stack": list(stack)}
+                           for stack, count in Counter(stacks).most_common(3)],
+        }
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+class HitchWatchdog:
+    def __init__(self, report_path, threshold_ms=DEFAULT_THRESHOLD_MS, max_reports=DEFAULT_MAX_REPORTS,
+                 profile_frames=0, sample_ms=0):
+        self.report_path = report_path
+        self.threshold = threshold_ms / 1000
+        self.reports = deque(maxlen=max_reports)
+        self.profile_frames = profile_frames
+        self.profiler = None
+        self.profile_frames_left = 0
+        self.profiled_report = None
+        self.sampler = StackSampler(sample_ms) if sample_ms > 0 else None
+        self.extra_sections = {}  # name -> callable returning JSON-able data for each report
+
+        self.frame_number = 0
+        self.hitches = 0
+        self.last_time = None
+
+    def __call__(self, game):
+        now = time.perf_counter()
+        self.frame_number += 1
+        if self.last_time is None:
+            self.last_time = now
+            return
+
+        frame_time = now - self.last_time
+        if self.profiler is not None:
+            self.profile_frames_left -= 1
+            if self.profile_frames_left <= 0:
+                self.finish_profile()
+
+        if frame_time > self.threshold:
+            self.record(game, frame_time, now)
+            # Don't count the time spent writing the report against the next frame
+            now = time.perf_counter()
+        self.last_time = now
+
+    def record(self, game, frame_time, end_time):
+        self.hitches += 1
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "frame": self.frame_number,
+            "frame_ms": round(frame_time * 1000, 2),
+            "threshold_ms": round(self.threshold * 1000, 2),
+            "game": describe_game(game),
+            "gc": {
+                "counts": gc.get_count(),
+                "thresholds": gc.get_threshold(),
+                "stats": gc.get_stats(),
+                "frozen": gc.get_freeze_count(),
+            },
+        }
+        for name, section in self.extra_sections.items():
+            report[name] = section()
+        if self.sampler is not None:
+            report["stack_samples"] = self.sampler.summarize(end_time - frame_time, end_time)
+
+        self.reports.append(report)
+        if self.profile_frames > 0 and self.profiler is None:
+            self.start_profile(report)
+        self.write_reports()
+
+    def start_profile(self, report):
+        self.profiler = cProfile.Profile()
+        self.profile_frames_left = self.profile_frames
+        self.profiled_report = report
+        report["profile"] = f"profiling the next {self.profile_frames} frames..."
+        self.profiler.enable()
+
+    def finish_profile(self):
+        self.profiler.disable()
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=output)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        self.profiled_report["profile"] = output.getvalue().splitlines()
+        self.profiler = None
+        self.profiled_report = None
+        self.write_reports()
+
+    def write_reports(self):
+        with open(self.report_path, "w") as report_file:
+            json.dump(list(self.reports), report_file, indent=1, default=str)
+
+    def close(self):
+        if self.profiler is not None:
+            self.finish_profile()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def summary(self):
+        return f"hitches: {self.hitches} over {self.threshold * 1000:.0f} ms in {self.frame_number} frames"
+
+# Game state and entity counts worth having in a hitch report
+def describe_game(game):
+    player = game.player
+    return {
+        "state": game.game_state,
+        "sim_time": round(game.sim_time),
+        "score": int(game.score),
+        "player": {"y": round(player.y, 1), "velocity": round(player.velocity, 2),
+                   "jetpack_on": player.jetpack_on, "alive": player.alive},
+        "entities": {
+            "obstacles": len(game.obstacles),
+            "coin_formations": len(game.coin_formations),
+            "coins": sum(formation.remaining_count for formation in game.coin_formations),
+            "explosions": len(game.explosions),
+            "particles": len(game.particles),
+        },
+        "obstacles": [(o.type, round(o.x), round(o.y)) for o in game.obstacles],
+        "events": game.events.summary(),
+    }
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# Kiosk host for Jetpack Adventure
+#
+# Runs several independent games in one process, for one machine driving
+# several cabinet screens:
+#
+#   python jetpack_kiosk.py --sessions 4 --columns 2 --keys space,return,up,w
+#
+# The window is a grid of game-sized viewports, one per session, to be spread
+# across the screens. Each session is a Game of its own (its own runs, level
+# plan, random numbers and high score) drawn into its viewport, a subsurface
+# of the window, by its own SurfaceRenderer. Each session has a thrust key,
+# and mouse buttons thrust for whichever session's viewport the pointer is
+# over. All sessions are stepped together on one fixed-step clock and shown
+# with one flip.
+#
+# Everything that never changes is built once and shared read-only: sprite
+# frames, the background's sky and building layers, explosion frames, the
+# sound buffers and music (one mixer plays for every session), and the
+# renderers' full-screen overlays. Only the sounds need coordinating: each
+# session's events play its one-shot sounds, the jetpack sound plays while
+# any session is thrusting, and the music plays while any session is in a run.
+#
+# What each session holds on top of the shared assets is measured with
+# jetpack_memory.graph_bytes() every MEMORY_SAMPLE_SECONDS. It is reported
+# at exit (and with F9) against SESSION_MEMORY_BUDGET.
+import sys
+import json
+import math
+import time
+import argparse
+
+import jetpack_adventure as jp
+from jetpack_memory import graph_bytes, shared_assets
+
+pygame = jp.pygame
+
+DEFAULT_KEYS = ["space", "return", "up", "w"]
+SESSION_MEMORY_BUDGET = 1024 * 1024  # Bytes a session may hold beyond the shared assets
+MEMORY_SAMPLE_SECONDS = 5.0
+
+class KioskSession:
+    def __init__(self, host, number, viewport, key, seed=None):
+        self.number = number
+        self.viewport = viewport  # Rect of the window this session is drawn in
+        self.key = key
+        self.game = jp.Game(seed=seed)
+        self.game.thrust_held = self.held
+        # Sounds are played for all the sessions together (see KioskHost.step)
+        self.game.events.consumers = [self.play_sounds, jp.event_effects]
+        self.renderer = jp.SurfaceRenderer(host.window.subsurface(viewport))
+        self.renderer.shades = host.shades
+        self.thrusting = False
+        self.memory = 0
+        self.peak_memory = 0
+
+    def held(self):
+        if pygame.key.get_pressed()[self.key]:
+            return True
+        return any(pygame.mouse.get_pressed()) and self.viewport.collidepoint(pygame.mouse.get_pos())
+
+    def play_sounds(self, game, bus, first, end):
+        self.thrusting = jp.play_event_sounds(bus, first, end)
+
+    def press(self, event):
+        """This session's key or a click in its viewport"""
+        game = self.game
+        if game.game_state == "playing":
+            game.thrust_input(event, True)
+        else:
+            jp.play_sound("menu")
+            game.start_game()
+
+class KioskHost:
+    def __init__(self, sessions, columns=None, keys=DEFAULT_KEYS, seed=None):
+        columns = columns or sessions
+        rows = math.ceil(sessions / columns)
+        if len(keys) < sessions:
+            raise ValueError(f"{sessions} sessions need {sessions} keys, got {len(keys)}")
+        self.window = pygame.display.set_mode((columns * jp.SCREEN_WIDTH, rows * jp.SCREEN_HEIGHT))
+        pygame.display.set_caption("Jetpack Adventure")
+        jp.filter_events()
+        jp.prebuild_sprites()
+        self.shades = {}  # The renderers' overlays, shared by all of them
+        self.sessions = []
+        for number in range(sessions):
+            viewport = pygame.Rect(number % columns * jp.SCREEN_WIDTH, number // columns * jp.SCREEN_HEIGHT,
+                                   jp.SCREEN_WIDTH, jp.SCREEN_HEIGHT)
+            self.sessions.append(KioskSession(self, number, viewport, keys[number],
+                                              None if seed is None else seed + number))
+        self.by_key = {session.key: session for session in self.sessions}
+        self.music_on = True
+        self.quit_requested = False
+        self.shared_memory = 0
+        self.next_memory_sample = 0.0
+
+    def session_at(self, position):
+        for session in self.sessions:
+            if session.viewport.collidepoint(position):
+                return session
+        return None
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.quit_requested = True
+                return
+            if event.type == pygame.KEYDOWN:
+                session = self.by_key.get(event.key)
+                if session is not None:
+                    session.press(event)
+                elif event.key == pygame.K_ESCAPE:
+                    self.quit_requested = True
+                    return
+                elif event.key == pygame.K_m:
+                    self.music_on = not self.music_on
+                elif event.key == pygame.K_s:
+                    jp.sounds_enabled = not jp.sounds_enabled
+                elif event.key == pygame.K_F9:
+                    self.sample_memory()
+                    print(self.memory_summary())
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                session = self.session_at(event.pos)
+                if session is not None:
+                    session.press(event)
+
+    def step(self):
+        """One simulation step of every session"""
+        for session in self.sessions:
+            session.game.step()
+        jp.play_jetpack_sound(any(session.thrusting for session in self.sessions))
+        # A session's game over pauses the music and its next run resumes it; it's
+        # everyone's music, so it plays on while any of them is in a run
+        if self.music_on and any(session.game.game_state == "playing" for session in self.sessions):
+            pygame.mixer.music.unpause()
+        else:
+            pygame.mixer.music.pause()
+
+    def draw(self, interpolation=1.0):
+        for session in self.sessions:
+            jp.renderer = session.renderer
+            session.game.draw(interpolation)
+        pygame.display.flip()
+
+    # Memory
+
+    def sample_memory(self):
+        # Some shared caches fill up as play goes on, so they're walked again every time
+        self.shared_memory, shared_ids = graph_bytes(shared_assets(jp) + [self.shades])
+        for session in self.sessions:
+            session.memory, _ = graph_bytes([session.game, session.renderer], shared_ids)
+            session.peak_memory = max(session.peak_memory, session.memory)
+
+    def frame_done(self, now):
+        if now >= self.next_memory_sample:
+            self.next_memory_sample = now + MEMORY_SAMPLE_SECONDS
+            self.sample_memory()
+
+    def over_budget(self):
+        return [session for session in self.sessions if session.peak_memory > SESSION_MEMORY_BUDGET]
+
+    def memory_report(self):
+        return {
+            "shared_bytes": self.shared_memory,
+            "budget_bytes": SESSION_MEMORY_BUDGET,
+            "sessions": [{"session": session.number + 1, "bytes": session.memory, "peak_bytes": session.peak_memory}
+                         for session in self.sessions],
+            "over_budget": [session.number + 1 for session in self.over_budget()],
+        }
+
+    def memory_summary(self):
+        lines = [f"kiosk memory: {self.shared_memory / 1024 ** 2:.1f} MiB of assets shared by "
+                 f"{len(self.sessions)} sessions"]
+        for session in self.sessions:
+            verdict = "OVER BUDGET" if session.peak_memory > SESSION_MEMORY_BUDGET else "ok"
+            lines.append(f"  session {session.number + 1}: {session.memory / 1024:7.1f} KiB, "
+                         f"peak {session.peak_memory / 1024:7.1f} KiB of {SESSION_MEMORY_BUDGET / 1024:.0f} KiB  {verdict}")
+        return "\n".join(lines)
+
+def run_kiosk(host, render_fps=jp.FPS, max_seconds=None):
+    """Step and draw every session until quit (or max_seconds); returns the frames drawn"""
+    frame_period = 1.0 / render_fps if render_fps else 0.0
+    accumulator = 0.0
+    start = previous_time = time.perf_counter()
+    frames = 0
+    while not host.quit_requested and (max_seconds is None or previous_time - start < max_seconds):
+        current_time = time.perf_counter()
+        accumulator = min(accumulator + current_time - previous_time, jp.MAX_CATCHUP_STEPS * jp.SIM_STEP)
+        previous_time = current_time
+        host.handle_events()
+        while accumulator >= jp.SIM_STEP:
+            host.step()
+            accumulator -= jp.SIM_STEP
+        host.draw(accumulator / jp.SIM_STEP)
+        host.frame_done(time.perf_counter())
+        frames += 1
+        if frame_period:
+            jp.sleep_until(current_time + frame_period)
+    return frames
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure kiosk: several games in one process")
+    parser.add_argument("--sessions", type=int, default=len(DEFAULT_KEYS))
+    parser.add_argument("--columns", type=int, default=None,
+                        help="viewports side by side (default: all of them in one row)")
+    parser.add_argument("--keys", type=lambda text: text.split(","), default=DEFAULT_KEYS,
+                        help="thrust key of each session, by pygame key name (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=None, help="seed the sessions' games (seed, seed + 1, ...)")
+    parser.add_argument("--render-fps", type=int, default=jp.FPS, help="frame cap, 0 = uncapped")
+    parser.add_argument("--seconds", type=float, default=None, help="quit after this long")
+    parser.add_argument("--memory-report", help="write the per-session memory to this JSON file at exit")
+    args = parser.parse_args(argv)
+
+    try:
+        keys = [pygame.key.key_code(name) for name in args.keys]
+    except ValueError as error:
+        parser.error(f"--keys: {error}")
+    host = KioskHost(args.sessions, args.columns, keys, args.seed)
+    try:
+        run_kiosk(host, args.render_fps, args.seconds)
+    finally:
+        host.sample_memory()
+        print(host.memory_summary())
+        if args.memory_report:
+            with open(args.memory_report, "w") as report_file:
+                json.dump(host.memory_report(), report_file, indent=1)
+        pygame.quit()
+    if host.over_budget():
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
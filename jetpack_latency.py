@@ -0,0 +1,70 @@
+# Input-to-photon latency measurement for Jetpack Adventure
+#
+# LatencyMonitor follows every thrust press and release from the moment it
+# arrives, through the simulation step that applies it, to the presented frame
+# that first shows the result:
+#
+#   input_arrived(timestamp)  - from Game.handle_events; the timestamp is when
+#                               the input happened if the event carries one
+#                               (synthetic input does), else when it was polled
+#   step_simulated()          - from Game.step, after the update that applied it
+#   __call__(game)            - frame hook, run straight after the flip
+#
+# Real SDL events don't say when they were queued, so for keyboard and mouse
+# input the measurement starts when the game polls for it. The wait in the
+# queue before that is what late latching shortens; jetpack_bench.py latency
+# measures it with timestamped synthetic input.
+import time
+from collections import deque
+
+LATENCY_SAMPLES_KEPT = 10000
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+class LatencyMonitor:
+    def __init__(self):
+        self.arrived = []  # (input time, poll time) of input no step has applied yet
+        self.simulated = []  # Applied, waiting for the frame that shows it
+        self.samples = deque(maxlen=LATENCY_SAMPLES_KEPT)  # (input to flip, poll to flip) in seconds
+        self.inputs = 0
+
+    def input_arrived(self, timestamp=None):
+        polled = time.perf_counter()
+        self.arrived.append((polled if timestamp is None else timestamp, polled))
+
+    def step_simulated(self):
+        if self.arrived:
+            self.simulated.extend(self.arrived)
+            self.arrived.clear()
+
+    def __call__(self, game):
+        if not self.simulated:
+            return
+        flipped = time.perf_counter()
+        for input_time, polled in self.simulated:
+            self.samples.append((flipped - input_time, flipped - polled))
+        self.inputs += len(self.simulated)
+        self.simulated.clear()
+
+    def as_dict(self):
+        result = {"inputs": self.inputs}
+        for index, name in enumerate(("input_to_flip", "poll_to_flip")):
+            values = sorted(sample[index] * 1000 for sample in self.samples)
+            if values:
+                result[name] = {"mean_ms": round(sum(values) / len(values), 2),
+                                "p50_ms": round(percentile(values, 0.5), 2),
+                                "p95_ms": round(percentile(values, 0.95), 2),
+                                "max_ms": round(values[-1], 2)}
+        return result
+
+    def summary(self):
+        report = self.as_dict()
+        if "input_to_flip" not in report:
+            return "input latency: no input measured"
+        lines = [f"input latency over {report['inputs']} inputs:"]
+        for name in ("input_to_flip", "poll_to_flip"):
+            stats = report[name]
+            lines.append(f"  {name.replace('_', ' '):<14} mean {stats['mean_ms']:6.2f} ms, p50 {stats['p50_ms']:6.2f}, "
+                         f"p95 {stats['p95_ms']:6.2f}, max {stats['max_ms']:6.2f}")
+        return "\n".join(lines)
@@ -0,0 +1,252 @@
+# Memory accounting for Jetpack Adventure
+#
+# memory_report(game) totals the bytes the game is holding, by category:
+#   surfaces - pixel data (pitch x height) grouped by the class that owns it
+#   sounds   - PCM buffers of the sound effects, plus the music file
+#   entities - Python objects on the entity lists, by class
+#   python   - tracemalloc's current/peak totals and top allocation sites,
+#              when tracing is on (--memory-trace)
+#   process  - resident set size from the OS
+#
+# graph_bytes() measures what one object graph holds on its own, e.g. one
+# game among several sharing a process (jetpack_kiosk.py): everything
+# reachable from it, less what's reachable from shared_assets().
+#
+# MemoryTracker samples the report periodically as a per-frame hook so the
+# peak and steady-state value of every category can be reported, and dumps
+# everything as JSON on demand (F9 in game) or on exit (--memory-report).
+# Only the most recent HISTORY_SAMPLES are kept, so a game left running for
+# days doesn't grow its own history; peaks cover the whole run. Allocation
+# sites need a tracemalloc snapshot, which is slow, so they're only in dumps.
+import gc
+import os
+import sys
+import json
+import time
+import types
+import resource
+import tracemalloc
+from collections import deque
+from statistics import median
+
+import pygame
+
+SAMPLE_INTERVAL = 5.0  # Seconds between samples
+STEADY_STATE_SAMPLES = 12  # The steady-state value is the median of this many recent samples
+HISTORY_SAMPLES = 720  # Samples kept for reports: an hour's worth
+TOP_ALLOCATION_SITES = 15
+
+def surface_bytes(surface):
+    return surface.get_pitch() * surface.get_height()
+
+# Every surface the game holds on to, as (owner, surface) pairs
+def owned_surfaces(game, jp):
+    for layer in game.background.layers:
+        yield "Background", layer["image"]
+    if jp.Player.frame_cache is not None:
+        for frames in jp.Player.frame_cache:
+            for frame in frames:
+                yield "Player", frame
+    if jp.Coin.frame_cache is not None:
+        for frame in jp.Coin.frame_cache:
+            yield "Coin", frame
+    if jp.CoinFormation.frame_cache is not None:
+        for frame in jp.CoinFormation.frame_cache:
+            yield "CoinFormation", frame
+    for surfaces in jp.CoinFormation.surface_cache.values():
+        for surface in surfaces:
+            yield "CoinFormation", surface
+    for image in jp.Obstacle.image_cache.values():
+        yield "Obstacle", image
+    if jp.Explosion.frame_cache is not None:
+        for frame in jp.Explosion.frame_cache:
+            yield "Explosion", frame
+    for icon in jp.ui_icons.values():
+        yield "UI", icon
+    if jp.renderer.surface is not None:
+        yield "Display", jp.renderer.surface
+
+def sound_bytes(sound):
+    frequency, sample_format, channels = pygame.mixer.get_init()
+    return int(round(sound.get_length() * frequency)) * (abs(sample_format) // 8) * channels
+
+# The read-only assets every game in a process draws and plays from, built once
+def shared_assets(jp):
+    return [jp.Player.frame_cache, jp.Coin.frame_cache, jp.CoinFormation.frame_cache,
+            jp.CoinFormation.surface_cache, jp.Obstacle.image_cache, jp.Explosion.frame_cache,
+            jp.Background.image_cache, jp.ui_icons, jp.sounds, jp.coin_layouts]
+
+# Not followed when walking an object graph: they lead to whole modules
+NOT_FOLLOWED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                types.CodeType)
+
+def graph_bytes(roots, exclude=frozenset()):
+    """Bytes of the objects reachable from roots (with surfaces' pixels and sounds' samples),
+    skipping objects whose id is in exclude; returns (bytes, ids of the objects counted)"""
+    seen = set()
+    total = 0
+    pending = list(roots)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or id(obj) in exclude or isinstance(obj, NOT_FOLLOWED):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, pygame.Surface):
+            if obj.get_parent() is None:  # A subsurface's pixels are its parent's
+                total += surface_bytes(obj)
+        elif isinstance(obj, pygame.mixer.Sound):
+            total += sound_bytes(obj)
+        pending.extend(gc.get_referents(obj))
+    return total, seen
+
+def process_memory():
+    memory = {"peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+    try:
+        with open("/proc/self/statm") as statm:
+            memory["rss"] = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        pass  # Not Linux; the peak is all we can get
+    return memory
+
+def object_bytes(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+def memory_report(game, jp=None, allocation_sites=True):
+    """Bytes held by the game, by category; see the module comment for what's counted"""
+    if jp is None:
+        jp = sys.modules[type(game).__module__]
+
+    surfaces = {}
+    seen = set()
+    for owner, surface in owned_surfaces(game, jp):
+        if id(surface) in seen:
+            continue
+        seen.add(id(surface))
+        entry = surfaces.setdefault(owner, {"count": 0, "bytes": 0})
+        entry["count"] += 1
+        entry["bytes"] += surface_bytes(surface)
+
+    sounds = {name: sound_bytes(sound) for name, sound in jp.sounds.items() if sound is not None}
+    music_path = getattr(jp, "music_path", None)
+    if music_path and os.path.exists(music_path):
+        sounds["music (file)"] = os.path.getsize(music_path)
+
+    entities = {}
+    entity_lists = [("obstacles", game.obstacles), ("coin_formations", game.coin_formations),
+                    ("explosions", game.explosions), ("particles", game.particles)]
+    for list_name, objects in entity_lists:
+        entry = entities.setdefault(list_name, {"count": 0, "bytes": sys.getsizeof(objects)})
+        for obj in objects:
+            entry["count"] += 1
+            entry["bytes"] += object_bytes(obj)
+            rect = getattr(obj, "rect", None)
+            if rect is not None:
+                entry["bytes"] += sys.getsizeof(rect)
+
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "surfaces": surfaces,
+        "sounds": sounds,
+        "entities": entities,
+        "totals": {
+            "surfaces": sum(entry["bytes"] for entry in surfaces.values()),
+            "sounds": sum(sounds.values()),
+            "entities": sum(entry["bytes"] for entry in entities.values()),
+        },
+        "process": process_memory(),
+    }
+    if hasattr(jp.renderer, "texture_bytes"):
+        report["totals"]["textures"] = jp.renderer.texture_bytes()
+    if hasattr(jp.renderer, "scaled_bytes"):
+        report["totals"]["scaled_sprites"] = jp.renderer.scaled_bytes()
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report["python"] = {"current": current, "peak": peak}
+        if allocation_sites:
+            snapshot = tracemalloc.take_snapshot()
+            report["python"]["top_sites"] = [{"site": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+                                             for stat in snapshot.statistics("lineno")[:TOP_ALLOCATION_SITES]]
+        report["totals"]["python"] = current
+    return report
+
+# Flatten a report into "category/name" -> bytes for tracking over time
+def report_values(report):
+    values = {f"total/{name}": value for name, value in report["totals"].items()}
+    for owner, entry in report["surfaces"].items():
+        values[f"surfaces/{owner}"] = entry["bytes"]
+    for name, entry in report["entities"].items():
+        values[f"entities/{name}"] = entry["bytes"]
+    for name, value in report["process"].items():
+        values[f"process/{name}"] = value
+    return values
+
+class MemoryTracker:
+    def __init__(self, dump_dir, trace=False, sample_interval=SAMPLE_INTERVAL):
+        self.dump_dir = dump_dir
+        self.sample_interval = sample_interval
+        self.samples = deque(maxlen=HISTORY_SAMPLES)  # (seconds since start, {category: bytes})
+        self.sample_count = 0
+        self.peaks = {}
+        self.last_report = None
+        self.start_time = time.perf_counter()
+        self.next_sample = self.start_time
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, game):
+        now = time.perf_counter()
+        if now >= self.next_sample:
+            self.next_sample = now + self.sample_interval
+            self.sample(game, now)
+
+    def sample(self, game, now=None):
+        now = now or time.perf_counter()
+        self.last_report = memory_report(game, allocation_sites=False)
+        values = report_values(self.last_report)
+        self.samples.append((round(now - self.start_time, 1), values))
+        self.sample_count += 1
+        for name, value in values.items():
+            self.peaks[name] = max(self.peaks.get(name, 0), value)
+
+    def full_report(self, game):
+        if pygame.get_init():
+            report = memory_report(game)
+        else:
+            # pygame has already shut down (we're exiting), so the latest sample is the best we have
+            report = dict(self.last_report or {}, stale=True)
+        recent = list(self.samples)[-STEADY_STATE_SAMPLES:]
+        report["tracking"] = {
+            "samples": self.sample_count,
+            "peak": self.peaks,
+            "steady_state": {name: median(values[name] for _, values in recent if name in values)
+                             for name in self.peaks},
+            "history": list(self.samples),
+        }
+        return report
+
+    def export(self, game, path):
+        report = self.full_report(game)
+        with open(path, "w") as report_file:
+            json.dump(report, report_file, indent=1)
+        return report
+
+    def dump(self, game):
+        """Hotkey handler: write a timestamped report and print the headline numbers"""
+        path = os.path.join(self.dump_dir, time.strftime("memory_report_%Y%m%d_%H%M%S.json"))
+        print(summarize(self.export(game, path)))
+        print(f"memory report written to {path}")
+
+def summarize(report):
+    lines = ["memory:"]
+    for category, value in report["totals"].items():
+        lines.append(f"  {category:<10} {value / 1024:10.1f} KiB")
+    for owner, entry in sorted(report["surfaces"].items(), key=lambda item: -item[1]["bytes"]):
+        lines.append(f"    {owner:<12} {entry['count']:4} surfaces {entry['bytes'] / 1024:10.1f} KiB")
+    if "rss" in report["process"]:
+        lines.append(f"  {'rss':<10} {report['process']['rss'] / 1024:10.1f} KiB")
+    return "\n".join(lines)
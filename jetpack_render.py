@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# Offline renderer for Jetpack Adventure
+#
+# Turns a recorded session (see jetpack_session.py) into an image sequence,
+# one numbered PNG per simulation step, as fast as the CPU allows:
+#
+#   python jetpack_render.py session.jps OUT_DIR --workers 4
+#
+# The timeline is cut into chunks which a pool of worker processes render in
+# parallel, each to an off-screen Surface under SDL's dummy drivers. First the
+# session is replayed here without drawing, which is cheap, and a checkpoint
+# is taken at the start of every chunk: Game.snapshot(), plus the things it
+# leaves out because they don't affect play (smoke and explosions, how far
+# the background has scrolled, the global random that smoke is drawn from).
+# A worker restores its chunk's checkpoint and renders on from there, so its
+# frames are exactly the ones an unbroken render would have drawn. Workers
+# seed the global random the same way before drawing the sprites, so their
+# art matches too.
+#
+# OUT_DIR gets frame_000000.png onwards plus index.json. Frame n shows the
+# game after step n; --tail-seconds of the game over screen follow the run.
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+
+# Must be set before pygame is imported by the game module
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from jetpack_session import SessionRecorder, load_session
+
+INDEX_FILE = "index.json"
+FRAME_FILE = "frame_{:06d}.png"
+DEFAULT_CHUNK_FRAMES = 120
+DEFAULT_TAIL_SECONDS = 2.0
+ART_SEED = 0  # Global random seed the sprites are drawn with
+COSMETIC_SEED = 1  # Global random seed for smoke, dust and obstacle looks during a replay
+
+# Game module, imported lazily so spawned workers set up SDL for themselves
+jp = None
+
+def import_game():
+    """Import the game module and draw its sprites, the same way in every process"""
+    global jp
+    if jp is None:
+        import jetpack_adventure
+        jp = jetpack_adventure
+        jp.sounds_enabled = False
+        jp.pygame.mixer.music.stop()
+        # Drawing a sprite for the first time takes numbers from the global
+        # random, so every sprite is drawn before a replay starts using it
+        random.seed(ART_SEED)
+        jp.prebuild_sprites()
+    return jp
+
+def checkpoint(game):
+    """Everything a frame's pixels depend on, as plain picklable data"""
+    return (game.snapshot(), random.getstate(), game.high_score, game.death_cause,
+            [vars(particle).copy() for particle in game.particles],
+            [(explosion.x, explosion.y, explosion.frame) for explosion in game.explosions],
+            [(layer["x"], layer["prev_x"]) for layer in game.background.layers])
+
+def restore_checkpoint(game, state):
+    snapshot, random_state, game.high_score, game.death_cause, particles, explosions, layers = state
+    game.restore(snapshot)
+    random.setstate(random_state)
+    game.particles = []
+    for particle_state in particles:
+        particle = jp.Particle.__new__(jp.Particle)
+        particle.__dict__.update(particle_state)
+        game.particles.append(particle)
+    game.explosions = []
+    for x, y, frame in explosions:
+        explosion = jp.Explosion(x, y)
+        explosion.frame = frame
+        game.explosions.append(explosion)
+    for layer, (x, prev_x) in zip(game.background.layers, layers):
+        layer["x"], layer["prev_x"] = x, prev_x
+
+def plan_chunks(session, total_frames, chunk_frames):
+    """Replay session without drawing; returns (first frame, frame count, checkpoint) per chunk, and the replay's metadata"""
+    import_game()
+    game = jp.Game()
+    # Recording the replay gives its score and event counts the way the original's were taken
+    game.recorder = SessionRecorder()
+    session.start(game)
+    random.seed(COSMETIC_SEED)
+    chunks = []
+    for step in range(total_frames):
+        if step % chunk_frames == 0:
+            chunks.append((step, min(chunk_frames, total_frames - step), checkpoint(game)))
+        session.play_step(game, step)
+    replayed = game.recorder.sessions
+    return chunks, replayed[-1].metadata if replayed else {}
+
+# Worker side
+
+worker = None  # (game, surface, session, output_dir) in each worker process
+
+def init_worker(session_path, output_dir):
+    global worker
+    # SDL turns SIGTERM into a quit event by default, which would stop
+    # Pool.terminate() (and Ctrl+C) from ending the workers
+    os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+    import_game()
+    game = jp.Game()
+    surface = jp.pygame.Surface((jp.SCREEN_WIDTH, jp.SCREEN_HEIGHT))
+    jp.renderer = jp.SurfaceRenderer(surface)
+    worker = (game, surface, load_session(session_path), output_dir)
+
+def render_chunk(chunk):
+    """Worker entry point: render one chunk's frames to files; returns (frame count, seconds)"""
+    from jetpack_capture import buffer_format, save_png
+
+    first, count, state = chunk
+    game, surface, session, output_dir = worker
+    start = time.perf_counter()
+    restore_checkpoint(game, state)
+    pixel_format = buffer_format(surface)
+    for step in range(first, first + count):
+        session.play_step(game, step)
+        game.draw(1.0)
+        path = os.path.join(output_dir, FRAME_FILE.format(step))
+        if pixel_format is not None:
+            save_png(surface.get_view("0"), surface.get_size(), pixel_format, surface.get_pitch(), path)
+        else:
+            save_png(jp.pygame.image.tobytes(surface, "RGB"), surface.get_size(), "RGB", surface.get_width() * 3, path)
+    return count, time.perf_counter() - start
+
+def render_session(session_path, output_dir, workers=None, chunk_frames=DEFAULT_CHUNK_FRAMES,
+                   tail_seconds=DEFAULT_TAIL_SECONDS, progress=False):
+    """Render a session file into output_dir; returns the index written there"""
+    import_game()
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    with load_session(session_path) as session:
+        total_frames = session.steps + int(tail_seconds * jp.FPS)
+        chunks, replayed = plan_chunks(session, total_frames, chunk_frames)
+        score = replayed.get("score")
+        # Either is most likely from recording with different game constants
+        if score != session.score:
+            print(f"warning: the replay scored {score}, the recording {session.score}", file=sys.stderr)
+        elif replayed.get("events") != session.metadata.get("events", replayed.get("events")):
+            print(f"warning: the replay's events {replayed.get('events')} differ from the recording's "
+                  f"{session.metadata['events']}", file=sys.stderr)
+    planned = time.perf_counter()
+    rendered = 0
+    # Spawned (not forked) workers, so none of them inherits SDL state
+    with multiprocessing.get_context("spawn").Pool(workers, initializer=init_worker,
+                                                   initargs=(session_path, output_dir)) as pool:
+        for count, _ in pool.imap_unordered(render_chunk, chunks):
+            rendered += count
+            if progress:
+                print(f"\r{rendered}/{total_frames} frames", end="", flush=True)
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+
+    index = {
+        "session": os.path.abspath(session_path),
+        "frames": total_frames,
+        "score": score,
+        "fps": jp.FPS,
+        "width": jp.SCREEN_WIDTH,
+        "height": jp.SCREEN_HEIGHT,
+        "file_pattern": FRAME_FILE,
+        "chunk_frames": chunk_frames,
+        "workers": workers or os.cpu_count(),
+        "seconds": round(elapsed, 3),
+        "checkpoint_seconds": round(planned - start, 3),
+        "frames_per_second": round(total_frames / elapsed, 1),
+    }
+    with open(os.path.join(output_dir, INDEX_FILE), "w") as index_file:
+        json.dump(index, index_file, indent=1)
+    return index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure offline renderer")
+    parser.add_argument("session", help="session file recorded with --record-sessions or jetpack_session.py")
+    parser.add_argument("out_dir")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-frames", type=int, default=DEFAULT_CHUNK_FRAMES, help="frames per work unit")
+    parser.add_argument("--tail-seconds", type=float, default=DEFAULT_TAIL_SECONDS,
+                        help="game over screen rendered after the run")
+    args = parser.parse_args(argv)
+
+    index = render_session(args.session, args.out_dir, args.workers, args.chunk_frames, args.tail_seconds,
+                           progress=True)
+    print(f"\r{index['frames']} frames in {index['seconds']:.1f}s: {index['frames_per_second']:.1f} fps "
+          f"on {index['workers']} workers ({index['checkpoint_seconds']:.2f}s replaying for checkpoints)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
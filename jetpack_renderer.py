@@ -0,0 +1,110 @@
+# SDL texture renderer for Jetpack Adventure
+#
+# The default SurfaceRenderer (in jetpack_adventure.py) blits everything in
+# software onto the display Surface. TextureRenderer draws the same calls
+# through pygame._sdl2.video instead: sprites are uploaded once as textures
+# and an SDL Renderer does the drawing, blending and scaling - on the GPU
+# where a driver offers it, with SDL's software renderer otherwise (e.g.
+# headless CI with the dummy video driver):
+#
+#   python jetpack_adventure.py --renderer texture
+#
+# The renderer works at the game's logical resolution and scales to whatever
+# size the (resizable) window is. Background layers are textures too, so
+# parallax scrolling is just drawing them at an offset.
+#
+# python jetpack_bench.py parity checks that both renderers draw the same.
+import weakref
+
+import pygame
+from pygame._sdl2 import video
+
+BLENDMODE_BLEND = 1  # SDL_BLENDMODE_BLEND
+
+class TextureRenderer:
+    name = "texture"
+
+    def __init__(self, size, title="Jetpack Adventure", vsync=False, hidden=False):
+        self.size = size
+        self.window = video.Window(title, size, resizable=True, hidden=hidden)
+        self.renderer = video.Renderer(self.window, vsync=vsync)
+        self.renderer.logical_size = size
+        self.renderer.draw_blend_mode = BLENDMODE_BLEND
+        # Uploaded sprites; an entry goes away with its Surface
+        self.textures = weakref.WeakKeyDictionary()
+        self.circles = {}  # Particle size -> white circle texture, tinted as it's drawn
+        self.surface = None  # Copy of each presented frame, once frame_surface() has been asked for
+
+    def texture(self, image):
+        texture = self.textures.get(image)
+        if texture is None:
+            texture = video.Texture.from_surface(self.renderer, image)
+            self.textures[image] = texture
+        return texture
+
+    # Sprites that are drawn over and over are uploaded the first time
+    def blit(self, image, position):
+        self.texture(image).draw(dstrect=position)
+
+    def blits(self, image, positions):
+        draw = self.texture(image).draw
+        for position in positions:
+            draw(dstrect=position)
+
+    # Surfaces made for this frame only (like rendered text) aren't kept
+    def blit_once(self, image, position):
+        video.Texture.from_surface(self.renderer, image).draw(dstrect=position)
+
+    def text(self, font, string, color, position):
+        self.blit_once(font.render(string, True, color), position)
+
+    def fill_rect(self, color, rect, width=0):
+        self.renderer.draw_color = pygame.Color(color)
+        if width == 0:
+            self.renderer.fill_rect(rect)
+            return
+        # Border inside the rect, like pygame.draw.rect
+        x, y, w, h = rect
+        for edge in ((x, y, w, width), (x, y + h - width, w, width),
+                     (x, y, width, h), (x + w - width, y, width, h)):
+            self.renderer.fill_rect(edge)
+
+    def shade(self, color, alpha):
+        self.renderer.draw_color = pygame.Color(*color, alpha)
+        self.renderer.fill_rect((0, 0) + self.size)
+
+    def particle(self, color, alpha, position, size):
+        texture = self.circles.get(size)
+        if texture is None:
+            circle = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(circle, (255, 255, 255), (size // 2, size // 2), size // 2)
+            texture = self.circles[size] = video.Texture.from_surface(self.renderer, circle)
+        texture.color = color
+        texture.alpha = max(0, min(255, alpha))
+        texture.draw(dstrect=position)
+
+    def preload(self, images):
+        for image in images:
+            self.texture(image)
+
+    def resize(self, size):
+        pass  # SDL scales the logical size to the window by itself
+
+    def present(self):
+        # The back buffer isn't defined after presenting, so copy the frame first
+        if self.surface is not None:
+            self.renderer.to_surface(self.surface)
+        self.renderer.present()
+
+    def frame_surface(self):
+        """The frame just presented, as a Surface (copied back from the renderer from now on)"""
+        if self.surface is None:
+            self.surface = pygame.Surface(self.size)
+        return self.surface
+
+    def texture_bytes(self):
+        textures = list(self.textures.values()) + list(self.circles.values())
+        return sum(texture.width * texture.height * 4 for texture in textures)
+
+    def close(self):
+        self.window.destroy()
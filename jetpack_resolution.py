@@ -0,0 +1,265 @@
+# Output resolution for Jetpack Adventure
+#
+# The game always works in logical coordinates, SCREEN_WIDTH x SCREEN_HEIGHT:
+# the simulation, sprite sizes, spawn heights, sessions and snapshots don't
+# change with the screen. ScaledRenderer draws them onto a window of any size,
+# e.g. a 1080p or 4K panel:
+#
+#   python jetpack_adventure.py --resolution 3840x2160
+#   python jetpack_adventure.py --resolution 1920x1080 --resizable
+#
+# The logical screen is scaled to fit the window, keeping its aspect ratio,
+# and centred with black bars. Rather than drawing each frame at the logical
+# size and scaling the finished frame up, every sprite is scaled once per
+# output scale and kept in a SpriteCache, so a frame is blits of ready-made
+# surfaces and nothing is scaled while playing. Text is rendered at the output
+# size in the first place, with each font made again at that size from how
+# the game made it (jetpack_adventure.font_specs). Scaled sprites are stored
+# in whichever display format blits fastest: opaque, colour-keyed with RLE
+# when their alpha is all or nothing (the background's building layers),
+# per-pixel alpha otherwise.
+#
+# With --resizable, a VIDEORESIZE starts a SpriteCache for the new size on a
+# background thread (pygame's scaling lets go of the GIL). Until it's done,
+# frames are drawn with the old cache at the old scale, centred in the new
+# window; then the new one takes over, once it also has the sprites first
+# drawn while it was being built. A quicker resize while one is being built
+# abandons the stale build.
+import math
+import threading
+import weakref
+
+import pygame
+
+COLORKEY = (255, 0, 255)  # Transparent colour of colour-keyed scaled sprites, as for coin formations
+BAR_COLOR = (0, 0, 0)
+
+def parse_resolution(text):
+    """'WIDTHxHEIGHT' -> (width, height), for argparse"""
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"resolution must look like 1920x1080, not {text!r}")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"resolution must be positive, not {text!r}")
+    return width, height
+
+def fit(logical_size, output_size):
+    """Scale and top-left corner of the logical screen fitted into output_size"""
+    scale = min(output_size[0] / logical_size[0], output_size[1] / logical_size[1])
+    width, height = round(logical_size[0] * scale), round(logical_size[1] * scale)
+    return scale, ((output_size[0] - width) // 2, (output_size[1] - height) // 2)
+
+def scaled_size(size, scale):
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+def sprite_size(size, scale):
+    """Rounded up, so copies drawn side by side (the background's) never leave a gap between them"""
+    return tuple(max(1, math.ceil(length * scale - 1e-9)) for length in size)
+
+def scale_sprite(image, scale):
+    """image scaled by scale, in the display format that blits fastest"""
+    # Nearest-neighbour keeps the pixel art's hard edges, and with them alpha
+    # that is all or nothing stays that way
+    scaled = pygame.transform.scale(image, sprite_size(image.get_size(), scale))
+    # The surface-wide alpha (e.g. the ghosts') is put back once the pixels
+    # are converted, which would otherwise drop it or blend it in
+    alpha = image.get_alpha()
+    if alpha is not None:
+        scaled.set_alpha(255)
+    scaled = display_format(scaled, image.get_colorkey())
+    if alpha is not None and alpha != 255:
+        scaled.set_alpha(alpha, pygame.RLEACCEL if scaled.get_colorkey() is not None else 0)
+    return scaled
+
+def display_format(scaled, colorkey):
+    """scaled converted for the display: opaque, colour-keyed or per-pixel alpha"""
+    if colorkey is not None:
+        scaled = scaled.convert()
+        scaled.set_colorkey(colorkey, pygame.RLEACCEL)
+        return scaled
+    if not scaled.get_flags() & pygame.SRCALPHA:
+        return scaled.convert()
+    visible = pygame.mask.from_surface(scaled, 0).count()
+    if visible == scaled.get_width() * scaled.get_height():
+        return scaled.convert()
+    if visible == pygame.mask.from_surface(scaled, 254).count():
+        keyed = pygame.Surface(scaled.get_size()).convert()
+        keyed.fill(COLORKEY)
+        keyed.blit(scaled, (0, 0))
+        keyed.set_colorkey(COLORKEY, pygame.RLEACCEL)
+        return keyed
+    return scaled.convert_alpha()
+
+class SpriteCache:
+    """Logical sprite -> the same sprite at one output scale"""
+    def __init__(self, scale):
+        self.scale = scale
+        self.sprites = weakref.WeakKeyDictionary()  # An entry goes away with its logical Surface
+
+    def get(self, image):
+        scaled = self.sprites.get(image)
+        if scaled is None:
+            # A sprite first drawn after the cache was built, e.g. a new formation
+            scaled = self.sprites[image] = scale_sprite(image, self.scale)
+        return scaled
+
+    def add(self, images, still_wanted=lambda: True):
+        """Scale every image not in the cache yet; False if still_wanted() turned False on the way"""
+        for image in images:
+            if not still_wanted():
+                return False
+            if image not in self.sprites:
+                self.sprites[image] = scale_sprite(image, self.scale)
+        return True
+
+    def byte_size(self):
+        return sum(scaled.get_pitch() * scaled.get_height() for scaled in self.sprites.values())
+
+# Draws the logical screen onto a display Surface of any size, with the same
+# methods as SurfaceRenderer
+class ScaledRenderer:
+    name = "scaled"
+
+    def __init__(self, surface, logical_size, resizable=False, font_specs=None):
+        self.surface = surface
+        self.logical_size = logical_size
+        self.resizable = resizable
+        self.cache = SpriteCache(fit(logical_size, surface.get_size())[0])
+        self.shades = {}  # (color, alpha) -> translucent overlay over the logical screen, at the current scale
+        self.font_specs = font_specs or {}  # Font -> (name, size, bold, system font) it was made with
+        self.fonts = {}  # Font -> the same font at the current scale
+        self.build = None  # (thread, cache) for a new window size
+        self.build_serial = 0
+        self.builds_finished = 0
+        self.scale = None
+        self.place(self.cache.scale)
+
+    def place(self, scale):
+        """Draw at scale, centred in the window, with black bars around"""
+        if scale != self.scale:
+            self.shades = {}
+            self.fonts = {}
+        self.scale = scale
+        width, height = self.surface.get_size()
+        view_width, view_height = scaled_size(self.logical_size, scale)
+        self.offset = ((width - view_width) // 2, (height - view_height) // 2)
+        self.surface.set_clip(None)
+        self.surface.fill(BAR_COLOR)
+        # Sprites entering from off the logical screen stay out of the bars
+        self.viewport = pygame.Rect(self.offset, (view_width, view_height))
+        self.surface.set_clip(self.viewport)
+
+    def position(self, position):
+        return self.offset[0] + position[0] * self.scale, self.offset[1] + position[1] * self.scale
+
+    def rect(self, rect):
+        x, y, width, height = rect
+        left, top = self.position((x, y))
+        right, bottom = self.position((x + width, y + height))
+        return pygame.Rect(round(left), round(top), round(right) - round(left), round(bottom) - round(top))
+
+    # Sprites that are drawn over and over come from the cache
+    def blit(self, image, position):
+        self.surface.blit(self.cache.get(image), self.position(position))
+
+    def blits(self, image, positions):
+        scaled = self.cache.get(image)
+        position = self.position
+        self.surface.blits([(scaled, position(point)) for point in positions], False)
+
+    # Surfaces made for this frame only are scaled as they come
+    def blit_once(self, image, position):
+        self.surface.blit(pygame.transform.scale(image, scaled_size(image.get_size(), self.scale)),
+                          self.position(position))
+
+    def text(self, font, string, color, position):
+        scaled_font = self.scaled_font(font)
+        if scaled_font is None:
+            self.blit_once(font.render(string, True, color), position)
+        else:
+            self.surface.blit(scaled_font.render(string, True, color), self.position(position))
+
+    def scaled_font(self, font):
+        """font made again at the current scale, or None if it isn't known how it was made"""
+        if self.scale == 1:
+            return font
+        scaled = self.fonts.get(font)
+        if scaled is None and font in self.font_specs:
+            name, size, bold, system = self.font_specs[font]
+            size = max(1, round(size * self.scale))
+            scaled = pygame.font.SysFont(name, size, bold=bold) if system else pygame.font.Font(name, size)
+            self.fonts[font] = scaled
+        return scaled
+
+    def fill_rect(self, color, rect, width=0):
+        pygame.draw.rect(self.surface, color, self.rect(rect), width and max(1, round(width * self.scale)))
+
+    def shade(self, color, alpha):
+        if (color, alpha) not in self.shades:
+            overlay = pygame.Surface(self.viewport.size, pygame.SRCALPHA)
+            overlay.fill(color + (alpha,))
+            self.shades[(color, alpha)] = overlay
+        self.surface.blit(self.shades[(color, alpha)], self.offset)
+
+    def particle(self, color, alpha, position, size):
+        # Particles are drawn fresh each time anyway, so they're drawn at the output size
+        size = max(1, round(size * self.scale))
+        particle_surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(particle_surface, color, (size // 2, size // 2), size // 2)
+        particle_surface.set_alpha(alpha)
+        self.surface.blit(particle_surface, self.position(position))
+
+    def preload(self, images):
+        self.cache.add(images)
+
+    # Window size
+
+    def resize(self, size):
+        """The window is now size: scale the sprites for it in the background and keep drawing meanwhile"""
+        if self.surface.get_size() != tuple(size):
+            # pygame 2 resizes the display surface itself; this is for when it hasn't (or for a VIDEORESIZE posted by hand)
+            flags = pygame.RESIZABLE if self.resizable else 0
+            pygame.display.set_mode(size, flags)
+        self.surface = pygame.display.get_surface()
+        self.place(self.scale)
+        scale = fit(self.logical_size, self.surface.get_size())[0]
+        self.build_serial += 1
+        if scale == self.cache.scale:
+            self.build = None
+            return
+        self.start_build(SpriteCache(scale))
+
+    def start_build(self, cache):
+        """Scale everything in the current cache into cache, on a background thread"""
+        serial = self.build_serial
+        images = [image for image in list(self.cache.sprites.keys()) if image not in cache.sprites]
+        thread = threading.Thread(target=cache.add, args=(images, lambda: self.build_serial == serial),
+                                  name="sprite-cache", daemon=True)
+        self.build = (thread, cache)
+        thread.start()
+
+    def swap_when_built(self):
+        if self.build is not None and not self.build[0].is_alive():
+            cache = self.build[1]
+            if any(image not in cache.sprites for image in list(self.cache.sprites.keys())):
+                # Sprites first drawn while it was being built (e.g. a new
+                # formation) were scaled for the old cache only: another pass
+                self.start_build(cache)
+                return
+            self.cache = cache
+            self.build = None
+            self.builds_finished += 1
+            self.place(self.cache.scale)
+
+    def present(self):
+        pygame.display.flip()
+        # Between frames, so a frame is drawn at one scale throughout
+        self.swap_when_built()
+
+    def frame_surface(self):
+        """The frame just presented, as a Surface"""
+        return self.surface
+
+    def scaled_bytes(self):
+        return self.cache.byte_size()
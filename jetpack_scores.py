@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# High scores and per-run statistics for Jetpack Adventure
+#
+# ScoreStore is a per-frame hook. While a run is being played it collects
+# frame times; when the run ends it queues a record (score, coins, duration,
+# what killed the player, frame-time summary) for a background writer thread,
+# so the game loop never touches the disk.
+#
+# Files, in the scores directory:
+#   scores.log         - append-only log, one run per line: CRC-32 of the JSON
+#                        (8 hex digits), a space, then the JSON. The writer
+#                        appends whatever has queued up in one write and fsync.
+#   scores_index.json  - high score, top runs, totals, and how many bytes of
+#                        the log they cover. Replaced atomically after every batch,
+#                        so startup reads this instead of the whole log.
+#
+# After a crash the log may end in a partial line. On opening, the lines past
+# the index's offset are replayed into it; replay stops at the first line whose
+# CRC doesn't match, and the log is cut back to there. Every COMPACT_INTERVAL
+# runs the log is rewritten with only the most recent and the top runs, after
+# a first line carrying the totals of the runs left out and a generation
+# number. An index from another generation is rebuilt from the log, so a
+# crash part way through compacting loses nothing either.
+#
+#   python jetpack_scores.py top       # show the best runs
+#   python jetpack_scores.py compact   # compact the log now
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import argparse
+import threading
+
+LOG_FILE = "scores.log"
+INDEX_FILE = "scores_index.json"
+TOP_RUNS = 10
+KEEP_RECENT_RUNS = 500  # Runs kept in the log by compaction, besides the top runs
+COMPACT_INTERVAL = 200  # Runs appended between compactions
+
+def encode_line(record):
+    text = json.dumps(record, separators=(",", ":"))
+    return f"{zlib.crc32(text.encode()):08x} {text}\n".encode()
+
+def decode_line(line):
+    """The record on a log line, or None if the line is partial or damaged"""
+    if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+        return None
+    text = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(text):
+            return None
+        return json.loads(text)
+    except ValueError:
+        return None
+
+def empty_index():
+    return {"high_score": 0, "top": [], "runs": 0, "total_seconds": 0.0, "total_coins": 0,
+            "log_offset": 0, "since_compaction": 0, "generation": 0}
+
+def add_to_index(index, record):
+    if "generation" in record:
+        # First line of a compacted log: what the runs compaction dropped added up to
+        index["generation"] = record["generation"]
+        index["high_score"] = max(index["high_score"], record["high_score"])
+        index["runs"] += record["runs"]
+        index["total_seconds"] = round(index["total_seconds"] + record["seconds"], 3)
+        index["total_coins"] += record["coins"]
+        return
+    index["high_score"] = max(index["high_score"], record["score"])
+    index["runs"] += 1
+    index["total_seconds"] = round(index["total_seconds"] + record["seconds"], 3)
+    index["total_coins"] += record["coins"]
+    index["since_compaction"] += 1
+    top = index["top"]
+    if len(top) < TOP_RUNS or record["score"] > top[-1]["score"]:
+        top.append(record)
+        top.sort(key=lambda run: -run["score"])
+        del top[TOP_RUNS:]
+
+def frame_summary(frame_times):
+    if not frame_times:
+        return None
+    frame_times = sorted(frame_times)
+    return {
+        "frames": len(frame_times),
+        "mean_ms": round(sum(frame_times) / len(frame_times) * 1000, 2),
+        "p95_ms": round(frame_times[int(len(frame_times) * 0.95)] * 1000, 2),
+        "max_ms": round(frame_times[-1] * 1000, 2),
+    }
+
+def write_atomic(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_path, path)
+
+class ScoreStore:
+    def __init__(self, directory):
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        os.makedirs(directory, exist_ok=True)
+        self.index = self.load_index()
+        self.recover()
+
+        # Only the writer thread touches the files from here on
+        self.queue = queue.Queue()
+        self.records_written = 0
+        self.batches_written = 0
+        self.thread = threading.Thread(target=self.write_loop, name="score-writer", daemon=True)
+        self.thread.start()
+
+        self.state = None
+        self.frame_times = []
+        self.last_frame = None
+
+    @property
+    def high_score(self):
+        return self.index["high_score"]
+
+    def top(self, count=TOP_RUNS):
+        return self.index["top"][:count]
+
+    # Startup
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return empty_index()
+        if set(empty_index()) - set(index):
+            return empty_index()
+        return index
+
+    def recover(self):
+        """Bring the index up to date with the log, and cut off a damaged tail"""
+        if not os.path.exists(self.log_path):
+            if self.index["log_offset"]:
+                self.index = empty_index()
+            return
+        size = os.path.getsize(self.log_path)
+        with open(self.log_path, "rb") as log_file:
+            first = decode_line(log_file.readline()) or {}
+        if self.index["log_offset"] > size or first.get("generation", 0) != self.index["generation"]:
+            self.index = empty_index()  # The index is for some other log; rebuild it
+        if self.index["log_offset"] == size:
+            return
+
+        offset = self.index["log_offset"]
+        with open(self.log_path, "rb") as log_file:
+            log_file.seek(offset)
+            for line in log_file:
+                record = decode_line(line)
+                if record is None:
+                    break
+                add_to_index(self.index, record)
+                offset += len(line)
+        if offset < size:
+            with open(self.log_path, "r+b") as log_file:
+                log_file.truncate(offset)
+        self.index["log_offset"] = offset
+        write_atomic(self.index_path, json.dumps(self.index).encode())
+
+    # Game side
+
+    def __call__(self, game):
+        now = time.perf_counter()
+        if game.game_state == "playing":
+            if self.state == "playing":
+                self.frame_times.append(now - self.last_frame)
+            else:
+                self.frame_times = []
+        elif self.state == "playing" and game.game_state == "game_over":
+            self.submit(game, self.frame_times)
+            self.frame_times = []
+        self.state = game.game_state
+        self.last_frame = now
+
+    def submit(self, game, frame_times=()):
+        """Queue the run game just finished; frame_times is handed over, not copied"""
+        self.queue.put({
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "score": int(game.score),
+            "coins": game.coins_collected,
+            "seconds": round(game.sim_time / 1000, 2),
+            "death": game.death_cause,
+            "frame_times": frame_times,
+        })
+
+    def close(self):
+        """Write out everything queued and stop the writer"""
+        self.queue.put(None)
+        self.thread.join()
+
+    # Writer thread
+
+    def write_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            records = [record for record in batch if record is not None]
+            if records:
+                self.write_batch(records)
+            if stop:
+                return
+
+    def write_batch(self, records):
+        for record in records:
+            record["frames"] = frame_summary(record.pop("frame_times"))
+        data = b"".join(encode_line(record) for record in records)
+        with open(self.log_path, "ab") as log_file:
+            log_file.write(data)
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        # The log is durable before the index says it covers the new lines
+        for record in records:
+            add_to_index(self.index, record)
+        self.index["log_offset"] += len(data)
+        self.records_written += len(records)
+        self.batches_written += 1
+        if self.index["since_compaction"] >= COMPACT_INTERVAL:
+            self.compact()
+        else:
+            write_atomic(self.index_path, json.dumps(self.index).encode())
+
+    def compact(self):
+        """Rewrite the log with only the recent and top runs, plus the totals of the rest"""
+        with open(self.log_path, "rb") as log_file:
+            records = [record for record in map(decode_line, log_file)
+                       if record is not None and "generation" not in record]
+        top = set(map(json.dumps, self.index["top"]))
+        kept = [record for record in records[:-KEEP_RECENT_RUNS] if json.dumps(record) in top]
+        kept += records[-KEEP_RECENT_RUNS:]
+        index = self.index
+        header = {
+            "generation": index["generation"] + 1,
+            "high_score": index["high_score"],
+            "runs": index["runs"] - len(kept),
+            "seconds": round(index["total_seconds"] - sum(record["seconds"] for record in kept), 3),
+            "coins": index["total_coins"] - sum(record["coins"] for record in kept),
+        }
+        data = b"".join(encode_line(record) for record in [header] + kept)
+        write_atomic(self.log_path, data)
+        self.index["generation"] = header["generation"]
+        self.index["log_offset"] = len(data)
+        self.index["since_compaction"] = 0
+        write_atomic(self.index_path, json.dumps(self.index).encode())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure scores")
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"),
+                        help="scores directory (default: the game's assets directory)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    top_parser = subparsers.add_parser("top", help="show the best runs")
+    top_parser.add_argument("-n", type=int, default=TOP_RUNS)
+    subparsers.add_parser("compact", help="compact the run log now")
+    args = parser.parse_args(argv)
+
+    store = ScoreStore(args.dir)
+    store.close()  # Nothing to write; the files are ours now
+    if args.command == "top":
+        index = store.index
+        print(f"{index['runs']} runs, {index['total_seconds'] / 60:.1f} minutes played, {index['total_coins']} coins")
+        for rank, run in enumerate(store.top(args.n), 1):
+            print(f"{rank:3}. {run['score']:7}  {run['coins']:4} coins  {run['seconds']:7.1f}s  "
+                  f"{run['death'] or '-':<8} {run['time']}")
+    elif args.command == "compact":
+        store.compact()
+        print(f"compacted to {os.path.getsize(store.log_path)} bytes")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
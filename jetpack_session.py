@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# Session recordings for Jetpack Adventure
+#
+# A session is one run, kept so it can be played again from any point: the
+# input of every simulation step, plus a keyframe (the full simulation state)
+# every KEYFRAME_INTERVAL steps. Everything else in a run follows from those,
+# so replaying a session lands on the same score. (Smoke, dust and the looks
+# of obstacles come from the global random and aren't recorded.)
+#
+# File layout, little-endian:
+#   header    - magic, u16 version, u16 keyframe interval
+#   inputs    - u8 per step (bit 0: thrust)
+#   keyframes - back to back; keyframe k is the state before step k * interval
+#               (see encode_keyframe)
+#   index     - u64 file offset per keyframe
+#   metadata  - JSON: when it was recorded, seed, score, the coin layouts the
+#               keyframes refer to by number, ...
+#   footer    - offsets and counts of the above, then the magic again
+# The footer has a fixed size, so a reader maps the file, reads the footer,
+# and finds keyframe k at index offset + 8k: getting to any step takes one
+# keyframe restore and fewer than interval simulated steps.
+#
+# SessionRecorder is attached to the game as Game.recorder, like the ghosts,
+# and saves every run into a directory on a background thread:
+#   python jetpack_adventure.py --record-sessions DIR
+# A session can also be played by one of the batch evaluator's policies:
+#   python jetpack_session.py record session.jps --policy heuristic --seed 3
+#   python jetpack_session.py info session.jps
+#
+# jetpack_render.py turns sessions into image sequences.
+import os
+import sys
+import json
+import mmap
+import time
+import queue
+import struct
+import argparse
+import threading
+
+MAGIC = b"JPSN"
+SESSION_VERSION = 2
+KEYFRAME_INTERVAL = 300  # Steps between keyframes (5 seconds)
+STEPS_PER_SECOND = 60  # The game's simulation rate
+
+THRUST = 1  # Input bits
+
+HEADER = struct.Struct("<4sHH")  # magic, version, keyframe interval
+# inputs offset, steps, index offset, keyframe count, metadata offset, metadata length, magic
+FOOTER = struct.Struct("<QIQIQI4s")
+OFFSET = struct.Struct("<Q")
+
+# Keyframe records
+PLAYER = struct.Struct("<ddd??d")  # y, prev_y, velocity, jetpack_on, alive, animation frame
+GAME = struct.Struct("<dIBddd")  # score, coins, game state, sim time, last obstacle and coin planned
+RNG = struct.Struct("<B625I?d")  # Random.getstate(): version, state words, whether there's a gauss_next, gauss_next
+COUNTS = struct.Struct("<HHHH")  # obstacles, coin formations, pending spawns, released spawns
+OBSTACLE = struct.Struct("<Bddd?B")  # kind, x, prev_x, y, passed, variant
+FORMATION = struct.Struct("<HddddH")  # layout, x, prev_x, y, animation frame, bytes of collected bits that follow
+SPAWN = struct.Struct("<dBddH")  # time, kind, x, y, layout
+
+GAME_STATES = ["menu", "playing", "game_over"]
+KINDS = ["missile", "laser", "coins"]
+NO_LAYOUT = 0xFFFF
+
+def encode_keyframe(snapshot, layouts):
+    """A Game.snapshot() as bytes; coin layouts become numbers in layouts, a {layout: number} dict added to as needed"""
+    def layout_number(layout):
+        if layout is None:
+            return NO_LAYOUT
+        return layouts.setdefault(layout, len(layouts))
+
+    pending, released, last_obstacle_time, last_coin_time = snapshot.level
+    version, internal_state, gauss_next = snapshot.rng_state
+    parts = [
+        PLAYER.pack(*snapshot.player),
+        GAME.pack(snapshot.score, snapshot.coins_collected, GAME_STATES.index(snapshot.game_state),
+                  snapshot.sim_time, last_obstacle_time, last_coin_time),
+        RNG.pack(version, *internal_state, gauss_next is not None, gauss_next or 0.0),
+        COUNTS.pack(len(snapshot.obstacles), len(snapshot.coin_formations), len(pending), len(released)),
+    ]
+    for kind, x, prev_x, y, passed, variant in snapshot.obstacles:
+        parts.append(OBSTACLE.pack(KINDS.index(kind), x, prev_x, y, passed, variant))
+    for layout, x, prev_x, y, collected, animation_frame in snapshot.coin_formations:
+        collected_bytes = collected.to_bytes((collected.bit_length() + 7) // 8, "little")
+        parts.append(FORMATION.pack(layout_number(layout), x, prev_x, y, animation_frame, len(collected_bytes)))
+        parts.append(collected_bytes)
+    for spawn in pending + released:
+        parts.append(SPAWN.pack(spawn.time, KINDS.index(spawn.kind), spawn.x, spawn.y, layout_number(spawn.layout)))
+    return b"".join(parts)
+
+def decode_keyframe(data, layouts, jp):
+    """encode_keyframe() undone, as a jp.GameSnapshot; layouts is the list of layouts by number"""
+    offset = 0
+
+    def unpack(record):
+        nonlocal offset
+        values = record.unpack_from(data, offset)
+        offset += record.size
+        return values
+
+    player = unpack(PLAYER)
+    score, coins, game_state, sim_time, last_obstacle_time, last_coin_time = unpack(GAME)
+    version, *internal_state, has_gauss, gauss_next = unpack(RNG)
+    obstacle_count, formation_count, pending_count, released_count = unpack(COUNTS)
+    obstacles = []
+    for _ in range(obstacle_count):
+        kind, x, prev_x, y, passed, variant = unpack(OBSTACLE)
+        obstacles.append((KINDS[kind], x, prev_x, y, passed, variant))
+    formations = []
+    for _ in range(formation_count):
+        layout, x, prev_x, y, animation_frame, collected_length = unpack(FORMATION)
+        collected = int.from_bytes(data[offset:offset + collected_length], "little")
+        offset += collected_length
+        formations.append((layouts[layout], x, prev_x, y, collected, animation_frame))
+    spawns = []
+    for _ in range(pending_count + released_count):
+        time_, kind, x, y, layout = unpack(SPAWN)
+        spawns.append(jp.PlannedSpawn(time_, KINDS[kind], x, y, None if layout == NO_LAYOUT else layouts[layout]))
+    level = (tuple(spawns[:pending_count]), tuple(spawns[pending_count:]), last_obstacle_time, last_coin_time)
+    rng_state = (version, tuple(internal_state), gauss_next if has_gauss else None)
+    return jp.GameSnapshot(player, tuple(obstacles), tuple(formations), score, coins, GAME_STATES[game_state],
+                           sim_time, level, rng_state)
+
+def layout_as_dict(layout):
+    return {"name": layout.name, "offsets": layout.offsets, "width": layout.width, "height": layout.height,
+            "origin": layout.origin}
+
+def layout_from_dict(data, jp):
+    offsets = tuple(map(tuple, data["offsets"]))
+    layout = jp.CoinLayout(data["name"], offsets, tuple(x for x, y in offsets), data["width"], data["height"],
+                           tuple(data["origin"]))
+    # The game's own copy, if it has the same one, so sprites cached for it are shared
+    cached = jp.coin_layouts.get(layout.name)
+    return cached if cached == layout else layout
+
+class RecordedSession:
+    """A finished recording, still in memory"""
+    def __init__(self, inputs, keyframes, layouts, metadata, keyframe_interval):
+        self.inputs = inputs
+        self.keyframes = keyframes
+        self.layouts = layouts  # In number order
+        self.metadata = metadata
+        self.keyframe_interval = keyframe_interval
+
+    def encode(self):
+        metadata = dict(self.metadata, steps=len(self.inputs), layouts=[layout_as_dict(layout) for layout in self.layouts])
+        parts = [HEADER.pack(MAGIC, SESSION_VERSION, self.keyframe_interval)]
+        inputs_offset = HEADER.size
+        parts.append(bytes(self.inputs))
+        offset = inputs_offset + len(self.inputs)
+        index = []
+        for keyframe in self.keyframes:
+            index.append(OFFSET.pack(offset))
+            parts.append(keyframe)
+            offset += len(keyframe)
+        index_offset = offset
+        parts += index
+        metadata_offset = index_offset + OFFSET.size * len(index)
+        metadata_bytes = json.dumps(metadata, separators=(",", ":")).encode()
+        parts.append(metadata_bytes)
+        parts.append(FOOTER.pack(inputs_offset, len(self.inputs), index_offset, len(self.keyframes),
+                                 metadata_offset, len(metadata_bytes), MAGIC))
+        return b"".join(parts)
+
+def save_session(path, recorded):
+    # Written to a temporary file first so a crash never leaves a partial session behind
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as session_file:
+        session_file.write(recorded.encode())
+    os.replace(temp_path, path)
+
+class SessionReader:
+    def __init__(self, path):
+        with open(path, "rb") as session_file:
+            self.buffer = mmap.mmap(session_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.keyframe_interval = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != SESSION_VERSION or len(self.buffer) < HEADER.size + FOOTER.size:
+            self.buffer.close()
+            raise ValueError(f"{path}: not a version {SESSION_VERSION} session")
+        (inputs_offset, self.steps, self.index_offset, self.keyframe_count,
+         metadata_offset, metadata_length, magic) = FOOTER.unpack_from(self.buffer, len(self.buffer) - FOOTER.size)
+        if magic != MAGIC:
+            self.buffer.close()
+            raise ValueError(f"{path}: session has no footer (cut short?)")
+        self.thrust = memoryview(self.buffer)[inputs_offset:inputs_offset + self.steps]  # Input bits per step
+        self.metadata = json.loads(self.buffer[metadata_offset:metadata_offset + metadata_length])
+        self.score = self.metadata["score"]
+        self.layouts = None  # Built the first time a keyframe is decoded
+
+    def close(self):
+        self.thrust.release()
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def keyframe_bytes(self, number):
+        start, = OFFSET.unpack_from(self.buffer, self.index_offset + OFFSET.size * number)
+        if number + 1 < self.keyframe_count:
+            end, = OFFSET.unpack_from(self.buffer, self.index_offset + OFFSET.size * (number + 1))
+        else:
+            end = self.index_offset
+        return self.buffer[start:end]
+
+    def keyframe(self, number, jp):
+        """Keyframe number number (the state before step number * keyframe_interval) as a jp.GameSnapshot"""
+        if self.layouts is None:
+            self.layouts = [layout_from_dict(layout, jp) for layout in self.metadata["layouts"]]
+        return decode_keyframe(self.keyframe_bytes(number), self.layouts, jp)
+
+    def seek(self, game, step):
+        """Put game in the state the recorded run was in before step number step"""
+        jp = sys.modules[type(game).__module__]
+        number = min(step // self.keyframe_interval, self.keyframe_count - 1)
+        game.start_game()
+        game.restore(self.keyframe(number, jp))
+        game.high_score = self.metadata["high_score"]
+        for replayed in range(number * self.keyframe_interval, step):
+            self.play_step(game, replayed)
+
+    def start(self, game):
+        self.seek(game, 0)
+
+    def play_step(self, game, step):
+        """Simulation step number step of the session (past its end, the game carries on without input)"""
+        if step < self.steps:
+            game.player.jetpack_on = bool(self.thrust[step] & THRUST)
+        game.update()
+        if step == self.steps - 1 and game.game_state == "playing":
+            game.game_over()  # The recording stopped a run that was still going
+
+    def info(self):
+        seconds = self.steps / STEPS_PER_SECOND
+        size = len(self.buffer)
+        return dict(self.metadata, layouts=len(self.metadata["layouts"]), seconds=round(seconds, 2),
+                    keyframes=self.keyframe_count, keyframe_interval=self.keyframe_interval, bytes=size,
+                    bytes_per_minute=round(size / seconds * 60) if seconds else None)
+
+load_session = SessionReader
+
+class SessionRecorder:
+    def __init__(self, directory=None, keyframe_interval=KEYFRAME_INTERVAL):
+        self.directory = directory
+        self.keyframe_interval = keyframe_interval
+        self.recording = False
+        self.sessions = []  # Finished runs, when there's no directory to save them in
+        self.queue = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self.write_loop, name="session-writer", daemon=True)
+            self.thread.start()
+
+    # Game side: start() and finish() bracket a run, record() is called at
+    # the start of every step of it
+
+    def start(self, game):
+        self.recording = True
+        self.inputs = bytearray()
+        self.keyframes = []
+        self.layouts = {}
+        self.jetpack_on = game.player.jetpack_on  # As the previous step left it
+        self.event_counts = game.events.summary()  # Events so far, to count the run's own
+        self.metadata = {"version": SESSION_VERSION, "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                         "seed": game.seed, "high_score": int(game.high_score)}
+
+    def record(self, game):
+        if not self.recording:
+            return
+        if len(self.inputs) % self.keyframe_interval == 0:
+            # The jetpack has already been set for this step; the keyframe has it as the last step left it
+            snapshot = game.snapshot()
+            player = snapshot.player[:3] + (self.jetpack_on,) + snapshot.player[4:]
+            self.keyframes.append(encode_keyframe(snapshot._replace(player=player), self.layouts))
+        self.jetpack_on = game.player.jetpack_on
+        self.inputs.append(THRUST if self.jetpack_on else 0)
+
+    def finish(self, game):
+        if not self.recording:
+            return
+        self.recording = False
+        if not self.inputs:
+            return
+        events = {name: count - self.event_counts[name] for name, count in game.events.summary().items()}
+        self.metadata.update(score=int(game.score), coins=game.coins_collected, death=game.death_cause,
+                             events=events)
+        recorded = RecordedSession(self.inputs, self.keyframes, list(self.layouts), self.metadata,
+                                   self.keyframe_interval)
+        if self.queue is not None:
+            self.queue.put(recorded)
+        else:
+            self.sessions.append(recorded)
+
+    def close(self):
+        """Write out the sessions still queued and stop the writer"""
+        if self.queue is not None:
+            self.queue.put(None)
+            self.thread.join()
+
+    # Writer thread
+
+    def write_loop(self):
+        while True:
+            recorded = self.queue.get()
+            if recorded is None:
+                return
+            name = f"session_{time.strftime('%Y%m%d-%H%M%S')}_{time.time_ns() % 10 ** 9:09d}.jps"
+            save_session(os.path.join(self.directory, name), recorded)
+
+def record_policy(path, policy_name, seed, max_seconds, keyframe_interval=KEYFRAME_INTERVAL):
+    """Play a seeded run with one of the batch evaluator's policies and save it as a session"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import jetpack_adventure as jp
+    import jetpack_batch
+
+    jp.sounds_enabled = False
+    jetpack_batch.jp = jp
+    game = jp.Game(seed=seed)
+    recorder = game.recorder = SessionRecorder(keyframe_interval=keyframe_interval)
+    policy = jetpack_batch.POLICIES[policy_name](seed)
+    game.start_game()
+    for _ in range(int(max_seconds * jp.FPS)):
+        if game.game_state != "playing":
+            break
+        game.player.jetpack_on = policy.decide(game)
+        game.update()
+    else:
+        game.game_over()
+    recorded = recorder.sessions[-1]
+    save_session(path, recorded)
+    return recorded
+
+def main(argv=None):
+    import jetpack_batch
+
+    parser = argparse.ArgumentParser(description="Jetpack Adventure session recordings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="record a run played by a batch evaluator policy")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--policy", choices=sorted(jetpack_batch.POLICIES), default="heuristic")
+    record_parser.add_argument("--seed", type=int, default=1)
+    record_parser.add_argument("--max-seconds", type=float, default=60, help="end the run after this long (game time)")
+    record_parser.add_argument("--keyframe-interval", type=int, default=KEYFRAME_INTERVAL, help="steps between keyframes")
+    info_parser = subparsers.add_parser("info", help="show what's in a session file")
+    info_parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        recorded = record_policy(args.path, args.policy, args.seed, args.max_seconds, args.keyframe_interval)
+        print(f"{len(recorded.inputs)} steps ({len(recorded.inputs) / STEPS_PER_SECOND:.1f}s), "
+              f"score {recorded.metadata['score']}, {recorded.metadata['coins']} coins: {args.path}")
+    elif args.command == "info":
+        with SessionReader(args.path) as reader:
+            for name, value in reader.info().items():
+                print(f"{name:<18} {value}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
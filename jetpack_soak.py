@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# Soak test for Jetpack Adventure
+#
+# Plays the game headless at full speed for many hours of game time, looking
+# for anything that grows without bound: entity lists, the level planner's
+# queues, sprite caches and textures, Python objects, busy sound channels,
+# the process's memory, or the time a frame takes. Each frame is one
+# simulation step, drawn every --draw-every frames, with no waiting in
+# between. The session keeps going round the menu, a run and the game over
+# screen, the same way a kiosk left on for days would.
+#
+#   python jetpack_soak.py --hours 12 --policy heuristic --report soak.json
+#
+# Every --sample-minutes of game time the counts are sampled (entity counts
+# are the most seen in any frame since the last sample, so a one-off burst
+# doesn't hide between samples). After the warm-up samples the rest are split
+# into quarters; a metric whose quarter values only ever rise, and end up
+# well above where they started, is flagged. Frame times are noisy, so they
+# are only judged once each quarter has DRIFT_MIN_QUARTER_SAMPLES samples;
+# a shorter soak reports them as "too short". The exit status is 1 if
+# anything was flagged.
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+
+# Must be set before pygame is imported by the game module
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import jetpack_adventure as jp
+import jetpack_batch
+from jetpack_memory import owned_surfaces, process_memory
+
+WARMUP_SAMPLES = 2  # Samples left out of the trend while the caches fill up
+QUARTERS = 4
+MIN_SAMPLES = WARMUP_SAMPLES + 2 * QUARTERS
+# Counts are flagged when they rise from quarter to quarter and end up more
+# than MIN_GROWTH above where they started. Memory use moves around a little
+# on its own, so it also has to grow by more than MEMORY_TOLERANCE
+MIN_GROWTH = 2  # So counts like 0 -> 1 aren't flagged
+MEMORY_TOLERANCE = 0.01
+DRIFT_TOLERANCE = 0.2  # Frame times may rise this much before it counts as drift
+DRIFT_MIN_QUARTER_SAMPLES = 6  # Fewer samples per quarter than this, and chance alone can look like drift
+
+# Metrics summarised per quarter by their highest value rather than their median:
+# a leak raises the peaks, whatever the count happens to be at a given moment.
+# Peaks are noisy, so they have to grow a lot more before they're flagged
+PEAK_METRICS = ("obstacles", "coin_formations", "explosions", "particles", "planner_pending",
+                "planner_released", "busy_channels")
+PEAK_GROWTH_TOLERANCE = 0.5
+MIN_PEAK_GROWTH = 5
+
+def busy_channels():
+    return sum(jp.pygame.mixer.Channel(i).get_busy() for i in range(jp.pygame.mixer.get_num_channels()))
+
+class Soak:
+    def __init__(self, policy_name, seed, max_run_minutes, dwell_seconds, draw_every):
+        self.game = jp.Game(seed=seed)
+        # The policies come from the batch evaluator, which looks the game module up lazily
+        jetpack_batch.jp = jp
+        self.policy = jetpack_batch.POLICIES[policy_name](seed)
+        self.max_run_steps = int(max_run_minutes * 60 * jp.FPS)
+        self.dwell_steps = int(dwell_seconds * jp.FPS)
+        self.draw_every = draw_every
+        self.steps = 0
+        self.state_steps = 0  # Steps since the game entered its current state
+        self.runs = 0
+        self.peaks = {}
+        self.frame_times = []
+        self.samples = []  # (hours of game time, {metric: value})
+
+    def step(self):
+        """One frame: move the session along, simulate a step, and maybe draw"""
+        game = self.game
+        state = game.game_state
+        if state == "menu" and self.state_steps >= self.dwell_steps:
+            game.start_game()
+            self.runs += 1
+        elif state == "playing":
+            if self.state_steps >= self.max_run_steps:
+                game.game_over()  # An autopilot that never dies still has to cycle
+            else:
+                game.player.jetpack_on = self.policy.decide(game)
+        elif state == "game_over" and self.state_steps >= self.dwell_steps:
+            game.game_state = "menu"
+
+        start = time.perf_counter()
+        game.update()
+        if self.steps % self.draw_every == 0:
+            game.draw(1.0)
+            jp.renderer.present()
+        self.frame_times.append(time.perf_counter() - start)
+
+        self.steps += 1
+        self.state_steps = self.state_steps + 1 if game.game_state == state else 0
+        for name, count in (("obstacles", len(game.obstacles)), ("coin_formations", len(game.coin_formations)),
+                            ("explosions", len(game.explosions)), ("particles", len(game.particles))):
+            if count > self.peaks.get(name, 0):
+                self.peaks[name] = count
+
+    def sample(self):
+        game = self.game
+        level = game.level
+        values = {name: self.peaks.get(name, 0) for name in ("obstacles", "coin_formations", "explosions", "particles")}
+        values["planner_pending"] = len(level.pending)
+        values["planner_released"] = len(level.released)
+        values["surfaces"] = len({id(surface) for _, surface in owned_surfaces(game, jp)})
+        values["textures"] = len(getattr(jp.renderer, "textures", ()))
+        # Less the tuple each earlier sample is kept in (the dicts hold only
+        # numbers, so the collector doesn't track them)
+        values["python_objects"] = len(gc.get_objects()) - len(self.samples)
+        values["busy_channels"] = busy_channels()
+        values["rss_kib"] = process_memory().get("rss", 0) // 1024
+        frame_times = sorted(self.frame_times)
+        values["frame_mean_ms"] = round(sum(frame_times) / len(frame_times) * 1000, 4)
+        values["frame_p99_ms"] = round(frame_times[int(len(frame_times) * 0.99)] * 1000, 4)
+        self.samples.append((round(self.steps / jp.FPS / 3600, 3), values))
+        self.peaks = {}
+        self.frame_times = []
+
+def analyse(samples):
+    """metric -> {quarters, verdict}; the verdict is "ok", "growth", "drift" or "too short" (not judged)"""
+    trend = [values for _, values in samples[WARMUP_SAMPLES:]]
+    size = len(trend) // QUARTERS
+    results = {}
+    for name in trend[0]:
+        quarters = []
+        for quarter in range(QUARTERS):
+            series = sorted(values[name] for values in trend[quarter * size:(quarter + 1) * size])
+            quarters.append(series[-1] if name in PEAK_METRICS else series[len(series) // 2])
+        rising = all(later > earlier for earlier, later in zip(quarters, quarters[1:]))
+        increase = quarters[-1] - quarters[0]
+        verdict = "ok"
+        if name.startswith("frame_"):
+            if size < DRIFT_MIN_QUARTER_SAMPLES:
+                verdict = "too short"
+            elif rising and increase > quarters[0] * DRIFT_TOLERANCE:
+                verdict = "drift"
+        elif name in PEAK_METRICS:
+            if rising and increase > max(MIN_PEAK_GROWTH, quarters[0] * PEAK_GROWTH_TOLERANCE):
+                verdict = "growth"
+        elif name == "rss_kib":
+            if rising and increase > quarters[0] * MEMORY_TOLERANCE:
+                verdict = "growth"
+        elif rising and increase > MIN_GROWTH:
+            verdict = "growth"
+        results[name] = {"quarters": quarters, "verdict": verdict}
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure soak test")
+    parser.add_argument("--hours", type=float, default=4.0, help="hours of game time to play")
+    parser.add_argument("--policy", choices=sorted(jetpack_batch.POLICIES), default="heuristic")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sample-minutes", type=float, default=5.0, help="game time between samples")
+    parser.add_argument("--max-run-minutes", type=float, default=10.0,
+                        help="end a run that has lasted this long (game time)")
+    parser.add_argument("--dwell-seconds", type=float, default=2.0,
+                        help="time spent on the menu and game over screens (game time)")
+    parser.add_argument("--draw-every", type=int, default=10,
+                        help="draw one frame in this many steps (drawing takes most of the time)")
+    parser.add_argument("--renderer", choices=["surface", "texture"], default="surface")
+    parser.add_argument("--no-sound", action="store_true", help="don't play sound effects")
+    parser.add_argument("--report", help="write the samples and verdicts to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.renderer == "texture":
+        from jetpack_renderer import TextureRenderer
+        jp.renderer = TextureRenderer((jp.SCREEN_WIDTH, jp.SCREEN_HEIGHT), hidden=True)
+    jp.sounds_enabled = not args.no_sound
+    jp.prebuild_sprites()
+
+    soak = Soak(args.policy, args.seed, args.max_run_minutes, args.dwell_seconds, args.draw_every)
+    total_steps = int(args.hours * 3600 * jp.FPS)
+    sample_steps = int(args.sample_minutes * 60 * jp.FPS)
+    if total_steps // sample_steps < MIN_SAMPLES:
+        raise SystemExit(f"{args.hours} hours gives fewer than {MIN_SAMPLES} samples; "
+                         f"use more hours or a shorter --sample-minutes")
+
+    start = time.perf_counter()
+    while soak.steps < total_steps:
+        soak.step()
+        if soak.steps % sample_steps == 0:
+            soak.sample()
+            print(f"\r{soak.samples[-1][0]:.2f}/{args.hours:g} hours, {soak.runs} runs", end="", flush=True)
+    elapsed = time.perf_counter() - start
+    print(f"\r{args.hours:g} hours of game time in {elapsed / 60:.1f} minutes "
+          f"({args.hours * 3600 / elapsed:.0f}x real time), {soak.runs} runs")
+
+    results = analyse(soak.samples)
+    print(f"{'metric':<18} {'quarters (after warm-up)':<44} verdict")
+    for name, result in results.items():
+        quarters = " ".join(f"{value:>10g}" for value in result["quarters"])
+        print(f"{name:<18} {quarters:<44} {result['verdict']}")
+    flagged = [name for name, result in results.items() if result["verdict"] in ("growth", "drift")]
+
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump({"args": vars(args), "runs": soak.runs, "elapsed_seconds": round(elapsed, 1),
+                       "results": results, "samples": soak.samples, "flagged": flagged}, report_file, indent=1)
+    if flagged:
+        print(f"flagged: {', '.join(flagged)}")
+        sys.exit(1)
+    print("no growth or drift found")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# Spectator broadcast for Jetpack Adventure
+#
+# The game publishes its simulation state once per rendered frame to a
+# SpectatorServer, which runs an asyncio TCP server on a background thread.
+# Spectators receive compact binary frames (no video) and redraw the game
+# locally with the normal sprites:
+#
+#   python jetpack_adventure.py --spectate-port 7777
+#   python jetpack_spectator.py watch HOST 7777
+#
+# Wire format - every message is a little-endian u32 length followed by:
+#   u8 type (KEYFRAME or DELTA), u32 frame number, then
+#   KEYFRAME: all scalar fields, u16 entity count, full entity records
+#   DELTA:    u8 mask of changed scalar fields followed by those fields,
+#             u16 count + ids of removed entities,
+#             u16 count + full records of new (or far-moved) entities,
+#             u16 count + (id, dx, dy) records of moved entities
+#
+# A delta only makes sense to a client that saw the previous frame. When a
+# subscriber's socket backs up past HIGH_WATER_MARK it stops getting frames
+# and is sent a fresh keyframe once it has drained, so a slow spectator
+# skips frames instead of stalling the game loop.
+import sys
+import random
+import struct
+import asyncio
+import argparse
+import threading
+
+DEFAULT_PORT = 7777
+KEYFRAME_INTERVAL = 300  # Frames between unsolicited keyframes
+HIGH_WATER_MARK = 64 * 1024  # Bytes queued on a subscriber before we start skipping frames
+
+KEYFRAME = 1
+DELTA = 2
+
+GAME_STATES = ["menu", "playing", "game_over"]
+ENTITY_KINDS = ["missile", "laser", "coin"]
+
+# Player flags
+FLAG_JETPACK = 1
+FLAG_ALIVE = 2
+
+LENGTH = struct.Struct("<I")
+HEADER = struct.Struct("<BI")
+COUNT = struct.Struct("<H")
+ENTITY_ID = struct.Struct("<H")
+ENTITY = struct.Struct("<HBBhh")  # id, kind, variant, x, y
+MOVE = struct.Struct("<Hbb")  # id, dx, dy
+
+# Scalar fields in the order they're sent: score, coins collected, game
+# state, player y, player velocity (x100) and player flags
+SCALAR_FIELDS = [struct.Struct(code) for code in ("<f", "<H", "<B", "<h", "<h", "<B")]
+SCALARS = struct.Struct("<fHBhhB")
+
+# Hands out small stable ids for the game's entities, given as (object,
+# index) pairs - the index picks a coin out of a formation. The objects are
+# held onto while they're tracked, so their id() can't be reused meanwhile.
+class EntityIds:
+    def __init__(self):
+        self.tracked = {}  # (id(obj), index) -> (entity id, obj)
+        self.next_id = 0
+
+    def assign(self, entities):
+        tracked = {}
+        ids = []
+        for obj, index in entities:
+            key = (id(obj), index)
+            entry = self.tracked.get(key)
+            if entry is None:
+                entry = (self.next_id, obj)
+                self.next_id = (self.next_id + 1) % 65536
+            tracked[key] = entry
+            ids.append(entry[0])
+        self.tracked = tracked
+        return ids
+
+# Pull the state spectators need out of a Game, already quantized to what
+# goes on the wire. Returns (scalars tuple, {entity id: (kind, variant, x, y)}).
+def extract_state(game, entity_ids):
+    player = game.player
+    flags = (FLAG_JETPACK if player.jetpack_on else 0) | (FLAG_ALIVE if player.alive else 0)
+    scalars = (
+        float(game.score),
+        min(game.coins_collected, 65535),
+        GAME_STATES.index(game.game_state),
+        int(round(player.y)),
+        int(round(player.velocity * 100)),
+        flags,
+    )
+
+    entities = []
+    records = []
+    for obstacle in game.obstacles:
+        entities.append((obstacle, 0))
+        records.append((ENTITY_KINDS.index(obstacle.type), obstacle.variant,
+                        int(round(obstacle.x)), int(round(obstacle.y))))
+    # Coins go out one by one, so spectators don't need to know the layouts
+    coin_kind = ENTITY_KINDS.index("coin")
+    for formation in game.coin_formations:
+        x = int(round(formation.x))
+        y = int(round(formation.y))
+        for i, (dx, dy) in enumerate(formation.layout.offsets):
+            if not formation.collected >> i & 1:
+                entities.append((formation, i))
+                records.append((coin_kind, 0, x + dx, y + dy))
+
+    return scalars, dict(zip(entity_ids.assign(entities), records))
+
+def encode_keyframe(frame_number, scalars, entities):
+    parts = [HEADER.pack(KEYFRAME, frame_number), SCALARS.pack(*scalars), COUNT.pack(len(entities))]
+    for entity_id, (kind, variant, x, y) in entities.items():
+        parts.append(ENTITY.pack(entity_id, kind, variant, x, y))
+    return b"".join(parts)
+
+def encode_delta(frame_number, previous, current):
+    previous_scalars, previous_entities = previous
+    scalars, entities = current
+
+    mask = 0
+    changed = []
+    for i, (old, new) in enumerate(zip(previous_scalars, scalars)):
+        if old != new:
+            mask |= 1 << i
+            changed.append(SCALAR_FIELDS[i].pack(new))
+
+    removed = [ENTITY_ID.pack(entity_id) for entity_id in previous_entities if entity_id not in entities]
+    added = []
+    moved = []
+    for entity_id, record in entities.items():
+        old = previous_entities.get(entity_id)
+        if old == record:
+            continue
+        if old is not None and old[:2] == record[:2]:
+            dx = record[2] - old[2]
+            dy = record[3] - old[3]
+            if -128 <= dx <= 127 and -128 <= dy <= 127:
+                moved.append(MOVE.pack(entity_id, dx, dy))
+                continue
+        added.append(ENTITY.pack(entity_id, *record))
+
+    return b"".join([
+        HEADER.pack(DELTA, frame_number), bytes([mask]), *changed,
+        COUNT.pack(len(removed)), *removed,
+        COUNT.pack(len(added)), *added,
+        COUNT.pack(len(moved)), *moved,
+    ])
+
+# Rebuilds the state on the spectator side from keyframes and deltas
+class FrameDecoder:
+    def __init__(self):
+        self.frame_number = None
+        self.scalars = None
+        self.entities = {}
+
+    def apply(self, payload):
+        """Apply one message. Returns False for a delta that can't be applied yet."""
+        message_type, frame_number = HEADER.unpack_from(payload, 0)
+        offset = HEADER.size
+
+        if message_type == KEYFRAME:
+            self.scalars = list(SCALARS.unpack_from(payload, offset))
+            offset += SCALARS.size
+            (count,) = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+            self.entities = {}
+            for _ in range(count):
+                entity_id, *record = ENTITY.unpack_from(payload, offset)
+                offset += ENTITY.size
+                self.entities[entity_id] = tuple(record)
+        elif message_type == DELTA:
+            if self.scalars is None:
+                return False  # Still waiting for our first keyframe
+
+            mask = payload[offset]
+            offset += 1
+            for i, field in enumerate(SCALAR_FIELDS):
+                if mask & (1 << i):
+                    (self.scalars[i],) = field.unpack_from(payload, offset)
+                    offset += field.size
+
+            (count,) = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+            for _ in range(count):
+                (entity_id,) = ENTITY_ID.unpack_from(payload, offset)
+                offset += ENTITY_ID.size
+                self.entities.pop(entity_id, None)
+
+            (count,) = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+            for _ in range(count):
+                entity_id, *record = ENTITY.unpack_from(payload, offset)
+                offset += ENTITY.size
+                self.entities[entity_id] = tuple(record)
+
+            (count,) = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+            for _ in range(count):
+                entity_id, dx, dy = MOVE.unpack_from(payload, offset)
+                offset += MOVE.size
+                kind, variant, x, y = self.entities[entity_id]
+                self.entities[entity_id] = (kind, variant, x + dx, y + dy)
+        else:
+            raise ValueError(f"unknown message type {message_type}")
+
+        self.frame_number = frame_number
+        return True
+
+class Subscriber:
+    def __init__(self, writer):
+        self.writer = writer
+        self.needs_keyframe = True
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+class SpectatorServer:
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, keyframe_interval=KEYFRAME_INTERVAL,
+                 high_water_mark=HIGH_WATER_MARK):
+        self.host = host
+        self.port = port
+        self.keyframe_interval = keyframe_interval
+        self.high_water_mark = high_water_mark
+        self.subscribers = []
+        self.entity_ids = EntityIds()
+        self.frame_number = 0
+        self.previous_state = None
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Start serving on a background thread; returns once the socket is listening"""
+        ready = threading.Event()
+        self.loop = asyncio.new_event_loop()
+
+        def serve():
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle_client, self.host, self.port))
+            # Pick up the real port when asked to bind to port 0
+            self.port = self.server.sockets[0].getsockname()[1]
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=serve, name="spectator-server", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+    async def shutdown(self):
+        self.server.close()
+        for subscriber in self.subscribers:
+            subscriber.writer.close()
+        await self.server.wait_closed()
+        # Let the client handlers see their connections close
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle_client(self, reader, writer):
+        subscriber = Subscriber(writer)
+        self.subscribers.append(subscriber)
+        try:
+            # Spectators don't send anything; just wait for them to hang up
+            await reader.read()
+        finally:
+            self.subscribers.remove(subscriber)
+            writer.close()
+
+    def publish(self, game):
+        """Send the current state of game to every spectator. Called from the game loop; never blocks."""
+        if not self.subscribers:
+            # Nobody's watching; the next subscriber starts from a keyframe anyway
+            self.previous_state = None
+            return
+
+        state = extract_state(game, self.entity_ids)
+        if self.previous_state is None or self.frame_number % self.keyframe_interval == 0:
+            delta = None
+        else:
+            delta = encode_delta(self.frame_number, self.previous_state, state)
+        self.loop.call_soon_threadsafe(self.broadcast, self.frame_number, state, delta)
+
+        self.previous_state = state
+        self.frame_number += 1
+
+    def broadcast(self, frame_number, state, delta):
+        keyframe = None
+        for subscriber in self.subscribers:
+            transport = subscriber.writer.transport
+            if transport.is_closing():
+                continue
+
+            # Backpressure: let a slow spectator drain, then resync with a keyframe
+            if transport.get_write_buffer_size() > self.high_water_mark:
+                subscriber.needs_keyframe = True
+                subscriber.frames_skipped += 1
+                continue
+
+            if subscriber.needs_keyframe or delta is None:
+                if keyframe is None:
+                    keyframe = encode_keyframe(frame_number, *state)
+                message = keyframe
+                subscriber.needs_keyframe = False
+            else:
+                message = delta
+            subscriber.writer.write(LENGTH.pack(len(message)) + message)
+            subscriber.frames_sent += 1
+
+class SpectatorClient:
+    def __init__(self):
+        self.decoder = FrameDecoder()
+        self.reader = None
+        self.writer = None
+        self.bytes_received = 0
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    async def receive(self):
+        """Wait for the next message and apply it; returns the decoder (None once the server hangs up)"""
+        try:
+            header = await self.reader.readexactly(LENGTH.size)
+            payload = await self.reader.readexactly(LENGTH.unpack(header)[0])
+        except asyncio.IncompleteReadError:
+            return None
+        self.bytes_received += LENGTH.size + len(payload)
+        self.decoder.apply(payload)
+        return self.decoder
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+# Mirror decoded spectator state onto a local Game so it can be drawn with
+# the game's own sprites and UI
+class Puppet:
+    def __init__(self, game):
+        self.game = game
+        self.objects = {}  # entity id -> Obstacle
+        self.coin_animation = 0
+
+    def apply(self, decoder):
+        import jetpack_adventure as jp
+
+        game = self.game
+        score, coins_collected, state, player_y, velocity, flags = decoder.scalars
+        game.score = score
+        game.coins_collected = coins_collected
+        game.game_state = GAME_STATES[state]
+        game.high_score = max(game.high_score, score)
+
+        player = game.player
+        alive = bool(flags & FLAG_ALIVE)
+        if player.alive and not alive and game.game_state == "game_over":
+            game.explosions.append(jp.Explosion(player.x + player.width // 2, player_y + player.height // 2))
+        player.prev_y = player.y
+        player.y = player_y
+        player.velocity = velocity / 100
+        player.jetpack_on = bool(flags & FLAG_JETPACK)
+        player.alive = alive
+
+        objects = {}
+        coin_positions = []
+        for entity_id, (kind, variant, x, y) in decoder.entities.items():
+            if ENTITY_KINDS[kind] == "coin":
+                coin_positions.append((x, y))
+                continue
+            obj = self.objects.get(entity_id)
+            if obj is None:
+                obj = jp.Obstacle(x, y, ENTITY_KINDS[kind], variant)
+            obj.prev_x = obj.x = x
+            obj.y = y
+            objects[entity_id] = obj
+        self.objects = objects
+        game.obstacles = list(objects.values())
+
+        # All the visible coins are drawn as one unnamed formation
+        game.coin_formations = []
+        if coin_positions:
+            layout = jp.make_coin_layout(coin_positions)
+            formation = jp.CoinFormation(layout, -layout.origin[0], -layout.origin[1])
+            formation.animation_frame = self.coin_animation
+            game.coin_formations.append(formation)
+
+    def animate(self):
+        # Purely cosmetic per-frame updates that aren't sent over the wire
+        import jetpack_adventure as jp
+
+        game = self.game
+        player = game.player
+        game.background.update()
+        player.frame = (player.frame + player.animation_speed) % len(player.normal_frames)
+        if player.jetpack_on and player.alive and random.random() > 0.7:
+            game.add_particle(player.x + 5, player.y + player.height - 20)
+        self.coin_animation = (self.coin_animation + 0.1) % len(jp.Coin.frame_cache)
+        for formation in game.coin_formations:
+            formation.animation_frame = self.coin_animation
+        game.explosions = [explosion for explosion in game.explosions if explosion.update()]
+        game.particles = [particle for particle in game.particles if particle.update()]
+
+async def watch(host, port):
+    import pygame
+    import jetpack_adventure as jp
+
+    pygame.display.set_caption("Jetpack Adventure - Spectator")
+    jp.sounds_enabled = False
+    pygame.mixer.music.stop()
+
+    client = SpectatorClient()
+    await client.connect(host, port)
+    puppet = Puppet(jp.Game())
+    updated = asyncio.Event()
+
+    async def receive_frames():
+        while await client.receive() is not None:
+            updated.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while not receiver.done():
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    return
+            if updated.is_set() and client.decoder.scalars is not None:
+                updated.clear()
+                puppet.apply(client.decoder)
+            puppet.animate()
+            puppet.game.draw()
+            jp.renderer.present()
+            await asyncio.sleep(jp.SIM_STEP)
+    finally:
+        receiver.cancel()
+        client.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure spectator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    watch_parser = subparsers.add_parser("watch", help="show a live game from another machine")
+    watch_parser.add_argument("host")
+    watch_parser.add_argument("port", type=int, nargs="?", default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    if args.command == "watch":
+        asyncio.run(watch(args.host, args.port))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
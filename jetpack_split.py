@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# Separate simulation and render processes for Jetpack Adventure
+#
+#   python jetpack_adventure.py --split
+#
+# Normally one thread steps the simulation, draws and presents. With --split
+# a simulation process (this file's "sim" command, started by the game)
+# steps Game at the fixed rate and writes every step's state into shared
+# memory. The game's own process keeps the window: it reads the newest
+# state, mirrors it onto a local Game, and draws and presents that with the
+# usual sprites. Input goes the other way through the same shared memory.
+#
+# Shared memory layout, all little-endian:
+#   control - u64 records written, then input from the render process:
+#             u8 thrust held, u32 taps, u32 start requests, u32 input serial,
+#             u8 quit
+#   ring    - RING_SLOTS slots of SLOT_SIZE bytes: u64 sequence, u32 length,
+#             then a state record (see write_state)
+#   layouts - u32 count, then coin formation layouts one after another, each
+#             u16 coin count, u16 name length, the name and (u16 x, u16 y) offsets
+#
+# Nothing is locked. Each slot is a seqlock: the writer makes its sequence
+# odd, writes the record, then sets it to twice the record number. A reader
+# copies the newest record and checks the sequence didn't change meanwhile,
+# retrying if the writer lapped the ring under it. The layout table is
+# append-only: a layout is written before the count that makes it visible.
+# Records are packed straight into the slot with struct, so nothing is
+# pickled. Timestamps are perf_counter(), which is a system-wide clock.
+import os
+import sys
+import time
+import struct
+import argparse
+import subprocess
+from multiprocessing import shared_memory, resource_tracker
+
+RING_SLOTS = 8
+SLOT_SIZE = 16 * 1024
+LAYOUT_TABLE_SIZE = 256 * 1024
+CONTROL_SIZE = 64
+QUIT_TIMEOUT = 2.0  # Seconds the simulation process gets to exit before it's killed
+
+GAME_STATES = ["menu", "playing", "game_over"]
+OBSTACLE_TYPES = ["missile", "laser"]
+# Sounds the simulation triggers and the render process plays. The jetpack's
+# sound follows the thrust flag instead, and "menu" is played on input.
+FORWARDED_SOUNDS = ["explosion", "coin", "laser", "gameover"]
+
+FLAG_JETPACK = 1
+FLAG_ALIVE = 2
+
+WRITE_COUNT = struct.Struct("<Q")
+INPUT = struct.Struct("<BIIIB")  # thrust held, taps, start requests, input serial, quit
+INPUT_OFFSET = WRITE_COUNT.size
+SLOT_HEADER = struct.Struct("<QI")  # sequence, record length
+SEQUENCE = struct.Struct("<Q")
+SLOT_HEADER_SIZE = 16
+# sim time, published at, score, high score, coins collected, game state,
+# player y, previous y, velocity and animation frame, player flags, what
+# killed the player (0 = nothing, else 1 + index in OBSTACLE_TYPES), start
+# requests and input serial handled, per-sound play counts, obstacle and
+# formation counts
+# (animation frames are doubles: rounded to floats they can reach the frame count)
+RECORD = struct.Struct("<ddddIBfffdBBII" + "H" * len(FORWARDED_SOUNDS) + "HH")
+OBSTACLE = struct.Struct("<HBBfff")  # id, type, variant, x, previous x, y
+FORMATION = struct.Struct("<HHfffdH")  # id, layout, x, previous x, y, animation frame, collected bytes
+LAYOUT_COUNT = struct.Struct("<I")
+LAYOUT_HEADER = struct.Struct("<HH")
+OFFSET = struct.Struct("<HH")
+
+class StateRing:
+    """The shared memory block; created by the render process, attached to by the simulation"""
+    def __init__(self, shm):
+        self.shm = shm
+        self.buf = shm.buf
+        self.ring_offset = CONTROL_SIZE
+        self.layout_offset = CONTROL_SIZE + RING_SLOTS * SLOT_SIZE
+        self.written = WRITE_COUNT.unpack_from(self.buf, 0)[0]
+        self.last_read = 0
+        self.layouts = []  # Reader: layouts by index
+        self.layout_cursor = self.layout_offset + LAYOUT_COUNT.size
+        self.layout_index = {}  # Writer: id(layout) -> (index, layout)
+        self.retries = 0
+
+    @classmethod
+    def create(cls):
+        return cls(shared_memory.SharedMemory(create=True, size=CONTROL_SIZE + RING_SLOTS * SLOT_SIZE + LAYOUT_TABLE_SIZE))
+
+    @classmethod
+    def attach(cls, name):
+        shm = shared_memory.SharedMemory(name=name)
+        # The creator owns the block; without this our resource tracker would unlink it when we exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+    # Input, written by the render process and read by the simulation
+
+    def write_input(self, held, taps, starts, serial, quit=False):
+        INPUT.pack_into(self.buf, INPUT_OFFSET, held, taps, starts, serial, quit)
+
+    def read_input(self):
+        return INPUT.unpack_from(self.buf, INPUT_OFFSET)
+
+    # Coin layouts, appended by the simulation the first time one is used
+
+    def layout_number(self, layout):
+        entry = self.layout_index.get(id(layout))
+        if entry is not None:
+            return entry[0]
+        name = (layout.name or "").encode()
+        entry_size = LAYOUT_HEADER.size + len(name) + OFFSET.size * len(layout.offsets)
+        position = self.layout_cursor
+        if position + entry_size > self.layout_offset + LAYOUT_TABLE_SIZE:
+            raise OverflowError("coin layout table is full")
+        LAYOUT_HEADER.pack_into(self.buf, position, len(layout.offsets), len(name))
+        position += LAYOUT_HEADER.size
+        self.buf[position:position + len(name)] = name
+        position += len(name)
+        for dx, dy in layout.offsets:
+            OFFSET.pack_into(self.buf, position, dx, dy)
+            position += OFFSET.size
+        self.layout_cursor = position
+        number = len(self.layout_index)
+        self.layout_index[id(layout)] = (number, layout)
+        LAYOUT_COUNT.pack_into(self.buf, self.layout_offset, number + 1)
+        return number
+
+    def layout(self, number, jp):
+        if number >= len(self.layouts):
+            (count,) = LAYOUT_COUNT.unpack_from(self.buf, self.layout_offset)
+            while len(self.layouts) < count:
+                coins, name_length = LAYOUT_HEADER.unpack_from(self.buf, self.layout_cursor)
+                position = self.layout_cursor + LAYOUT_HEADER.size
+                name = bytes(self.buf[position:position + name_length]).decode() or None
+                position += name_length
+                offsets = [OFFSET.unpack_from(self.buf, position + i * OFFSET.size) for i in range(coins)]
+                self.layout_cursor = position + coins * OFFSET.size
+                # Rebuilt from the offsets, so a named layout's size and
+                # pre-drawn surfaces match the simulation's
+                layout = jp.coin_layouts.get(name) if name else None
+                if layout is None or list(layout.offsets) != offsets:
+                    layout = jp.make_coin_layout(offsets, name)
+                self.layouts.append(layout)
+        return self.layouts[number]
+
+    # State records
+
+    def write_state(self, game, entity_ids, sound_counts, starts_seen, input_serial):
+        number = self.written + 1
+        slot = self.ring_offset + (number - 1) % RING_SLOTS * SLOT_SIZE
+        end = slot + SLOT_SIZE
+        buf = self.buf
+        SEQUENCE.pack_into(buf, slot, 2 * number - 1)
+
+        player = game.player
+        flags = (FLAG_JETPACK if player.jetpack_on else 0) | (FLAG_ALIVE if player.alive else 0)
+        obstacles = game.obstacles
+        formations = game.coin_formations
+        position = slot + SLOT_HEADER_SIZE
+        RECORD.pack_into(buf, position, game.sim_time, time.perf_counter(), game.score, game.high_score,
+                         game.coins_collected, GAME_STATES.index(game.game_state),
+                         player.y, player.prev_y, player.velocity, player.frame, flags,
+                         OBSTACLE_TYPES.index(game.death_cause) + 1 if game.death_cause else 0,
+                         starts_seen, input_serial, *sound_counts, len(obstacles), len(formations))
+        position += RECORD.size
+
+        ids = entity_ids.assign([(entity, 0) for entity in obstacles] + [(entity, 0) for entity in formations])
+        for entity_id, obstacle in zip(ids, obstacles):
+            if position + OBSTACLE.size > end:
+                raise OverflowError("state record doesn't fit in a ring slot")
+            OBSTACLE.pack_into(buf, position, entity_id, OBSTACLE_TYPES.index(obstacle.type), obstacle.variant,
+                               obstacle.x, obstacle.prev_x, obstacle.y)
+            position += OBSTACLE.size
+        for entity_id, formation in zip(ids[len(obstacles):], formations):
+            collected = formation.collected.to_bytes((formation.collected.bit_length() + 7) // 8, "little")
+            if position + FORMATION.size + len(collected) > end:
+                raise OverflowError("state record doesn't fit in a ring slot")
+            FORMATION.pack_into(buf, position, entity_id, self.layout_number(formation.layout),
+                                formation.x, formation.prev_x, formation.y, formation.animation_frame,
+                                len(collected))
+            position += FORMATION.size
+            buf[position:position + len(collected)] = collected
+            position += len(collected)
+
+        SLOT_HEADER.pack_into(buf, slot, 2 * number, position - slot - SLOT_HEADER_SIZE)
+        WRITE_COUNT.pack_into(buf, 0, number)
+        self.written = number
+
+    def read_latest(self):
+        """A copy of the newest record, or None if there's nothing new"""
+        buf = self.buf
+        while True:
+            (number,) = WRITE_COUNT.unpack_from(buf, 0)
+            if number == self.last_read:
+                return None
+            slot = self.ring_offset + (number - 1) % RING_SLOTS * SLOT_SIZE
+            sequence, length = SLOT_HEADER.unpack_from(buf, slot)
+            if sequence == 2 * number:
+                record = bytes(buf[slot + SLOT_HEADER_SIZE:slot + SLOT_HEADER_SIZE + length])
+                if SEQUENCE.unpack_from(buf, slot)[0] == sequence:
+                    self.last_read = number
+                    return record
+            # The writer has moved on to this slot's next record; start again from the newest
+            self.retries += 1
+
+# Applies records onto a Game in the render process, which then draws it as
+# usual. Cosmetic things the records leave out (background scrolling,
+# particles, explosions, sounds) are run here, a step at a time.
+class Mirror:
+    def __init__(self, game, ring, jp):
+        self.game = game
+        self.ring = ring
+        self.jp = jp
+        self.objects = {}  # entity id -> Obstacle or CoinFormation
+        self.sound_counts = None
+        self.sim_time = None
+        self.published = None
+        self.starts_requested = 0  # Runs started here; the simulation's records catch up a step or two later
+        self.input_serial = 0
+
+    def apply(self, record):
+        jp = self.jp
+        game = self.game
+        (sim_time, published, score, high_score, coins_collected, state, player_y, prev_y, velocity,
+         frame, flags, death_cause, starts_seen, input_serial, *rest) = RECORD.unpack_from(record, 0)
+        sound_counts = rest[:len(FORWARDED_SOUNDS)]
+        obstacle_count, formation_count = rest[len(FORWARDED_SOUNDS):]
+        self.input_serial = input_serial
+        if starts_seen < self.starts_requested:
+            return  # Still the run before the one just started here
+        self.published = published
+
+        steps = 1 if self.sim_time is None else round((sim_time - self.sim_time) / jp.SIM_STEP_MS)
+        # A restart rewinds the clock; still one step
+        self.sim_time = sim_time
+        for _ in range(max(1, min(steps, jp.MAX_CATCHUP_STEPS))):
+            self.animate()
+
+        previous_state = game.game_state
+        game.sim_time = sim_time
+        game.score = score
+        game.high_score = max(game.high_score, high_score)
+        game.coins_collected = coins_collected
+        game.game_state = GAME_STATES[state]
+        game.death_cause = OBSTACLE_TYPES[death_cause - 1] if death_cause else None
+
+        player = game.player
+        alive = bool(flags & FLAG_ALIVE)
+        if player.alive and not alive:
+            game.explosions.append(jp.Explosion(player.x + player.width // 2, player_y + player.height // 2))
+        player.y = player_y
+        player.prev_y = prev_y
+        player.velocity = velocity
+        player.frame = frame
+        player.jetpack_on = bool(flags & FLAG_JETPACK)
+        player.alive = alive
+        player.rect.y = player.y + 10
+
+        if game.game_state != previous_state:
+            if game.game_state == "game_over":
+                jp.pygame.mixer.stop()
+                jp.pygame.mixer.music.pause()
+            elif game.game_state == "playing":
+                jp.pygame.mixer.music.unpause()
+        if self.sound_counts is not None:
+            for name, old, new in zip(FORWARDED_SOUNDS, self.sound_counts, sound_counts):
+                if new != old:
+                    jp.play_sound(name)
+        self.sound_counts = sound_counts
+
+        position = RECORD.size
+        objects = {}
+        game.obstacles = []
+        for _ in range(obstacle_count):
+            entity_id, obstacle_type, variant, x, prev_x, y = OBSTACLE.unpack_from(record, position)
+            position += OBSTACLE.size
+            obstacle = self.objects.get(entity_id)
+            if not isinstance(obstacle, jp.Obstacle):
+                obstacle = jp.Obstacle(x, y, OBSTACLE_TYPES[obstacle_type], variant)
+            obstacle.x, obstacle.prev_x, obstacle.y = x, prev_x, y
+            objects[entity_id] = obstacle
+            game.obstacles.append(obstacle)
+        game.coin_formations = []
+        for _ in range(formation_count):
+            entity_id, layout_number, x, prev_x, y, animation_frame, collected_size = FORMATION.unpack_from(record, position)
+            position += FORMATION.size
+            collected = int.from_bytes(record[position:position + collected_size], "little")
+            position += collected_size
+            formation = self.objects.get(entity_id)
+            layout = self.ring.layout(layout_number, jp)
+            if not isinstance(formation, jp.CoinFormation) or formation.layout is not layout:
+                formation = jp.CoinFormation(layout, x, y)
+            if formation.collected != collected:
+                formation.set_collected(collected)
+            formation.x, formation.prev_x, formation.y = x, prev_x, y
+            formation.animation_frame = animation_frame
+            objects[entity_id] = formation
+            game.coin_formations.append(formation)
+        self.objects = objects
+
+    def animate(self):
+        jp = self.jp
+        game = self.game
+        player = game.player
+        game.background.update()
+        if player.jetpack_on and player.alive:
+            jetpack_sound = jp.sounds.get("jetpack")
+            if jetpack_sound is not None and not jetpack_sound.get_num_channels():
+                jp.play_sound("jetpack")
+            if jp.random.random() > 0.7:
+                game.add_particle(player.x + 5, player.y + player.height - 20)
+        elif jp.sounds.get("jetpack") is not None:
+            jp.sounds["jetpack"].stop()
+        game.explosions = [explosion for explosion in game.explosions if explosion.update()]
+        game.particles = [particle for particle in game.particles if particle.update()]
+
+    def interpolation(self, now):
+        # The newest record is drawn blending in from the step before, over one step
+        if self.published is None:
+            return 1.0
+        return min(1.0, max(0.0, (now - self.published) / self.jp.SIM_STEP))
+
+def start_simulation(ring, seed=None, restart=False):
+    command = [sys.executable, os.path.abspath(__file__), "sim", ring.name]
+    if seed is not None:
+        command += ["--seed", str(seed)]
+    if restart:
+        command.append("--restart")
+    environment = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    return subprocess.Popen(command, env=environment)
+
+def run_split(game, render_fps, frame_hooks=(), seed=None, restart=False, max_frames=None):
+    """The render side of the game loop: start the simulation process, then draw what it publishes"""
+    import jetpack_adventure as jp
+
+    ring = StateRing.create()
+    simulation = start_simulation(ring, seed, restart)
+    mirror = Mirror(game, ring, jp)
+    held = False
+    taps = 0
+    serial = 0
+    latency_serial = None  # Input serial that has to be simulated before pending input is counted as applied
+    frames = 0
+    try:
+        # The simulation takes a moment to start (it builds the game too);
+        # its first record is the state the game starts from
+        record = None
+        while record is None:
+            if simulation.poll() is not None:
+                raise RuntimeError(f"simulation process exited with status {simulation.returncode}")
+            jp.pygame.event.pump()
+            time.sleep(jp.SIM_STEP)
+            record = ring.read_latest()
+        mirror.apply(record)
+
+        while not game.quit_requested and (max_frames is None or frames < max_frames):
+            if simulation.poll() is not None:
+                raise RuntimeError(f"simulation process exited with status {simulation.returncode}")
+            record = ring.read_latest()
+            if record is not None:
+                mirror.apply(record)
+                if latency_serial is not None and mirror.input_serial >= latency_serial:
+                    game.latency.step_simulated()
+                    latency_serial = None
+
+            # The game's own event handling, for menus, hotkeys and sound
+            # toggles; starting a run and thrust are passed on
+            state = game.game_state
+            game.handle_events()
+            if game.game_state == "playing" and state != "playing":
+                mirror.starts_requested += 1
+            now_held = jp.thrust_held()
+            if game.thrust_tapped or now_held != held:
+                taps += game.thrust_tapped
+                game.thrust_tapped = False
+                held = now_held
+                serial += 1
+            ring.write_input(held, taps, mirror.starts_requested, serial)
+            if game.latency is not None and game.latency.arrived:
+                latency_serial = serial
+
+            game.draw(mirror.interpolation(time.perf_counter()))
+            jp.renderer.present()
+            for hook in frame_hooks:
+                hook(game)
+            frames += 1
+            jp.clock.tick(render_fps)
+    finally:
+        ring.write_input(held, taps, mirror.starts_requested, serial, quit=True)
+        try:
+            simulation.wait(QUIT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            simulation.kill()
+            simulation.wait()
+        ring.close(unlink=True)
+
+def simulate(args):
+    """The simulation process: step the game at the fixed rate and publish every step"""
+    import jetpack_adventure as jp
+    from jetpack_spectator import EntityIds
+
+    ring = StateRing.attach(args.shm_name)
+    game = jp.Game(seed=args.seed)
+    game.events.consumers.remove(jp.event_effects)  # Cosmetic; the render process makes its own
+
+    # Sounds are counted and played by the render process
+    sound_counts = [0] * len(FORWARDED_SOUNDS)
+    def count_sound(name):
+        if name in FORWARDED_SOUNDS:
+            sound_counts[FORWARDED_SOUNDS.index(name)] += 1
+    jp.play_sound = count_sound
+
+    entity_ids = EntityIds()
+    starts_seen = 0
+    taps_seen = 0
+    next_step = time.perf_counter()
+    try:
+        while True:
+            held, taps, starts, serial, quit = ring.read_input()
+            if quit:
+                break
+            if starts != starts_seen:
+                starts_seen = starts
+                if game.game_state != "playing":
+                    game.start_game()
+            if args.restart and game.game_state == "game_over":
+                game.start_game()
+            if game.game_state == "playing":
+                game.player.jetpack_on = bool(held or taps != taps_seen)
+            taps_seen = taps
+
+            game.update()
+            ring.write_state(game, entity_ids, sound_counts, starts_seen, serial)
+
+            next_step += jp.SIM_STEP
+            now = time.perf_counter()
+            if now > next_step + jp.MAX_CATCHUP_STEPS * jp.SIM_STEP:
+                next_step = now  # Too far behind to catch up; carry on from here
+            elif next_step > now:
+                time.sleep(next_step - now)
+    finally:
+        ring.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jetpack Adventure simulation process (started by --split)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sim_parser = subparsers.add_parser("sim", help="step the game and publish its state into shared memory")
+    sim_parser.add_argument("shm_name")
+    sim_parser.add_argument("--seed", type=int, default=None)
+    sim_parser.add_argument("--restart", action="store_true", help="start a new run as soon as one ends")
+    args = parser.parse_args(argv)
+
+    if args.command == "sim":
+        simulate(args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])